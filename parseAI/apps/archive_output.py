@@ -0,0 +1,227 @@
+import io
+import os
+import sys
+import json
+import time
+import tarfile
+import zipfile
+import argparse
+from safe_io import atomic_write
+from run_log import get_logger
+
+log = get_logger("archive_output")
+
+# Supported archive layouts for --archive-output
+ARCHIVE_FORMATS = ('zip', 'tar')
+
+
+def archive_path_for(base_extraction_dir, fmt="zip", compress=False):
+    """
+    Returns the archive filename used in place of a '<source>_files/' directory.
+    e.g. output/Session/Session_files -> output/Session/Session_files.zip
+    """
+    if fmt == 'tar':
+        return f"{base_extraction_dir}.tar.gz" if compress else f"{base_extraction_dir}.tar"
+    return f"{base_extraction_dir}.zip"
+
+
+class ArchiveWriter:
+    """
+    Streams an extraction tree into a single zip or tar file.
+
+    Callers keep using the same absolute paths they would write on disk; every path
+    under 'root_dir' is stored with its relative name (the same names that appear in
+    manifest.json, e.g. 'files/main.py', 'reconstructed/src/main.py').
+
+    Entries that can still be replaced during the run (files/, reconstructed/, manifest)
+    are 'staged' and only hold their latest content in memory; superseded versions are
+    streamed out immediately under their rotated '_vN' name. Everything else is written
+    straight through.
+
+    The archive is built under a temporary name and only renamed to 'archive_path' by
+    close(), so an existing archive stays readable until the new one is complete. A run
+    that fails inside the 'with' block discards the temporary archive (abort()) instead.
+    """
+
+    def __init__(self, archive_path, root_dir, fmt="zip", compress=False):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {fmt}")
+
+        self.archive_path = archive_path
+        self.root_dir = os.path.abspath(root_dir)
+        self.fmt = fmt
+        self.staged = {}   # arcname -> latest content (str or bytes)
+        self.written = set()
+        self.index = {}    # arcname -> [data_offset, size] (uncompressed tar only)
+
+        parent_dir = os.path.dirname(archive_path)
+        if parent_dir and not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+        self._tmp_path = f"{archive_path}.{os.getpid()}.tmp"
+
+        if fmt == 'zip':
+            compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            self._zip = zipfile.ZipFile(self._tmp_path, 'w', compression=compression)
+            self._tar = None
+        else:
+            self._zip = None
+            self._seekable = not compress
+            self._tar = tarfile.open(self._tmp_path, 'w:gz' if compress else 'w')
+
+        log.info(f"Writing extraction archive: {archive_path}")
+
+    def arcname(self, path):
+        """Maps an absolute output path to its name inside the archive (None if outside root)."""
+        rel = os.path.relpath(os.path.abspath(path), self.root_dir)
+        if rel.startswith('..'):
+            return None
+        return rel.replace(os.sep, '/')
+
+    def contains(self, path):
+        return self.arcname(path) is not None
+
+    def _emit(self, name, content):
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        if name in self.written:
+            log.warning(f"Archive already holds {name}, skipping duplicate entry")
+            return
+        self.written.add(name)
+
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+            return
+
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        if self._seekable:
+            # Data ends (block padded) right before the current offset; long names add extra headers before it
+            blocks, remainder = divmod(len(data), tarfile.BLOCKSIZE)
+            padded = (blocks + (1 if remainder else 0)) * tarfile.BLOCKSIZE
+            self.index[name] = [self._tar.offset - padded, len(data)]
+
+    def write(self, path, content):
+        """Streams an entry that will not be replaced later (code blocks, HTML, PDF)."""
+        self._emit(self.arcname(path), content)
+
+    def stage(self, path, content):
+        """Holds the latest content of a replaceable entry until close()."""
+        self.staged[self.arcname(path)] = content
+
+    def read(self, path):
+        """Returns the staged content of an entry, or None if it is not (or no longer) live."""
+        return self.staged.get(self.arcname(path))
+
+    def rotate(self, path, new_path):
+        """Streams out the current live content of 'path' under 'new_path'."""
+        name = self.arcname(path)
+        if name in self.staged:
+            self._emit(self.arcname(new_path), self.staged.pop(name))
+
+    def close(self):
+        for name in sorted(self.staged):
+            self._emit(name, self.staged[name])
+        self.staged = {}
+
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+        os.replace(self._tmp_path, self.archive_path)
+        if self._tar is not None and self._seekable:
+            # Sidecar offset index: lets tools seek straight to a member
+            atomic_write(f"{self.archive_path}.index.json", json.dumps(self.index))
+
+        log.info(f"Closed extraction archive: {self.archive_path} ({len(self.written)} entries)", event="archive_closed", path=self.archive_path, entries=len(self.written))
+
+    def abort(self):
+        """Discards the partial archive; an existing archive at 'archive_path' is left as it was."""
+        self.staged = {}
+        try:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
+        except Exception:
+            pass
+        try:
+            os.unlink(self._tmp_path)
+        except OSError:
+            pass
+        log.warning(f"Discarded the incomplete extraction archive, {self.archive_path} is unchanged", event="archive_aborted", path=self.archive_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def list_archive_entries(archive_path):
+    """Returns the entry names of an extraction archive."""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            return zf.namelist()
+
+    index_path = f"{archive_path}.index.json"
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return list(json.load(f).keys())
+
+    with tarfile.open(archive_path, 'r|*') as tf:
+        return [m.name for m in tf if m.isfile()]
+
+
+def read_archive_entry(archive_path, name):
+    """
+    Reads one entry back without extracting the archive.
+    zip: central directory lookup. Plain tar: seek via the sidecar index.
+    Compressed tar: single sequential pass that stops at the entry.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            return zf.read(name)
+
+    index_path = f"{archive_path}.index.json"
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if name not in index:
+            raise KeyError(name)
+        offset, size = index[name]
+        with open(archive_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    with tarfile.open(archive_path, 'r|*') as tf:
+        for member in tf:
+            if member.name == name:
+                return tf.extractfile(member).read()
+    raise KeyError(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect extraction archives written with --archive-output.")
+    parser.add_argument("archive", help="Path to a <session>_files.zip / .tar / .tar.gz archive.")
+    parser.add_argument("entry", nargs='?', help="Entry to print (e.g. 'reconstructed/src/main.py'). Lists entries if omitted.")
+    args = parser.parse_args()
+
+    if not args.entry:
+        for name in list_archive_entries(args.archive):
+            print(name)
+        return
+
+    try:
+        data = read_archive_entry(args.archive, args.entry)
+    except KeyError:
+        print(f"Entry not found: {args.entry}")
+        sys.exit(1)
+    sys.stdout.buffer.write(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from chunk_selection import turn_indexes
+from extraction_views import block_content_path
+from run_log import get_logger
+
+log = get_logger("catalog")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    source TEXT,
+    output_dir TEXT,
+    fingerprint TEXT,
+    model TEXT,
+    turn_count INTEGER DEFAULT 0,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    turn_index INTEGER NOT NULL,
+    role TEXT,
+    is_thought INTEGER DEFAULT 0,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id, turn_index);
+CREATE TABLE IF NOT EXISTS manifests (
+    path TEXT PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    manifest_path TEXT NOT NULL,
+    entry_index INTEGER,
+    block_file TEXT,
+    language TEXT,
+    associated_filename TEXT,
+    saved_as TEXT,
+    reconstructed_path TEXT,
+    sorted_path TEXT
+);
+CREATE INDEX IF NOT EXISTS files_session ON files(session_id);
+CREATE INDEX IF NOT EXISTS files_manifest ON files(manifest_path);
+CREATE INDEX IF NOT EXISTS files_language ON files(language);
+CREATE INDEX IF NOT EXISTS files_sorted ON files(sorted_path);
+"""
+
+# External-content FTS index over turns.text (kept in sync by hand, see _delete_turns)
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(text, content='turns', content_rowid='id')"
+
+# FTS index over the extracted blocks (rowid = files.id): their paths and raw contents
+FILES_FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(path, content)"
+
+# Words that stay FTS5 operators in a query; everything else is matched literally
+FTS_OPERATORS = {'AND', 'OR', 'NOT'}
+
+
+def fingerprint_bytes(data):
+    """Content fingerprint used to skip unchanged sessions and manifests."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def fts_query(query):
+    """
+    Turns a user query into FTS5 syntax: every whitespace-separated word becomes a quoted
+    string (so 'auth.py', 'src/auth.py' or "don't" are searched as written), a trailing '*'
+    stays a prefix search, and AND / OR / NOT stay operators.
+    """
+    terms = []
+    for word in query.split():
+        if word in FTS_OPERATORS:
+            terms.append(word)
+            continue
+        prefix = word.endswith('*') and len(word) > 1
+        if prefix:
+            word = word[:-1]
+        terms.append('"' + word.replace('"', '""') + '"' + (' *' if prefix else ''))
+    # An operator cannot start or end the query
+    while terms and terms[0] in FTS_OPERATORS:
+        terms.pop(0)
+    while terms and terms[-1] in FTS_OPERATORS:
+        terms.pop()
+    return " ".join(terms)
+
+
+def _read_block(manifest_path, entry):
+    try:
+        with open(block_content_path(os.path.dirname(manifest_path), entry), 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except (OSError, KeyError):
+        # Archive output, or a view that was not written
+        return ""
+
+
+def fingerprint_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Catalog:
+    """
+    Local SQLite catalog of processed sessions, their turns and extracted files.
+
+    Safe to open from several worker processes at once (WAL journal, busy timeout).
+    Uses FTS5 for turn text and extracted code search when the SQLite build provides it,
+    LIKE otherwise.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        parent_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.execute(FTS_SCHEMA)
+            had_files_fts = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_fts'").fetchone()
+            self.conn.execute(FILES_FTS_SCHEMA)
+            if not had_files_fts:
+                # Catalogs from before files_fts: index their manifests again on the next run
+                self.conn.execute("UPDATE manifests SET fingerprint = NULL")
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- Writers -----------------------------------------------------------
+
+    def _session_row(self, name):
+        return self.conn.execute("SELECT id, fingerprint FROM sessions WHERE name = ?", (name,)).fetchone()
+
+    def _delete_turns(self, session_id):
+        if self.has_fts:
+            self.conn.execute(
+                "INSERT INTO turns_fts(turns_fts, rowid, text) SELECT 'delete', id, text FROM turns WHERE session_id = ?",
+                (session_id,)
+            )
+        self.conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def record_session(self, name, data, source=None, output_dir=None, fingerprint=None):
+        """
+        Indexes a session and its turns. Skipped when 'fingerprint' matches the stored one.
+        Returns True if the session was (re)indexed.
+        """
+        row = self._session_row(name)
+        if row and fingerprint and row[1] == fingerprint:
+            return False
+
+        prompt = data.get('chunkedPrompt', {})
+        chunks = prompt.get('chunks', [])
+        model = data.get('runSettings', {}).get('model')
+
+        with self.conn:
+            if row:
+                session_id = row[0]
+                self._delete_turns(session_id)
+                self.conn.execute(
+                    "UPDATE sessions SET source = ?, output_dir = ?, fingerprint = ?, model = ?, turn_count = ?, indexed_at = ? WHERE id = ?",
+                    (source, output_dir, fingerprint, model, len(chunks), time.time(), session_id)
+                )
+            else:
+                cur = self.conn.execute(
+                    "INSERT INTO sessions (name, source, output_dir, fingerprint, model, turn_count, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (name, source, output_dir, fingerprint, model, len(chunks), time.time())
+                )
+                session_id = cur.lastrowid
+
+            # Turn indexes of the full export, also when only some chunks were selected
+            for turn_index, chunk in zip(turn_indexes(prompt), chunks):
+                cur = self.conn.execute(
+                    "INSERT INTO turns (session_id, turn_index, role, is_thought, text) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, turn_index, chunk.get('role', 'unknown'), 1 if chunk.get('isThought') else 0, chunk.get('text', ''))
+                )
+                if self.has_fts:
+                    self.conn.execute("INSERT INTO turns_fts(rowid, text) VALUES (?, ?)", (cur.lastrowid, chunk.get('text', '')))
+
+        log.info(f"Catalog: indexed session '{name}' ({len(chunks)} turns)", event="catalog_session", session=name, turns=len(chunks))
+        return True
+
+    def session_for_path(self, path):
+        """
+        Finds the session whose output directory contains 'path' (longest match).
+        """
+        path = os.path.abspath(path)
+        best = None
+        for session_id, name, output_dir in self.conn.execute("SELECT id, name, output_dir FROM sessions WHERE output_dir IS NOT NULL"):
+            root = os.path.abspath(output_dir)
+            if path == root or path.startswith(root + os.sep):
+                if best is None or len(root) > len(best[2]):
+                    best = (session_id, name, root)
+        return best
+
+    def ensure_session(self, name, output_dir=None):
+        row = self._session_row(name)
+        if row:
+            return row[0]
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO sessions (name, output_dir, indexed_at) VALUES (?, ?, ?)",
+                (name, output_dir, time.time())
+            )
+        return cur.lastrowid
+
+    def record_manifest(self, session_id, manifest_path, manifest):
+        """
+        Indexes the entries of one manifest.json. Skipped when the manifest is unchanged.
+        Returns True if the manifest was (re)indexed.
+        """
+        manifest_path = os.path.abspath(manifest_path)
+        fingerprint = fingerprint_bytes(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+        row = self.conn.execute("SELECT fingerprint FROM manifests WHERE path = ?", (manifest_path,)).fetchone()
+        if row and row[0] == fingerprint:
+            return False
+
+        with self.conn:
+            if self.has_fts:
+                self.conn.execute("DELETE FROM files_fts WHERE rowid IN (SELECT id FROM files WHERE manifest_path = ?)", (manifest_path,))
+            self.conn.execute("DELETE FROM files WHERE manifest_path = ?", (manifest_path,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifests (path, session_id, fingerprint) VALUES (?, ?, ?)",
+                (manifest_path, session_id, fingerprint)
+            )
+            for i, e in enumerate(manifest):
+                cur = self.conn.execute(
+                    "INSERT INTO files (session_id, manifest_path, entry_index, block_file, language, associated_filename, saved_as, reconstructed_path, sorted_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, manifest_path, i, e.get('file'), e.get('language'), e.get('associated_filename'),
+                     e.get('saved_as'), e.get('reconstructed_path'), e.get('sorted_path'))
+                )
+                if self.has_fts:
+                    paths = dict.fromkeys(p for p in (e.get('associated_filename'), e.get('sorted_path'), e.get('reconstructed_path'),
+                                                      e.get('saved_as'), e.get('file')) if p)
+                    self.conn.execute("INSERT INTO files_fts(rowid, path, content) VALUES (?, ?, ?)",
+                                      (cur.lastrowid, " ".join(paths), _read_block(manifest_path, e)))
+        log.info(f"Catalog: indexed {len(manifest)} entries from {manifest_path}", event="catalog_manifest", path=manifest_path, entries=len(manifest))
+        return True
+
+    # --- Queries -----------------------------------------------------------
+
+    def search_files(self, path=None, language=None, session=None, limit=50):
+        """
+        Finds extracted files by (partial) path and/or language, newest entries last.
+        """
+        clauses = []
+        params = []
+        if path:
+            like = f"%{path}%"
+            clauses.append("(f.associated_filename LIKE ? OR f.reconstructed_path LIKE ? OR f.sorted_path LIKE ? OR f.saved_as LIKE ?)")
+            params.extend([like, like, like, like])
+        if language:
+            clauses.append("f.language = ?")
+            params.append(language)
+        if session:
+            clauses.append("s.name = ?")
+            params.append(session)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT s.name, f.manifest_path, f.entry_index, f.language, f.associated_filename, f.saved_as, f.reconstructed_path, f.block_file "
+            f"FROM files f JOIN sessions s ON s.id = f.session_id {where} "
+            "ORDER BY s.name, f.manifest_path, f.entry_index LIMIT ?"
+        )
+        params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+    def search_text(self, query, session=None, role=None, include_thoughts=True, limit=50):
+        """
+        Full-text search over turn text (FTS5 when available: all words, see fts_query).
+        """
+        match = fts_query(query)
+        if self.has_fts and match:
+            try:
+                return self._search_text(match, session, role, include_thoughts, limit, use_fts=True)
+            except sqlite3.OperationalError as e:
+                log.warning(f"Full-text query failed ({e}), searching with LIKE instead")
+        return self._search_text(query, session, role, include_thoughts, limit, use_fts=False)
+
+    def _search_text(self, query, session, role, include_thoughts, limit, use_fts):
+        clauses = []
+        params = []
+        if use_fts:
+            base = (
+                "SELECT s.name, t.turn_index, t.role, t.is_thought, snippet(turns_fts, 0, '[', ']', '...', 12) "
+                "FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid JOIN sessions s ON s.id = t.session_id "
+            )
+            clauses.append("turns_fts MATCH ?")
+            params.append(query)
+        else:
+            base = (
+                "SELECT s.name, t.turn_index, t.role, t.is_thought, substr(t.text, 1, 120) "
+                "FROM turns t JOIN sessions s ON s.id = t.session_id "
+            )
+            clauses.append("t.text LIKE ?")
+            params.append(f"%{query}%")
+        if session:
+            clauses.append("s.name = ?")
+            params.append(session)
+        if role:
+            clauses.append("t.role = ?")
+            params.append(role)
+        if not include_thoughts:
+            clauses.append("t.is_thought = 0")
+        sql = f"{base} WHERE {' AND '.join(clauses)} ORDER BY s.name, t.turn_index LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+    def search_code(self, query, session=None, language=None, limit=50):
+        """
+        Full-text search over the contents and paths of extracted blocks (FTS5 when
+        available, otherwise a LIKE match on the paths only).
+        """
+        match = fts_query(query)
+        if self.has_fts and match:
+            try:
+                return self._search_code(match, session, language, limit, use_fts=True)
+            except sqlite3.OperationalError as e:
+                log.warning(f"Full-text query failed ({e}), searching paths with LIKE instead")
+        return self._search_code(query, session, language, limit, use_fts=False)
+
+    def _search_code(self, query, session, language, limit, use_fts):
+        clauses = []
+        params = []
+        if use_fts:
+            base = (
+                "SELECT s.name, f.manifest_path, f.entry_index, f.language, f.associated_filename, f.block_file, "
+                "snippet(files_fts, 1, '[', ']', '...', 12) "
+                "FROM files_fts JOIN files f ON f.id = files_fts.rowid JOIN sessions s ON s.id = f.session_id "
+            )
+            clauses.append("files_fts MATCH ?")
+            params.append(query)
+        else:
+            base = (
+                "SELECT s.name, f.manifest_path, f.entry_index, f.language, f.associated_filename, f.block_file, '' "
+                "FROM files f JOIN sessions s ON s.id = f.session_id "
+            )
+            like = f"%{query}%"
+            clauses.append("(f.associated_filename LIKE ? OR f.sorted_path LIKE ? OR f.saved_as LIKE ?)")
+            params.extend([like, like, like])
+        if session:
+            clauses.append("s.name = ?")
+            params.append(session)
+        if language:
+            clauses.append("f.language = ?")
+            params.append(language)
+        sql = f"{base} WHERE {' AND '.join(clauses)} ORDER BY s.name, f.manifest_path, f.entry_index LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+    def stats(self):
+        counts = {}
+        for table in ('sessions', 'turns', 'manifests', 'files'):
+            counts[table] = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return counts
+
+
+def catalog_extraction_results(db_path, input_path, results):
+    """
+    Records the manifests produced by a markdown_extractor run.
+    The owning session is the one whose output directory contains the input file;
+    otherwise a session named after the input file is created.
+    """
+    try:
+        with Catalog(db_path) as catalog:
+            match = catalog.session_for_path(input_path)
+            if match:
+                session_id = match[0]
+            else:
+                name = os.path.splitext(os.path.basename(input_path))[0]
+                session_id = catalog.ensure_session(name, os.path.dirname(os.path.abspath(input_path)))
+
+            for result in results:
+                if result and result.get('manifest_path') and result.get('manifest'):
+                    catalog.record_manifest(session_id, result['manifest_path'], result['manifest'])
+    except sqlite3.Error as e:
+        log.error(f"Catalog update failed ({db_path}): {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the ParseAI session catalog.")
+    parser.add_argument("catalog", help="Path to the catalog database (e.g. output/catalog.sqlite).")
+    parser.add_argument("--path", "-p", help="Find extracted files whose path contains this string (e.g. 'src/auth.py').")
+    parser.add_argument("--language", "-l", help="Filter extracted files by language tag.")
+    parser.add_argument("--text", "-t", help="Full-text search over conversation turns.")
+    parser.add_argument("--code", "-c", help="Full-text search over the contents and paths of extracted code blocks.")
+    parser.add_argument("--session", help="Restrict results to one session.")
+    parser.add_argument("--role", help="Restrict text search to a role (user, model, system).")
+    parser.add_argument("--no-thoughts", action='store_true', help="Exclude thought chunks from text search.")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum rows to print (default: 50).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.catalog):
+        print(f"Catalog not found: {args.catalog}")
+        sys.exit(1)
+
+    with Catalog(args.catalog) as catalog:
+        start = time.perf_counter()
+
+        if args.text:
+            rows = catalog.search_text(args.text, session=args.session, role=args.role,
+                                       include_thoughts=not args.no_thoughts, limit=args.limit)
+            for name, turn_index, role, is_thought, snippet in rows:
+                kind = "thought" if is_thought else "turn"
+                print(f"{name} #{turn_index} [{role} {kind}] {snippet}")
+        elif args.code:
+            rows = catalog.search_code(args.code, session=args.session, language=args.language, limit=args.limit)
+            for name, manifest_path, entry_index, language, assoc, block_file, snippet in rows:
+                print(f"{name}  {assoc or block_file}  ({language})  [{manifest_path}#{entry_index}]  {snippet}")
+        elif args.path or args.language or args.session:
+            rows = catalog.search_files(path=args.path, language=args.language, session=args.session, limit=args.limit)
+            for name, manifest_path, entry_index, language, assoc, saved_as, recon, block_file in rows:
+                target = recon or saved_as or block_file
+                print(f"{name}  {assoc or '-'}  ({language})  -> {target}  [{manifest_path}#{entry_index}]")
+        else:
+            rows = [catalog.stats()]
+            print(json.dumps(rows[0], indent=2))
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"{len(rows)} result(s) in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
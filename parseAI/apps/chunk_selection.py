@@ -0,0 +1,121 @@
+import re
+
+THOUGHT_MODES = ("include", "exclude", "only")
+
+# Keys added to an export's 'chunkedPrompt' once a selection has been applied
+TURNS_KEY = "selectedTurns"      # original index of every chunk that was kept
+SELECTION_KEY = "selection"      # the selection's spec(), part of the render state header
+
+_RANGE = re.compile(r'^(\d*)\s*-\s*(\d*)$')
+
+
+def parse_turns(value):
+    """
+    Parses a --turns value into a list of inclusive (first, last) ranges of 0-based turn
+    indexes; 'last' is None for an open range. Accepts '5', '3-10', '10-' and '-4', comma
+    separated. Raises ValueError on anything else.
+    """
+    ranges = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if part.isdigit():
+            ranges.append((int(part), int(part)))
+            continue
+        m = _RANGE.match(part)
+        if not m or not (m.group(1) or m.group(2)):
+            raise ValueError(f"not a turn index or range: '{part}'")
+        first = int(m.group(1)) if m.group(1) else 0
+        last = int(m.group(2)) if m.group(2) else None
+        if last is not None and last < first:
+            raise ValueError(f"empty turn range: '{part}'")
+        ranges.append((first, last))
+    if not ranges:
+        raise ValueError("no turns selected")
+    return sorted(ranges, key=lambda r: (r[0], float('inf') if r[1] is None else r[1]))
+
+
+class ChunkSelection:
+    """
+    Which chunks of an export are processed: 'roles' (raw role keys such as 'user' and
+    'model', None for all), thoughts ('include', 'exclude' or 'only') and 'turns' (ranges
+    from parse_turns, None for all). It is applied once, when an export is loaded, so every
+    output (Markdown, HTML, PDF, catalog, extraction) only ever sees the selected chunks.
+    """
+
+    def __init__(self, roles=None, thoughts="include", turns=None):
+        if thoughts not in THOUGHT_MODES:
+            raise ValueError(f"thoughts must be one of {', '.join(THOUGHT_MODES)}")
+        self.roles = frozenset(roles) if roles else None
+        self.thoughts = thoughts
+        self.turns = turns or None
+
+    @classmethod
+    def from_args(cls, args):
+        """Builds the selection from --roles, --turns, --thoughts and --no-thoughts; raises ValueError."""
+        roles = None
+        if getattr(args, 'roles', None):
+            roles = [r.strip().lower() for r in args.roles.split(',') if r.strip()]
+            if not roles:
+                raise ValueError("--roles: no role given")
+        turns = parse_turns(args.turns) if getattr(args, 'turns', None) else None
+        thoughts = "exclude" if getattr(args, 'no_thoughts', False) else getattr(args, 'thoughts', None) or "include"
+        return cls(roles, thoughts, turns)
+
+    def is_all(self):
+        return self.roles is None and self.thoughts == "include" and self.turns is None
+
+    def spec(self):
+        """Canonical description ('' when everything is selected)."""
+        parts = []
+        if self.roles is not None:
+            parts.append("roles=" + ",".join(sorted(self.roles)))
+        if self.thoughts != "include":
+            parts.append(f"thoughts={self.thoughts}")
+        if self.turns is not None:
+            parts.append("turns=" + ",".join(f"{a}-{'' if b is None else b}" for a, b in self.turns))
+        return ";".join(parts)
+
+    def selects(self, index, chunk):
+        if self.turns is not None and not any(first <= index and (last is None or index <= last) for first, last in self.turns):
+            return False
+        if self.roles is not None and chunk.get('role', 'unknown') not in self.roles:
+            return False
+        is_thought = bool(chunk.get('isThought', False))
+        if is_thought:
+            return self.thoughts != "exclude"
+        return self.thoughts != "only"
+
+    def apply(self, data):
+        """
+        Drops the chunks of a loaded export that are not selected (in place) and records the
+        original indexes of the others under TURNS_KEY. Returns 'data'.
+        """
+        prompt = data.get('chunkedPrompt') if isinstance(data, dict) else None
+        if self.is_all() or not isinstance(prompt, dict) or 'chunks' not in prompt:
+            return data
+        chunks = prompt['chunks']
+        last_turn = None
+        if self.turns is not None and all(last is not None for _, last in self.turns):
+            last_turn = max(last for _, last in self.turns)
+            chunks = chunks[:last_turn + 1]
+        kept = [i for i, chunk in enumerate(chunks) if self.selects(i, chunk)]
+        prompt['chunks'] = [chunks[i] for i in kept]
+        prompt[TURNS_KEY] = kept
+        prompt[SELECTION_KEY] = self.spec()
+        return data
+
+
+def turn_indexes(prompt):
+    """Original turn index of each chunk in an export's 'chunkedPrompt', selected or not."""
+    kept = prompt.get(TURNS_KEY)
+    return kept if kept is not None else range(len(prompt.get('chunks', [])))
+
+
+def add_arguments(parser):
+    """The selection options shared by the command line tools."""
+    parser.add_argument("--roles", help="Only process turns of these roles (comma-separated raw keys, e.g. user,model).")
+    parser.add_argument("--turns", help="Only process these 0-based turn indexes or ranges (e.g. 0-20,35,40-).")
+    parser.add_argument("--thoughts", choices=THOUGHT_MODES, default="include", help="Include thought chunks, exclude them or keep only them (default: include).")
+    parser.add_argument("--no-thoughts", action='store_true', help="Skip thought chunks (same as --thoughts exclude).")
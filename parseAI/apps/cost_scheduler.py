@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+from export_watchdog import resident_mb
+from safe_io import atomic_write
+from run_log import get_logger
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+log = get_logger("cost_scheduler")
+
+REPORT_FILENAME = "schedule_report.json"
+
+# Bytes read from the start of an export to estimate its chunk and thought volume
+PREFIX_SCAN_BYTES = 256 * 1024
+
+# Cost model of rendering one export. The PDF stage dominates, and grows with the number of
+# chunks (sections, rules, headings) more than with the text; thoughts render as plain
+# blockquotes and cost about half as much. Compare with the actual values in the report.
+SECONDS_PER_CHUNK = 0.04
+SECONDS_PER_MB = 3.0
+THOUGHT_WEIGHT = 0.5
+MEMORY_MB_PER_CHUNK = 0.04
+MEMORY_MB_PER_MB = 15.0
+
+# Seconds between resident memory samples where the peak cannot be read from getrusage
+SAMPLE_INTERVAL = 0.05
+
+_ROLE_KEY = re.compile(rb'"role"\s*:')
+_THOUGHT_FLAG = re.compile(rb'"isThought"\s*:\s*true')
+
+
+class ExportEstimate:
+    """
+    Estimated cost of one export: its size, chunk count and share of thought text (from the
+    first PREFIX_SCAN_BYTES, extrapolated), the render time and the working memory. After
+    it ran, 'seconds' and 'memory_mb' hold what was measured (None until then).
+    """
+    __slots__ = ('source', 'size', 'chunks', 'thought_share', 'estimated_seconds', 'estimated_memory_mb', 'seconds', 'memory_mb')
+
+    def __init__(self, source, size, chunks, thought_share):
+        self.source = source
+        self.size = size
+        self.chunks = chunks
+        self.thought_share = thought_share
+        size_mb = size / (1024 * 1024)
+        weight = 1 - (1 - THOUGHT_WEIGHT) * thought_share
+        self.estimated_seconds = (SECONDS_PER_CHUNK * chunks + SECONDS_PER_MB * size_mb) * weight
+        self.estimated_memory_mb = MEMORY_MB_PER_CHUNK * chunks + MEMORY_MB_PER_MB * size_mb
+        self.seconds = None
+        self.memory_mb = None
+
+    def as_dict(self):
+        return {
+            "source": self.source,
+            "size": self.size,
+            "chunks": self.chunks,
+            "thought_share": round(self.thought_share, 3),
+            "estimated_seconds": round(self.estimated_seconds, 3),
+            "estimated_memory_mb": round(self.estimated_memory_mb, 1),
+            "seconds": None if self.seconds is None else round(self.seconds, 3),
+            "memory_mb": None if self.memory_mb is None else round(self.memory_mb, 1),
+        }
+
+
+def _read_prefix(payload, limit):
+    if isinstance(payload, bytes):
+        return payload[:limit], len(payload)
+    with open(payload, 'rb') as f:
+        return f.read(limit), os.fstat(f.fileno()).st_size
+
+
+def estimate_export(source, payload, prefix_bytes=PREFIX_SCAN_BYTES):
+    """
+    Estimates an export (path on disk or archive member bytes) without parsing it: the
+    chunks in the prefix are found by their "role" keys, and a chunk counts as a thought
+    when "isThought": true appears before the next one.
+    """
+    try:
+        prefix, size = _read_prefix(payload, prefix_bytes)
+    except OSError:
+        return ExportEstimate(source, 0, 0, 0.0)
+    starts = [m.start() for m in _ROLE_KEY.finditer(prefix)]
+    if not starts:
+        return ExportEstimate(source, size, 0, 0.0)
+    bounds = starts + [len(prefix)]
+    thought_bytes = sum(bounds[i + 1] - bounds[i] for i in range(len(starts))
+                        if _THOUGHT_FLAG.search(prefix, bounds[i], bounds[i + 1]))
+    scale = size / len(prefix) if prefix else 1
+    return ExportEstimate(source, size, round(len(starts) * scale), thought_bytes / (bounds[-1] - bounds[0] or 1))
+
+
+def _peak_rss_mb():
+    """High-water mark of this process' resident memory in MB (getrusage), or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _PeakSampler:
+    """Samples the resident memory of this process from a background thread and keeps the highest value."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.peak = resident_mb(self.pid)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            rss = resident_mb(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        rss = resident_mb(self.pid)
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        return self.peak
+
+
+def run_measured(job, filename, payload, fresh_process=False, **kwargs):
+    """
+    Runs job(filename, payload, **kwargs) and returns (result, seconds, MB). MB is how far the
+    peak resident memory of this process rose above its level at the start (None where memory
+    cannot be read). With 'fresh_process' (a worker that runs only this export) the peak is
+    the getrusage high-water mark; otherwise, or without getrusage, a background thread
+    samples the resident memory while the job runs.
+    """
+    baseline = resident_mb(os.getpid())
+    sampler = None if fresh_process and resource is not None else _PeakSampler()
+    started = time.perf_counter()
+    try:
+        result = job(filename, payload, **kwargs)
+    finally:
+        seconds = time.perf_counter() - started
+        peak = _peak_rss_mb() if sampler is None else sampler.stop()
+    if baseline is None or peak is None:
+        return result, seconds, None
+    return result, seconds, max(0.0, peak - baseline)
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+class CostScheduler:
+    """
+    Orders exports by estimated render time, longest first, so the big ones do not start
+    last and hold up the end of a parallel run, and admits them into the worker pool only
+    while the estimated memory of the running exports stays within 'memory_ceiling' (MB;
+    None for no limit). An export estimated above the ceiling on its own runs alone.
+    Estimates and measured costs are written to '<output_dir>/schedule_report.json'.
+    """
+
+    def __init__(self, memory_ceiling=None, prefix_bytes=PREFIX_SCAN_BYTES):
+        self.memory_ceiling = memory_ceiling or None
+        self.prefix_bytes = prefix_bytes
+        self.estimates = []
+        self.running_mb = 0.0
+        self.started = time.monotonic()
+
+    def plan(self, sources):
+        """
+        Yields 'sources' as (filename, payload, estimate), exports on disk longest first.
+        Archive members are estimated as they stream in and keep their order, so an archive
+        is never buffered whole; they come after the files (as from iter_sources).
+        """
+        files = []
+        sources = iter(sources)
+        for filename, payload in sources:
+            if isinstance(payload, bytes):
+                yield from self._ordered(files)
+                files = []
+                yield filename, payload, self._estimate(filename, payload)
+                for filename, payload in sources:
+                    yield filename, payload, self._estimate(filename, payload)
+                return
+            files.append((filename, payload, self._estimate(filename, payload)))
+        yield from self._ordered(files)
+
+    def _estimate(self, filename, payload):
+        estimate = estimate_export(filename, payload, self.prefix_bytes)
+        self.estimates.append(estimate)
+        return estimate
+
+    def _ordered(self, files):
+        files.sort(key=lambda item: -item[2].estimated_seconds)
+        if files:
+            log.info(f"Scheduled {len(files)} exports longest first (estimated {sum(f[2].estimated_seconds for f in files):.0f}s of rendering)",
+                     event="schedule", exports=len(files))
+        for item in files:
+            log.debug(f"  {item[0]}: ~{item[2].estimated_seconds:.1f}s, ~{item[2].estimated_memory_mb:.0f} MB, {item[2].chunks} chunks",
+                      event="estimate", **item[2].as_dict())
+        return files
+
+    def admits(self, estimate):
+        """Whether 'estimate' may start now, given the exports still running."""
+        if self.memory_ceiling is None or self.running_mb <= 0:
+            return True
+        return self.running_mb + estimate.estimated_memory_mb <= self.memory_ceiling
+
+    def start(self, estimate):
+        if self.memory_ceiling is not None and estimate.estimated_memory_mb > self.memory_ceiling:
+            log.warning(f"{estimate.source} is estimated at {estimate.estimated_memory_mb:.0f} MB, above the memory ceiling; running it alone")
+        self.running_mb += estimate.estimated_memory_mb
+
+    def finish(self, estimate, seconds=None, memory_mb=None):
+        self.running_mb = max(0.0, self.running_mb - estimate.estimated_memory_mb)
+        estimate.seconds = seconds
+        estimate.memory_mb = memory_mb
+
+    def save_report(self, output_dir):
+        measured = [e for e in self.estimates if e.seconds is not None]
+        time_ratio = _median([e.seconds / e.estimated_seconds for e in measured if e.estimated_seconds > 0])
+        memory_ratio = _median([e.memory_mb / e.estimated_memory_mb for e in measured if e.memory_mb is not None and e.estimated_memory_mb > 0])
+        report = {
+            "model": {"seconds_per_chunk": SECONDS_PER_CHUNK, "seconds_per_mb": SECONDS_PER_MB, "thought_weight": THOUGHT_WEIGHT,
+                      "memory_mb_per_chunk": MEMORY_MB_PER_CHUNK, "memory_mb_per_mb": MEMORY_MB_PER_MB, "prefix_bytes": self.prefix_bytes},
+            "memory_ceiling_mb": self.memory_ceiling,
+            "makespan_seconds": round(time.monotonic() - self.started, 3),
+            # Median of actual / estimated over the exports that were measured
+            "time_ratio": None if time_ratio is None else round(time_ratio, 3),
+            "memory_ratio": None if memory_ratio is None else round(memory_ratio, 3),
+            "exports": [e.as_dict() for e in self.estimates],
+        }
+        report_path = os.path.join(output_dir, REPORT_FILENAME)
+        try:
+            atomic_write(report_path, json.dumps(report, indent=2))
+        except OSError as e:
+            log.error(f"Could not save the schedule report: {e}")
+            return
+        summary = f"actual/estimated time x{time_ratio:.2f}" if time_ratio is not None else "no measured exports"
+        if memory_ratio is not None:
+            summary += f", memory x{memory_ratio:.2f}"
+        log.info(f"Schedule report: {report_path} ({summary})", event="schedule_report", path=report_path,
+                 time_ratio=report["time_ratio"], memory_ratio=report["memory_ratio"])
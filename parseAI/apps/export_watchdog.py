@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from catalog import fingerprint_bytes, fingerprint_file
+from safe_io import atomic_write
+from run_log import get_logger
+
+log = get_logger("export_watchdog")
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+QUARANTINE_FILENAME = "quarantine.json"
+REPORT_FILENAME = "run_report.json"
+
+# How often running exports are checked against their limits, in seconds
+_POLL_INTERVAL = 0.25
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _context():
+    # 'fork' hands the payload (archive member bytes) to the worker without pickling it
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return multiprocessing.get_context()
+
+
+def resident_mb(pid):
+    """Resident memory of process 'pid' in MB, or None where it cannot be read."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def payload_fingerprint(payload):
+    """Identity of an export (path on disk or archive member bytes) for the quarantine."""
+    return fingerprint_bytes(payload) if isinstance(payload, bytes) else fingerprint_file(payload)
+
+
+def _export_worker(conn, job, filename, payload, kwargs):
+    def on_stage(stage):
+        conn.send(("stage", stage))
+
+    try:
+        ok = job(filename, payload, on_stage=on_stage, **kwargs)
+        conn.send(("done", bool(ok), None))
+    except BaseException as e:
+        conn.send(("done", False, f"{type(e).__name__}: {e}"))
+    conn.close()
+
+
+class ExportWatchdog:
+    """
+    Runs each export in its own worker process, at most 'workers' at a time, under a
+    wall-clock budget for the whole export ('timeout') and for each render stage
+    ('stage_timeout'), and a resident memory limit ('memory_limit', MB). Limits of 0/None
+    are not enforced.
+
+    The worker reports the stage it enters (load, markdown, html, pdf, ...) so a worker that
+    is killed is reported with the stage that hung. Killed and crashed exports are added to
+    '<output_dir>/quarantine.json' with their content fingerprint and skipped by later runs
+    until the export changes (or 'retry_quarantined' is set). Every run writes
+    '<output_dir>/run_report.json'.
+    """
+
+    def __init__(self, output_dir, timeout=None, stage_timeout=None, memory_limit=None, workers=1, retry_quarantined=False):
+        self.output_dir = output_dir
+        self.timeout = timeout or None
+        self.stage_timeout = stage_timeout or None
+        self.memory_limit = memory_limit or None
+        self.workers = max(1, workers)
+        self.retry_quarantined = retry_quarantined
+        self.quarantine_path = os.path.join(output_dir, QUARANTINE_FILENAME)
+        self.report_path = os.path.join(output_dir, REPORT_FILENAME)
+        self.quarantine = self._load_quarantine()
+        self.results = []
+
+        if self.memory_limit and resident_mb(os.getpid()) is None:
+            log.warning("Process memory cannot be read on this platform (install psutil); --memory-limit is not enforced")
+            self.memory_limit = None
+
+    def _load_quarantine(self):
+        if not os.path.exists(self.quarantine_path):
+            return {}
+        try:
+            with open(self.quarantine_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            log.warning(f"Ignoring unreadable quarantine list: {self.quarantine_path}")
+            return {}
+
+    def _record(self, filename, status, stage=None, seconds=0.0, error=None, fingerprint=None):
+        result = {"source": filename, "status": status, "stage": stage, "seconds": round(seconds, 3), "error": error}
+        self.results.append(result)
+
+        if status in ("timeout", "memory", "crashed"):
+            self.quarantine[filename] = {"fingerprint": fingerprint, "status": status, "stage": stage,
+                                         "error": error, "quarantined_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            log.error(f"Quarantined {filename}: {status} in stage '{stage}' ({error})", event="quarantined", source=filename, status=status, stage=stage)
+        elif status in ("ok", "failed") and filename in self.quarantine:
+            # It changed (or a retry was forced) and no longer hangs
+            del self.quarantine[filename]
+
+    def _start(self, ctx, job, filename, payload, kwargs):
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_export_worker, args=(child_conn, job, filename, payload, kwargs), daemon=True)
+        proc.start()
+        child_conn.close()
+        now = time.monotonic()
+        return {"filename": filename, "proc": proc, "conn": parent_conn, "stage": "start",
+                "started": now, "stage_started": now, "fingerprint": None}
+
+    def _violation(self, running, now):
+        """Returns (status, message) if a running export is over one of its limits."""
+        if self.timeout and now - running["started"] > self.timeout:
+            return "timeout", f"export exceeded {self.timeout:g}s"
+        if self.stage_timeout and now - running["stage_started"] > self.stage_timeout:
+            return "timeout", f"stage exceeded {self.stage_timeout:g}s"
+        if self.memory_limit:
+            rss = resident_mb(running["proc"].pid)
+            if rss is not None and rss > self.memory_limit:
+                return "memory", f"{rss:.0f} MB resident, limit {self.memory_limit:g} MB"
+        return None
+
+    def _finish(self, running, status, error=None):
+        running["conn"].close()
+        running["proc"].join()
+        seconds = time.monotonic() - running["started"]
+        self._record(running["filename"], status, running["stage"], seconds, error, running["fingerprint"])
+
+    def run(self, sources, job, **kwargs):
+        """
+        Runs job(filename, payload, on_stage=..., **kwargs) for every (filename, payload) in
+        'sources' under the limits, then saves the quarantine list and the run report.
+        Returns the list of per-export results.
+        """
+        ctx = _context()
+        started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        sources = iter(sources)
+        running = {}  # connection -> running export
+        exhausted = False
+
+        while True:
+            while not exhausted and len(running) < self.workers:
+                try:
+                    filename, payload = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                fingerprint = payload_fingerprint(payload)
+                entry = self.quarantine.get(filename)
+                if entry and entry.get("fingerprint") == fingerprint and not self.retry_quarantined:
+                    log.warning(f"Skipping quarantined export {filename} ({entry['status']} in stage '{entry['stage']}'; unchanged since)", event="quarantine_skip", source=filename)
+                    self._record(filename, "quarantined", entry.get("stage"))
+                    continue
+                item = self._start(ctx, job, filename, payload, kwargs)
+                item["fingerprint"] = fingerprint
+                running[item["conn"]] = item
+
+            if not running:
+                break
+
+            for conn in wait_connections(list(running), timeout=_POLL_INTERVAL):
+                item = running[conn]
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    del running[conn]
+                    item["proc"].join()
+                    self._finish(item, "crashed", f"worker exited with code {item['proc'].exitcode}")
+                    continue
+                if message[0] == "stage":
+                    item["stage"] = message[1]
+                    item["stage_started"] = time.monotonic()
+                else:
+                    del running[conn]
+                    _, ok, error = message
+                    self._finish(item, "ok" if ok else "failed", error)
+
+            now = time.monotonic()
+            for conn, item in list(running.items()):
+                violation = self._violation(item, now)
+                if violation:
+                    del running[conn]
+                    item["proc"].kill()
+                    self._finish(item, *violation)
+
+        self._save(started_at)
+        return self.results
+
+    def _save(self, started_at):
+        counts = {}
+        for result in self.results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        report = {
+            "started_at": started_at,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "limits": {"timeout": self.timeout, "stage_timeout": self.stage_timeout, "memory_limit_mb": self.memory_limit},
+            "counts": counts,
+            "exports": self.results,
+        }
+        try:
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir, exist_ok=True)
+            atomic_write(self.report_path, json.dumps(report, indent=2))
+            atomic_write(self.quarantine_path, json.dumps(self.quarantine, indent=2))
+        except OSError as e:
+            log.error(f"Could not save the run report: {e}")
+            return
+        summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "no exports"
+        log.info(f"Run report: {self.report_path} ({summary})", event="run_report", path=self.report_path, counts=counts)
@@ -0,0 +1,265 @@
+import os
+import re
+from pattern_guard import CUSTOM_PATTERN_FLAGS, precheck_patterns
+from run_log import get_logger
+
+log = get_logger("extraction_profile")
+
+# 1. FILENAME_HEADER (Explicit headers), as (pattern, flags); group 1 is the filename
+HEADER_PATTERNS = [
+    # Standard "Header: Value"
+    (r'### File \d+: `?([^\n`]+)`?', re.IGNORECASE),
+    # "Save as: main.py" - Standard loose name
+    (r'(?:save this as|(?:\bfile|\bfilename)\s*:)\s*`?([a-zA-Z0-9_./-]+)`?', re.IGNORECASE),
+    # "Create main.py" - STRICT: Must have extension to avoid "Create a directory"
+    (r'(?:create)\s+`?([a-zA-Z0-9_./-]+\.[a-zA-Z0-9]+)`?', re.IGNORECASE)
+]
+
+# 2. CODE_BLOCK (Fenced content)
+# Captures the entire line after ``` as the 'lang' group for later parsing; group 2 is the content
+BLOCK_PATTERN = (r'```([^\n]*)\n([\s\S]+?)```', re.DOTALL)
+
+# "python: my_script.py" in the fence line
+FENCE_META_PATTERN = r'^([a-zA-Z0-9_\-+#.]+):\s*(.+)$'
+
+# Detected names that are words, not files
+FILENAME_STOPWORDS = frozenset({'directory', 'folder', 'file', 'code', 'here', 'script', 'example', 'bash', 'python', 'json'})
+
+# Names accepted without an extension
+FILENAME_ALLOWLIST = frozenset({
+    'makefile', 'dockerfile', 'jenkinsfile', 'vagrantfile',
+    'readme', 'license', 'changelog', 'notice', 'procfile', 'gemfile'
+})
+
+# Entries kept per sanitization cache before it is cleared
+SANITIZE_CACHE_SIZE = 4096
+
+
+def _compile(pattern, flags, as_bytes):
+    """
+    Compiles a str pattern, or its UTF-8 bytes equivalent when scanning bytes-like input.
+    """
+    if as_bytes:
+        return re.compile(pattern.encode('utf-8'), flags)
+    return re.compile(pattern, flags)
+
+
+class _Compiled:
+    """
+    Regexes and caches for one set of patterns in this process, shared by every profile
+    with those patterns. This is the mutable part: bytes variants are compiled on first use
+    and sanitized names are cached as they are seen.
+    """
+    __slots__ = ('headers', 'block', 'custom', 'strip', 'fence_meta', 'flat_names', 'paths')
+
+    def __init__(self, custom_patterns, strip_patterns):
+        # Per scan mode: False for str input, True for bytes-like (mmap) input; the bytes
+        # variants are only compiled once an mmapped document needs them
+        self.headers = {False: tuple(_compile(p, f, False) for p, f in HEADER_PATTERNS)}
+        self.block = {False: _compile(*BLOCK_PATTERN, False)}
+        # (source, compiled or the re.error it raised) per --parse pattern
+        self.custom = {False: tuple((p, _compile(p, CUSTOM_PATTERN_FLAGS, False)) for p in custom_patterns)}
+        self.strip = tuple(re.compile(p) for p in strip_patterns)
+        self.fence_meta = re.compile(FENCE_META_PATTERN)
+        self.flat_names = {}
+        self.paths = {}
+
+
+# Compiled state by (custom patterns, strip patterns), built once per process
+_compiled = {}
+
+# Profiles by the (custom patterns, strip patterns) they were requested with (profile_for)
+_profiles = {}
+
+
+def _compiled_for(custom_patterns, strip_patterns):
+    key = (custom_patterns, strip_patterns)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = _compiled[key] = _Compiled(custom_patterns, strip_patterns)
+        for pattern_str in custom_patterns:
+            log.debug(f"Added custom pattern: {pattern_str}")
+    return compiled
+
+
+def profile_for(custom_patterns=None, strip_patterns=None):
+    """
+    The profile of these --parse / --strip patterns, validated and built once per process
+    for the same lists.
+    """
+    key = (tuple(custom_patterns or ()), tuple(strip_patterns or ()))
+    profile = _profiles.get(key)
+    if profile is None:
+        profile = _profiles[key] = ExtractionProfile(*key)
+    return profile
+
+
+class ExtractionProfile:
+    """
+    Everything extraction needs that does not depend on the document: the header, fence and
+    --parse patterns, the --strip rules and the filename stopword / allowlist tables.
+
+    A profile only holds its validated pattern sources and never changes, so one can serve
+    any number of CodeExtractors and documents, and it pickles as those sources. The
+    compiled regexes and the caches of sanitized names are per-process state keyed by the
+    sources (_compiled_for): a worker compiles them the first time it sees the patterns and
+    reuses them for every later job and profile with the same patterns.
+
+    The patterns are validated here (precheck_patterns for --parse) and nowhere else; use
+    profile_for to reuse the profile of patterns already seen.
+    """
+    __slots__ = ('custom_patterns', 'strip_patterns')
+
+    def __init__(self, custom_patterns=None, strip_patterns=None):
+        strip = []
+        for pattern_str in strip_patterns or []:
+            if not pattern_str:
+                continue
+            try:
+                re.compile(pattern_str)
+                strip.append(pattern_str)
+            except re.error as e:
+                log.warning(f"Ignoring --strip pattern '{pattern_str}': {e}")
+        object.__setattr__(self, 'custom_patterns', tuple(precheck_patterns(custom_patterns)))
+        object.__setattr__(self, 'strip_patterns', tuple(strip))
+        _compiled_for(self.custom_patterns, self.strip_patterns)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ExtractionProfile is immutable")
+
+    def __getstate__(self):
+        return {'custom_patterns': self.custom_patterns, 'strip_patterns': self.strip_patterns}
+
+    def __setstate__(self, state):
+        object.__setattr__(self, 'custom_patterns', state['custom_patterns'])
+        object.__setattr__(self, 'strip_patterns', state['strip_patterns'])
+
+    @property
+    def _compiled(self):
+        return _compiled_for(self.custom_patterns, self.strip_patterns)
+
+    def header_regexes(self, as_bytes=False):
+        compiled = self._compiled
+        if as_bytes not in compiled.headers:
+            compiled.headers[as_bytes] = tuple(_compile(p, f, as_bytes) for p, f in HEADER_PATTERNS)
+        return compiled.headers[as_bytes]
+
+    def block_regex(self, as_bytes=False):
+        compiled = self._compiled
+        if as_bytes not in compiled.block:
+            compiled.block[as_bytes] = _compile(*BLOCK_PATTERN, as_bytes)
+        return compiled.block[as_bytes]
+
+    def custom_regexes(self, as_bytes=False):
+        """
+        The --parse patterns usable for this input type, as (sources, compiled regexes).
+        A pattern that only compiles as str (e.g. with (?u) or \\N{...}) is left out of
+        bytes-like (mmap) documents with a warning each time.
+        """
+        compiled = self._compiled
+        if as_bytes not in compiled.custom:
+            entries = []
+            for pattern_str in self.custom_patterns:
+                try:
+                    entries.append((pattern_str, _compile(pattern_str, CUSTOM_PATTERN_FLAGS, as_bytes)))
+                except re.error as e:
+                    entries.append((pattern_str, e))
+            compiled.custom[as_bytes] = tuple(entries)
+        sources = []
+        regexes = []
+        for pattern_str, regex in compiled.custom[as_bytes]:
+            if isinstance(regex, re.error):
+                log.warning(f"Failed to compile custom pattern '{pattern_str}': {regex}", event="pattern_invalid", pattern=pattern_str)
+                continue
+            sources.append(pattern_str)
+            regexes.append(regex)
+        return sources, regexes
+
+    def match_fence_meta(self, fence_info):
+        """(language, filename) of a "lang: filename" fence line, or None."""
+        m = self._compiled.fence_meta.match(fence_info)
+        if m is None:
+            return None
+        return m.group(1).strip(), m.group(2).strip()
+
+    def is_valid_filename(self, filename):
+        """
+        Validates if a detected string is likely a real filename.
+        """
+        filename = filename.strip()
+
+        # 1. Basic Length/Content check
+        if len(filename) < 2: return False
+        if ' ' in filename: return False
+
+        # 2. Block Bad Prefixes (underscore often implies internal code ref, not file)
+        if filename.startswith('_'): return False
+
+        # 3. Stopwords
+        if filename.lower() in FILENAME_STOPWORDS: return False
+
+        # 4. Extension Requirement
+        # If no extension, MUST be in allowlist
+        _, ext = os.path.splitext(filename)
+        if not ext and filename.lower() not in FILENAME_ALLOWLIST:
+            return False
+
+        return True
+
+    def flat_name(self, filename):
+        """
+        Name of 'filename' in the flat 'files/' view: separators flattened to underscores,
+        strictly sanitized, then the --strip rules applied.
+        """
+        compiled = self._compiled
+        cache = compiled.flat_names
+        name = cache.get(filename)
+        if name is None:
+            name = sanitize_filename(filename.replace('/', '_').replace('\\', '_'))
+            for regex in compiled.strip:
+                name = regex.sub('', name)
+            if len(cache) >= SANITIZE_CACHE_SIZE:
+                cache.clear()
+            cache[filename] = name
+        return name
+
+    def clean_path(self, path):
+        """sanitize_path(path), cached."""
+        cache = self._compiled.paths
+        clean = cache.get(path)
+        if clean is None:
+            clean = sanitize_path(path)
+            if len(cache) >= SANITIZE_CACHE_SIZE:
+                cache.clear()
+            cache[path] = clean
+        return clean
+
+
+def sanitize_filename(filename):
+    """
+    Strict sanitization: Removes ALL path separators. Used for 'flat' filenames.
+    """
+    # Remove invalid characters including slashes
+    filename = re.sub(r'[<>:"/\\|?*]', '', filename)
+    # Collapse whitespace
+    filename = re.sub(r'\s+', '_', filename)
+    return filename.strip()
+
+
+def sanitize_path(path):
+    """
+    Path sanitization: Allows slashes but removes other dangerous chars.
+    Used for 'reconstructed' paths.
+    """
+    # Collapse whitespace
+    path = re.sub(r'\s+', '_', path)
+    # Remove invalid characters EXCEPT / and \
+    # regex for [<>:"|?*]
+    path = re.sub(r'[<>:"|?*]', '', path)
+    # Normalize slashes to OS separator?
+    path = os.path.normpath(path)
+    # Remove leading slashes to ensure it's relative
+    while path.startswith(os.sep):
+        path = path[1:]
+    return path.strip()
+
@@ -0,0 +1,50 @@
+import os
+import hashlib
+
+# Layouts an extraction can materialize under '<source>_files/'
+#   blocks:        code_blocks/block_NNNN.<lang>, every block as written in the conversation
+#   files:         files/<flat name>, blocks associated with a filename
+#   reconstructed: reconstructed/<path>, the same with their directory structure
+VIEWS = ("blocks", "files", "reconstructed")
+VIEW_DIRS = {"blocks": "code_blocks", "files": "files", "reconstructed": "reconstructed"}
+
+# Content store used for blocks when the 'blocks' view is not materialized
+OBJECTS_DIR = "objects"
+
+def parse_views(value):
+    """
+    Parses a --views value ('files,reconstructed', 'all') into a tuple in VIEWS order.
+    Raises ValueError for unknown names or an empty selection.
+    """
+    names = {v.strip().lower() for v in value.split(',') if v.strip()}
+    if "all" in names:
+        return VIEWS
+    unknown = names - set(VIEWS)
+    if unknown:
+        raise ValueError(f"unknown view(s): {', '.join(sorted(unknown))} (choose from {', '.join(VIEWS)})")
+    if not names:
+        raise ValueError("no view selected")
+    return tuple(v for v in VIEWS if v in names)
+
+
+def object_id(content):
+    return hashlib.sha1(content.encode('utf-8') if isinstance(content, str) else content).hexdigest()
+
+
+def object_path(base_extraction_dir, oid):
+    return os.path.join(base_extraction_dir, OBJECTS_DIR, oid[:2], oid)
+
+
+def block_content_path(base_extraction_dir, entry):
+    """Where the raw content of a manifest entry is stored: its object, else its code_blocks file."""
+    if entry.get("object"):
+        return object_path(base_extraction_dir, entry["object"])
+    return os.path.join(base_extraction_dir, VIEW_DIRS["blocks"], entry["file"])
+
+
+def file_content(raw):
+    """
+    The content written to files/ and reconstructed/ for an entry, from its raw block:
+    surrounding whitespace removed the way the extraction did it.
+    """
+    return raw.strip()
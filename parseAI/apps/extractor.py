@@ -1,11 +1,152 @@
 import re
 import os
+import time
+from operator import attrgetter
+from history_store import HistoryStore
+from manifest_journal import ManifestJournal, source_fingerprint
+from source_map import SourceMap
+from parallel_scan import PARALLEL_SCAN_MIN_SIZE, scan_parallel
+from safe_io import DirectoryLock, atomic_copy, atomic_write
+from extraction_views import VIEWS, VIEW_DIRS, block_content_path, file_content, object_id, object_path
+from pattern_guard import DEFAULT_PATTERN_TIMEOUT, run_patterns_guarded, run_patterns_inline, print_pattern_report
+from plugin_host import PLUGIN_BATCH_SIZE, PluginBlock
+from extraction_profile import BLOCK_PATTERN, HEADER_PATTERNS, profile_for, sanitize_filename, sanitize_path
+from run_log import Progress, get_logger
+
+log = get_logger("extractor")
+
+# Event kinds recorded while scanning
+SPAN_HEADER = 0
+SPAN_BLOCK = 1
+SPAN_CUSTOM_HEADER = 2
+SPAN_PLUGIN_HEADER = 3
+
+# 'method' recorded in a block's name_source for each header kind
+HEADER_METHODS = {SPAN_HEADER: "header", SPAN_CUSTOM_HEADER: "custom_pattern", SPAN_PLUGIN_HEADER: "plugin"}
+
+# With --history and a journal, changed history records are written (and the blocks behind
+# them checkpointed) every this many blocks or seconds, whichever comes first
+HISTORY_FLUSH_EVERY = 64
+HISTORY_FLUSH_SECONDS = 5.0
+
+
+class Span:
+    """
+    A detected event stored as offsets into the source text.
+
+    - SPAN_HEADER / SPAN_CUSTOM_HEADER / SPAN_PLUGIN_HEADER: [start:end] is the (stripped)
+      filename, 'pos' is where the header match (built-in, --parse pattern or plugin
+      on_text_scan) begins.
+    - SPAN_BLOCK: [start:end] is the raw block content, 'pos' is the opening fence; the fence
+      info string (language / inline filename) is source[pos + 3:start - 1].
+
+    Content is only sliced out of the source when it is written.
+    """
+    __slots__ = ('kind', 'pos', 'start', 'end')
+
+    def __init__(self, kind, pos, start, end):
+        self.kind = kind
+        self.pos = pos
+        self.start = start
+        self.end = end
+
+
+# ASCII whitespace as byte values (what str.isspace() accepts below 0x80)
+_BYTE_WHITESPACE = frozenset(b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')
+
+
+def _is_space_bytes(text, start, end):
+    """True if the UTF-8 character in text[start:end] is whitespace to str.isspace()."""
+    return text[start:end].decode('utf-8', errors='replace').isspace()
+
+
+def _strip_span(text, start, end):
+    """
+    Returns (start, end) narrowed past leading/trailing whitespace, without copying the slice.
+    'text' may be a str or a bytes-like source (bytes, mmap); the whitespace is the same for
+    both (str.isspace()): ASCII bytes are checked as they are, any other character is
+    decoded on its own.
+    """
+    if isinstance(text, str):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    while start < end:
+        lead = text[start]
+        if lead < 0x80:
+            if lead not in _BYTE_WHITESPACE:
+                break
+            start += 1
+            continue
+        size = 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+        if not _is_space_bytes(text, start, min(start + size, end)):
+            break
+        start += size
+    while end > start:
+        last = text[end - 1]
+        if last < 0x80:
+            if last not in _BYTE_WHITESPACE:
+                break
+            end -= 1
+            continue
+        # Back to the lead byte of the last character
+        char_start = end - 1
+        while char_start > start and end - char_start < 4 and 0x80 <= text[char_start] < 0xC0:
+            char_start -= 1
+        if not _is_space_bytes(text, char_start, end):
+            break
+        end = char_start
+    return start, end
+
+
+def _slice(text, start, end):
+    """
+    Slices [start:end] out of the source, decoding it if the source is bytes-like (mmap input).
+    """
+    piece = text[start:end]
+    if isinstance(piece, bytes):
+        return piece.decode('utf-8', errors='replace')
+    return piece
+
+
+def _finditer(pattern, text, segments=None, start=0):
+    """
+    finditer over the whole source, or separately over each (start, end) segment so that
+    no match can span two segments (e.g. two conversation chunks). Matches before 'start'
+    are not looked for.
+    """
+    if segments is None:
+        yield from pattern.finditer(text, start)
+        return
+    for seg_start, seg_end in segments:
+        if seg_end > start:
+            yield from pattern.finditer(text, max(seg_start, start), seg_end)
+
 
 class CodeExtractor:
 
 
-    def __init__(self, output_base_dir):
+    def __init__(self, output_base_dir, archive=None, history=False, views=None, plugins=None, profile=None):
         self.output_base_dir = output_base_dir
+        # Compiled patterns, strip rules and filename tables (extraction_profile.py), shared across documents
+        self.profile = profile or profile_for()
+        # Optional ArchiveWriter (archive_output.py): paths under its root go into the archive instead of the disk
+        self.archive = archive
+        # Opt-in: keep earlier versions as deltas in '<source>_files/history/' instead of '_vN' copies
+        self.history = history
+        self.history_store = None
+        # Layouts written by extract_from_text (extraction_views.VIEWS); 'reconstructed' also needs reconstruct=True
+        self.views = set(views or VIEWS)
+        self._stored_objects = set()
+        # Optional PluginHost (plugin_host.py) whose hooks run on every extracted document
+        self.plugins = plugins
+        # Manifest of the last extract_from_text call (kept in memory for callers)
+        self.manifest = []
+        # Timing/status of each custom pattern in the last extract_from_text call
+        self.pattern_report = []
 
     def extract_from_text(self, text, source_filename):
         """
@@ -37,11 +178,72 @@ class CodeExtractor:
             re.DOTALL | re.MULTILINE
         )
 
-    def extract_from_text(self, text, source_filename, custom_patterns=None, add_numbering=False, strip_patterns=None, reconstruct=False):
+    def extract_from_chunks(self, chunks, source_filename, turn_indexes=None, **kwargs):
+        """
+        Extracts code straight from the 'chunks' of a JSON export, without rendering the
+        session Markdown first. Each chunk's raw text (thoughts unquoted) is scanned on its own,
+        so a fence can never pair across turns; every manifest entry records the chunk's turn
+        index and role. Which chunks (thoughts included) are extracted is decided by the
+        selection the export was loaded with; 'turn_indexes' gives the export's turn index of
+        each chunk when only some were selected (chunk_selection.py). Other keyword arguments
+        are passed to extract_from_text.
+        """
+        parts = []
+        segments = []
+        turns = []
+        pos = 0
+        if turn_indexes is None:
+            turn_indexes = range(len(chunks))
+        for turn_index, chunk in zip(turn_indexes, chunks):
+            is_thought = bool(chunk.get('isThought', False))
+            chunk_text = chunk.get('text', '')
+            segments.append((pos, pos + len(chunk_text)))
+            turns.append((pos, turn_index, chunk.get('role', 'unknown'), is_thought))
+            parts.append(chunk_text)
+            parts.append("\n\n")
+            pos += len(chunk_text) + 2
+
+        return self.extract_from_text("".join(parts), source_filename, segments=segments, turns=turns, **kwargs)
+
+    def extract_from_text(self, text, source_filename, custom_patterns=None, add_numbering=False, strip_patterns=None, reconstruct=False, pattern_timeout=DEFAULT_PATTERN_TIMEOUT, resume=False, segments=None, turns=None, scan_workers=1, incremental=False):
         """
         Parses text for ALL code blocks and writes them to disk sequentially.
         Ignores headers or filenames in the text.
+
+        'text' may also be a bytes-like object such as an mmap of the input file. Detection
+        then runs over the raw UTF-8 bytes (ASCII semantics for \\s, \\w and case folding)
+        and only the slices that become files are decoded.
+
+        Custom patterns run in a separate worker process with a 'pattern_timeout' (seconds)
+        budget each; a pattern that overruns is killed and skipped. 0/None runs them inline.
+
+        Every committed block is appended to '<source>_files/manifest.jsonl'. With 'resume',
+        blocks already recorded there for the same input are skipped and extraction continues
+        from the last checkpoint offset. With 'incremental', a completed journal of an earlier,
+        shorter version of the input (the same session re-exported with turns appended) is
+        continued the same way: only the text after its last block is scanned and extracted,
+        and an unchanged input is not extracted again.
+
+        'segments' limits detection to (start, end) ranges scanned independently and 'turns'
+        gives the turn boundaries for the source map; both are set by extract_from_chunks.
+
+        With 'scan_workers' > 1, inputs of at least PARALLEL_SCAN_MIN_SIZE are scanned for
+        headers and blocks by that many processes (parallel_scan.py); the events are the same
+        as from the serial scan, so filename association is unchanged.
+
+        With plugins (self.plugins), on_text_scan candidates are added as headers, and the
+        blocks go through on_blocks_extracted in batches of PLUGIN_BATCH_SIZE before they are
+        written; a block a plugin changed records the plugin names under 'modified_by'.
+
+        The patterns, strip rules and filename checks come from self.profile. Passing
+        'custom_patterns' or 'strip_patterns' uses the profile of those instead (profile_for:
+        validated and built once per process for the same lists).
         """
+        scan_bytes = not isinstance(text, str)
+        profile = self.profile
+        if custom_patterns is not None or strip_patterns is not None:
+            profile = profile_for(custom_patterns, strip_patterns)
+
         # Create a directory for this source file's extractions
         source_name = os.path.splitext(os.path.basename(source_filename))[0]
         base_extraction_dir = os.path.join(self.output_base_dir, f"{source_name}_files")
@@ -51,82 +253,144 @@ class CodeExtractor:
         # New: Reconstructed directory
         dir_reconstructed = os.path.join(base_extraction_dir, "reconstructed")
 
+        if self.history:
+            self.history_store = HistoryStore(os.path.join(base_extraction_dir, "history"), base_dir=base_extraction_dir, archive=self.archive)
+
         manifest = []
         count = 0
 
-        # --- TOKEN TYPES ---
-        # 1. FILENAME_HEADER (Explicit headers)
-        filename_patterns = [
-            # Standard "Header: Value"
-            re.compile(r'### File \d+: `?([^\n`]+)`?', re.IGNORECASE),
-            # "Save as: main.py" - Standard loose name
-            re.compile(r'(?:save this as|(?:\bfile|\bfilename)\s*:)\s*`?([a-zA-Z0-9_./-]+)`?', re.IGNORECASE),
-            # "Create main.py" - STRICT: Must have extension to avoid "Create a directory"
-            re.compile(r'(?:create)\s+`?([a-zA-Z0-9_./-]+\.[a-zA-Z0-9]+)`?', re.IGNORECASE)
-        ]
-
-        # 1b. CUSTOM PATTERNS (User provided)
-        if custom_patterns:
-            for pattern_str in custom_patterns:
-                try:
-                    # simple validation/compilation
-                    # We assume the user provides a regex where group 1 is the filename
-                    cp = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE)
-                    filename_patterns.append(cp)
-                    print(f"Added custom pattern: {pattern_str}")
-                except Exception as e:
-                    print(f"Failed to compile custom pattern '{pattern_str}': {e}")
-
-        # 2. CODE_BLOCK (Fenced content)
-        # Modified to capture the entire line after ``` as the 'lang' group for later parsing
-        block_pattern = re.compile(r'```([^\n]*)\n([\s\S]+?)```', re.DOTALL)
-
-        # Collect all "Events" with their positions
+        # 1b. CUSTOM PATTERNS (User provided), validated with the profile; executed under a time budget below
+        custom_sources, custom_regexes = profile.custom_regexes(scan_bytes) if profile.custom_patterns else ((), ())
+
+        # Checkpoint journal (disk output only; an archive is always rebuilt from scratch)
+        journal = None
+        resume_state = None
+        if self.archive is None:
+            journal = ManifestJournal(base_extraction_dir)
+            source_info = source_fingerprint(text, source_filename)
+            if resume or incremental:
+                resume_state = journal.load(source_info, text if incremental else None)
+            if resume and resume_state is None:
+                log.info(f"No usable checkpoint for {source_filename}, starting from the beginning")
+            elif incremental and resume_state is None:
+                log.info(f"No completed extraction of {source_filename} to extend, extracting everything")
+        elif resume:
+            log.warning("Resume is not available with archive output, starting from the beginning")
+        elif incremental:
+            log.warning("Incremental extraction is not available with archive output, extracting everything")
+
+        if incremental and resume_state and resume_state["complete"] and not resume_state["extended"]:
+            log.info(f"{source_filename} is unchanged since the last extraction, nothing to extract", event="source_unchanged", source=source_filename)
+            self.manifest = resume_state["entries"]
+            self.pattern_report = []
+            return resume_state["count"]
+
+        resume_offset = 0
+        scan_from = 0
+        if resume_state:
+            manifest = resume_state["entries"]
+            count = resume_state["count"]
+            resume_offset = resume_state["offset"]
+            if resume_offset and resume_state["pad_width"]:
+                # Nothing before the checkpoint is needed again: scan from past that block's closing fence
+                scan_from = resume_offset + 3
+            if resume_state["extended"]:
+                log.info(f"{source_filename} grew since the last extraction, extracting after offset {resume_offset} ({count} blocks already extracted)", event="extend", source=source_filename, offset=resume_offset, blocks=count)
+            else:
+                log.info(f"Resuming {source_filename} at offset {resume_offset} ({count} blocks already extracted)", event="resume", source=source_filename, offset=resume_offset, blocks=count)
+
+        # Scan for headers and blocks: (match_start, group_start, group_end) per match
+        scanned = None
+        if scan_workers > 1 and not scan_from and len(text) >= PARALLEL_SCAN_MIN_SIZE:
+            scanned = scan_parallel(text, HEADER_PATTERNS, BLOCK_PATTERN, scan_workers, segments)
+            if scanned is not None:
+                log.info(f"Scanned {source_filename} with {scan_workers} processes")
+        if scanned is None:
+            header_matches = []
+            for p in profile.header_regexes(scan_bytes):
+                header_matches.append([(m.start(), *m.span(1)) for m in _finditer(p, text, segments, scan_from)])
+            block_pattern = profile.block_regex(scan_bytes)
+            block_matches = [(m.start(), *m.span(2)) for m in _finditer(block_pattern, text, segments, scan_from)]
+        else:
+            header_matches, block_matches = scanned
+
+        # Collect all "Events" with their positions (offsets only, see Span)
         events = []
 
         # Find Headers
-        for p in filename_patterns:
-            for m in p.finditer(text):
-                fname = m.group(1).strip()
-                if fname:
-                    events.append({
-                        'type': 'filename',
-                        'start': m.start(),
-                        'name': fname,
-                        'source': 'header'
-                    })
+        for matches in header_matches:
+            for match_start, group_start, group_end in matches:
+                name_start, name_end = _strip_span(text, group_start, group_end)
+                if name_start < name_end:
+                    events.append(Span(SPAN_HEADER, match_start, name_start, name_end))
+
+        self.pattern_report = []
+        if custom_sources:
+            if pattern_timeout:
+                spans_by_pattern, self.pattern_report = run_patterns_guarded(custom_sources, text, pattern_timeout, as_bytes=scan_bytes, regexes=custom_regexes,
+                                                                             segments=segments, scan_from=scan_from)
+            else:
+                spans_by_pattern, self.pattern_report = run_patterns_inline(custom_sources, text, as_bytes=scan_bytes, regexes=custom_regexes,
+                                                                            segments=segments, scan_from=scan_from)
+            print_pattern_report(self.pattern_report, pattern_timeout)
+
+            for spans in spans_by_pattern:
+                for match_start, group_start, group_end in spans:
+                    name_start, name_end = _strip_span(text, group_start, group_end)
+                    if name_start < name_end:
+                        events.append(Span(SPAN_CUSTOM_HEADER, match_start, name_start, name_end))
+
+        plugin_host = self.plugins
+        if plugin_host is not None:
+            for plugin_name, spans in plugin_host.scan(text):
+                for match_start, group_start, group_end in spans:
+                    if match_start < scan_from:
+                        continue
+                    name_start, name_end = _strip_span(text, group_start, group_end)
+                    if name_start < name_end:
+                        events.append(Span(SPAN_PLUGIN_HEADER, match_start, name_start, name_end))
+            if not plugin_host.wants_blocks():
+                plugin_host = None
 
         # Find Blocks
-        for m in block_pattern.finditer(text):
-            events.append({
-                'type': 'block',
-                'start': m.start(),
-                'lang': m.group(1).strip() if m.group(1) else "text",
-                'content': m.group(2)
-            })
+        for match_start, content_start, content_end in block_matches:
+            events.append(Span(SPAN_BLOCK, match_start, content_start, content_end))
 
         # Sort events by position in text
-        events.sort(key=lambda x: x['start'])
+        events.sort(key=attrgetter('pos'))
 
         if events:
-            # Create subdirectories
-            # Always create blocks and files
-            dirs_to_create = [dir_blocks, dir_files]
-            if reconstruct:
+            # Create subdirectories for the selected views
+            dirs_to_create = []
+            if "blocks" in self.views:
+                dirs_to_create.append(dir_blocks)
+            if "files" in self.views:
+                dirs_to_create.append(dir_files)
+            if reconstruct and "reconstructed" in self.views:
                 dirs_to_create.append(dir_reconstructed)
 
-            for d in dirs_to_create:
-                if not os.path.exists(d):
-                    os.makedirs(d)
+            if self.archive is None:
+                for d in dirs_to_create:
+                    if not os.path.exists(d):
+                        os.makedirs(d)
 
-            print(f"Created extraction directories in: {base_extraction_dir}")
+                log.debug(f"Created extraction directories in: {base_extraction_dir}")
 
             # Calculate padding width
-            total_blocks = sum(1 for e in events if e['type'] == 'block')
+            total_blocks = sum(1 for e in events if e.kind == SPAN_BLOCK)
+            if scan_from:
+                # Blocks before the checkpoint were not scanned again
+                total_blocks += count
             width = len(str(total_blocks))
             pad_width = max(4, width)
+            if resume_state and resume_state["pad_width"]:
+                # Keep the block numbering of the run being continued
+                pad_width = max(pad_width, resume_state["pad_width"])
             
             current_filename = None
+            current_name_source = None
+            # Line / turn lookups for the manifest (indexes built on first use)
+            source_map = SourceMap(text, turns=turns)
             processed_filenames = set()
             file_versions = {} # Track version count for each file
             reconstructed_versions = {} # Track version count for reconstructed files
@@ -134,76 +398,152 @@ class CodeExtractor:
             # File creation counter for numbering feature
             file_creation_count = 0 
 
+            # The block after the checkpoint may have been partly written (and rotated) before the stop
+            resync_versions = False
+            if resume_state:
+                file_creation_count = resume_state["file_count"]
+                for rel_path, version in resume_state["versions"].items():
+                    target_dict = reconstructed_versions if rel_path.startswith("reconstructed/") else file_versions
+                    target_dict[os.path.join(base_extraction_dir, *rel_path.split('/'))] = version
+                resync_versions = True
+            if journal is not None:
+                journal.start(source_info, resume=bool(resume_state), extend=bool(resume_state and resume_state["extended"]), pad_width=pad_width)
+            # Blocks written but not journaled yet (--history), see HISTORY_FLUSH_EVERY
+            pending_commits = []
+            last_history_flush = time.monotonic()
+            progress = Progress(log, f"Extracting {source_filename}", total=len(text), start=scan_from)
+
+            # Plan the blocks first: which file each one belongs to only depends on the events,
+            # so plugins can then see (and change) them in batches before anything is written
+            planned = []
             for event in events:
-                if event['type'] == 'filename':
+                if event.pos < resume_offset:
+                    # Already committed by the run being resumed
+                    continue
+
+                if event.kind != SPAN_BLOCK:
+                    header_name = _slice(text, event.start, event.end)
                     # Validate Detected Name
-                    if self.is_valid_filename(event['name']):
-                        current_filename = event['name']
+                    if profile.is_valid_filename(header_name):
+                        current_filename = header_name
+                        current_name_source = {
+                            "method": HEADER_METHODS[event.kind],
+                            "line": source_map.locate_line(event.pos)
+                        }
                         # Defer creation until we have content
                         # Just log that we found a header
-                        print(f"Detected header references file: {current_filename}")
+                        log.debug(f"Detected header references file: {current_filename}", event="header", filename=current_filename)
                     else:
                         current_filename = None # Reset if invalid header found
+                    continue
 
-                elif event['type'] == 'block':
-                    content = event['content'].strip()
-                    raw_lang = event['lang'] or ""
-                    
-                    lang = raw_lang.strip()
-                    inline_filename = None
-
-                    # Parse "lang: filename" from code fence
-                    # Pattern: "python: my_script.py"
-                    meta_match = re.match(r'^([a-zA-Z0-9_\-+#.]+):\s*(.+)$', lang)
-                    if meta_match:
-                        lang = meta_match.group(1).strip()
-                        candidate = meta_match.group(2).strip()
-                        if self.is_valid_filename(candidate):
-                            inline_filename = candidate
-
-                    # LOGIC: Check for "Tiny Block" -> Treat as Filename
-                    # Only done if no inline filename was found in the fence
-                    if not inline_filename and '\n' not in content and ' ' not in content and len(content) < 100 and '.' in content:
-                        candidate_name = content.strip()
-                        if self.is_valid_filename(candidate_name):
-                            current_filename = candidate_name 
-                            print(f"Detected inline block references file: {current_filename}")
-                            continue # Skip extraction for this block - it is just a name
+                # Stripped content bounds; the text itself is sliced only when written
+                content_start, content_end = _strip_span(text, event.start, event.end)
+                fence_info = _slice(text, event.pos + 3, event.start - 1)
+                raw_lang = fence_info.strip() if fence_info else "text"
+
+                lang = raw_lang.strip()
+                inline_filename = None
+
+                # Parse "lang: filename" from code fence
+                # Pattern: "python: my_script.py"
+                meta_match = profile.match_fence_meta(lang)
+                if meta_match:
+                    lang, candidate = meta_match
+                    if profile.is_valid_filename(candidate):
+                        inline_filename = candidate
+
+                # LOGIC: Check for "Tiny Block" -> Treat as Filename
+                # Only done if no inline filename was found in the fence, for content under 100
+                # characters (a UTF-8 character of bytes-like input takes up to 4 bytes)
+                content = None
+                if not inline_filename and content_end - content_start < (400 if scan_bytes else 100):
+                    content = _slice(text, content_start, content_end)
+                    if len(content) >= 100:
+                        content = None
+                if content is not None and '\n' not in content and ' ' not in content and '.' in content:
+                    candidate_name = content.strip()
+                    if profile.is_valid_filename(candidate_name):
+                        current_filename = candidate_name
+                        current_name_source = {"method": "name_block", "line": source_map.locate_line(event.pos)}
+                        log.debug(f"Detected inline block references file: {current_filename}", event="header", filename=current_filename)
+                        continue # Skip extraction for this block - it is just a name
+
+                # Determine target filename (Inline takes precedence over Header)
+                target_filename = inline_filename if inline_filename else current_filename
+                planned.append((event, lang, inline_filename, target_filename, current_name_source, content_start, content_end))
+                if target_filename:
+                    # Consume the header context since this block takes it
+                    current_filename = None
+
+            for batch_start in range(0, len(planned), PLUGIN_BATCH_SIZE):
+                batch = planned[batch_start:batch_start + PLUGIN_BATCH_SIZE]
+                plugin_blocks = None
+                if plugin_host is not None:
+                    plugin_blocks = [
+                        PluginBlock(count + i + 1, p[1], p[3], _slice(text, p[0].start, p[0].end), source_map.locate_line(p[0].pos))
+                        for i, p in enumerate(batch)
+                    ]
+                    plugin_host.process_blocks(plugin_blocks)
+
+                for i, (event, lang, inline_filename, target_filename, header_source, content_start, content_end) in enumerate(batch):
+                    # Content changed by a plugin replaces the block's text everywhere it is written
+                    plugin_block = plugin_blocks[i] if plugin_blocks is not None and plugin_blocks[i].modified_by else None
+                    if plugin_block is not None:
+                        raw_content = plugin_block.content
+                        if plugin_block.filename != target_filename:
+                            inline_filename = None
+                            target_filename = plugin_block.filename
+                            header_source = {"method": "plugin", "plugin": plugin_block.modified_by[-1], "line": plugin_block.line}
+                    else:
+                        raw_content = _slice(text, event.start, event.end)
 
                     # Regular Content Block
                     count += 1
                     filename = f"block_{count:0{pad_width}d}.{lang}"
-                    
-                    # 1. Write to Code Blocks folder
-                    saved_path = self._write_file(dir_blocks, filename, event['content'], lang)
-                    
+
+                    # 1. Write to Code Blocks folder (or only keep the content, to materialize views later)
+                    stored_object = None
+                    if "blocks" in self.views:
+                        saved_path = self._write_file(dir_blocks, filename, raw_content, lang)
+                    else:
+                        saved_path = self._block_filename(filename, lang)
+                        stored_object = self._store_object(base_extraction_dir, raw_content)
+
                     entry = {
                         "file": os.path.basename(saved_path),
                         "description": "Isolated code block",
-                        "language": lang
+                        "language": lang,
+                        # Whole fenced block, closing fence included
+                        "source": source_map.locate(event.pos, event.end + 3)
                     }
+                    if stored_object:
+                        entry["object"] = stored_object
+                    if plugin_block is not None:
+                        entry["modified_by"] = plugin_block.modified_by
 
-                    # Determine target filename (Inline takes precedence over Header)
-                    target_filename = inline_filename if inline_filename else current_filename
+                    dest_path_flat = None
+                    dest_path_reconstructed = None
 
                     # 2. If Associated: Write to Files folder (and optionally Reconstructed)
                     if target_filename:
                         entry["associated_filename"] = target_filename
+                        if inline_filename:
+                            entry["name_source"] = {"method": "fence", "line": entry["source"]["lines"][0]}
+                        else:
+                            entry["name_source"] = header_source
+                        if plugin_block is not None:
+                            content = file_content(raw_content)
+                        else:
+                            content = _slice(text, content_start, content_end)
                         
                         # --- COMMON PRE-PROCESSING ---
                         # Sanitize, but KEEP the path structure for reconstruction
                         # We only basename it for the "Files" (flat) view initially
                         
                         # 1. Flattened Name for 'files/' directory
-                        # Replace separators with underscores to flatten
-                        flat_sanitized = target_filename.replace('/', '_').replace('\\', '_')
-                        flat_sanitized = self.sanitize_filename(flat_sanitized) # Strict sanitization (no slashes)
-                        
-                        # A. Strip Prefixes (String/Regex) - Applies to FLAT files if requested
-                        if strip_patterns:
-                            for pattern in strip_patterns:
-                                if pattern:
-                                    flat_sanitized = re.sub(pattern, '', flat_sanitized)
+                        # Separators become underscores, then strict sanitization and the strip rules (cached per name)
+                        flat_sanitized = profile.flat_name(target_filename)
                         
                         file_creation_count += 1
                         
@@ -217,8 +557,11 @@ class CodeExtractor:
                         # Logic: Numbering + Flat Name
                         flat_name = f"{num_prefix}{flat_sanitized}"
                         dest_path_flat = os.path.join(dir_files, flat_name)
-                        
-                        self._save_content_safely(dest_path_flat, content, file_versions)
+                        if "files" in self.views:
+                            if resync_versions:
+                                self._resync_version(dest_path_flat, file_versions)
+                            
+                            self._save_content_safely(dest_path_flat, content, file_versions)
                         entry["saved_as"] = flat_name
 
                         # --- PATH 2: RECONSTRUCTED (Explicit Path Structure) ---
@@ -228,7 +571,7 @@ class CodeExtractor:
                             
                             # Sanitize the full path (allowing slashes)
                             # We construct a safe relative path
-                            clean_rel_path = self.sanitize_path(target_filename)
+                            clean_rel_path = profile.clean_path(target_filename)
                             
                             # Apply Numbering to the ROOT? 
                             # If numbering is on, we prefix the ROOT component.
@@ -243,9 +586,12 @@ class CodeExtractor:
                                 final_reconstructed_name = clean_rel_path
 
                             dest_path_reconstructed = os.path.join(dir_reconstructed, final_reconstructed_name)
-                            
-                            # Save with versioning logic (though with explicit paths, versions likely in header/header-v2)
-                            self._save_content_safely(dest_path_reconstructed, content, reconstructed_versions)
+                            if "reconstructed" in self.views:
+                                if resync_versions:
+                                    self._resync_version(dest_path_reconstructed, reconstructed_versions)
+                                
+                                # Save with versioning logic (though with explicit paths, versions likely in header/header-v2)
+                                self._save_content_safely(dest_path_reconstructed, content, reconstructed_versions)
                             
                             entry["reconstructed_path"] = final_reconstructed_name
                             
@@ -253,41 +599,103 @@ class CodeExtractor:
                             # Since the explicit path IS the sorted path (src/foo.py), we use it directly.
                             entry["sorted_path"] = clean_rel_path
 
-                        # Consume the header context since we've processed a block
-                        current_filename = None 
-                        
                     manifest.append(entry)
 
+                    # Checkpoint: this block is fully written
+                    if journal is not None:
+                        touched_versions = {}
+                        for dest_path, version_dict in ((dest_path_flat, file_versions), (dest_path_reconstructed, reconstructed_versions)):
+                            if dest_path in version_dict:
+                                rel_path = os.path.relpath(dest_path, base_extraction_dir).replace(os.sep, '/')
+                                touched_versions[rel_path] = version_dict[dest_path]
+                        if self.history_store is None:
+                            journal.commit(entry, event.end, count, file_creation_count, touched_versions)
+                        else:
+                            # Only new records are written now; a block is journaled once the
+                            # history records it changed are on disk
+                            self.history_store.flush(verbose=False, new_only=True)
+                            pending_commits.append((entry, event.end, count, file_creation_count, touched_versions))
+                            if len(pending_commits) >= HISTORY_FLUSH_EVERY or time.monotonic() - last_history_flush >= HISTORY_FLUSH_SECONDS:
+                                self._commit_with_history(journal, pending_commits)
+                                last_history_flush = time.monotonic()
+                        resync_versions = False
+                    progress.advance(event.end)
+
+            if journal is not None:
+                self._commit_with_history(journal, pending_commits)
+                journal.finish()
+            progress.finish()
+
+        self.manifest = manifest
+
+        if self.history_store is not None:
+            self.history_store.flush()
+
         # Write Manifest
         if manifest:
             import json
             manifest_path = os.path.join(base_extraction_dir, "manifest.json")
-            with open(manifest_path, 'w', encoding='utf-8') as f:
-                json.dump(manifest, f, indent=2)
-            print(f"Created manifest: {manifest_path}")
+            if self.archive is not None:
+                self.archive.stage(manifest_path, json.dumps(manifest, indent=2))
+            else:
+                atomic_write(manifest_path, json.dumps(manifest, indent=2))
+            log.info(f"Created manifest: {manifest_path}", event="manifest", path=manifest_path, entries=len(manifest))
             
         return count
 
 
+    def _commit_with_history(self, journal, pending_commits):
+        """Writes the pending history records, then journals the blocks that changed them."""
+        if not pending_commits:
+            return
+        self.history_store.flush(verbose=False)
+        for commit in pending_commits:
+            journal.commit(*commit)
+        pending_commits.clear()
+
     def rotate_file(self, filepath, version):
         """
         Renames an existing file to filepath_v{version}.ext
         """
+        new_path = self._versioned_path(filepath, version)
+
+        if self.archive is not None:
+            self.archive.rotate(filepath, new_path)
+            log.debug(f"Rotated previous version to: {new_path}", event="rotated", path=new_path)
+            return
+
         if not os.path.exists(filepath):
             return
+        
+        try:
+            os.rename(filepath, new_path)
+            log.debug(f"Rotated previous version to: {new_path}", event="rotated", path=new_path)
+        except Exception as e:
+            log.error(f"Failed to rotate file {filepath}: {e}")
+
+    def _resync_version(self, filepath, version_dict):
+        """
+        Advances the version counter of 'filepath' past rotated copies already on disk,
+        so a resumed run does not reuse a '_vN' name written after the last checkpoint.
+        """
+        if self.history_store is not None:
+            return
+        version = version_dict.get(filepath, 1)
+        while os.path.exists(self._versioned_path(filepath, version)):
+            version += 1
+        if version > 1:
+            version_dict[filepath] = version
 
+    def _versioned_path(self, filepath, version):
+        """
+        Returns filepath with a _v{version} suffix before the extension.
+        """
         dirname = os.path.dirname(filepath)
         basename = os.path.basename(filepath)
         name, ext = os.path.splitext(basename)
         
         new_name = f"{name}_v{version}{ext}"
-        new_path = os.path.join(dirname, new_name)
-        
-        try:
-            os.rename(filepath, new_path)
-            print(f"Rotated previous version to: {new_path}")
-        except Exception as e:
-            print(f"Failed to rotate file {filepath}: {e}")
+        return os.path.join(dirname, new_name)
 
 
 
@@ -295,64 +703,23 @@ class CodeExtractor:
         """
         Validates if a detected string is likely a real filename.
         """
-        filename = filename.strip()
-        
-        # 1. Basic Length/Content check
-        if len(filename) < 2: return False
-        if ' ' in filename: return False
-        
-        # 2. Block Bad Prefixes (underscore often implies internal code ref, not file)
-        if filename.startswith('_'): return False
-        
-        # 3. Stopwords
-        stopwords = {'directory', 'folder', 'file', 'code', 'here', 'script', 'example', 'bash', 'python', 'json'}
-        if filename.lower() in stopwords: return False
-        
-        # 4. Extension Requirement
-        # If no extension, MUST be in allowlist
-        _, ext = os.path.splitext(filename)
-        if not ext:
-            allowlist = {
-                'makefile', 'dockerfile', 'jenkinsfile', 'vagrantfile', 
-                'readme', 'license', 'changelog', 'notice', 'procfile', 'gemfile'
-            }
-            if filename.lower() not in allowlist:
-                return False
-                
-        return True
+        return self.profile.is_valid_filename(filename)
 
     def sanitize_filename(self, filename):
         """
         Strict sanitization: Removes ALL path separators. Used for 'flat' filenames.
         """
-        # Remove invalid characters including slashes
-        filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-        # Collapse whitespace
-        filename = re.sub(r'\s+', '_', filename)
-        return filename.strip()
+        return sanitize_filename(filename)
 
     def sanitize_path(self, path):
         """
         Path sanitization: Allows slashes but removes other dangerous chars.
         Used for 'reconstructed' paths.
         """
-        # Collapse whitespace
-        path = re.sub(r'\s+', '_', path)
-        # Remove invalid characters EXCEPT / and \
-        # regex for [<>:"|?*]
-        path = re.sub(r'[<>:"|?*]', '', path)
-        # Normalize slashes to OS separator?
-        path = os.path.normpath(path)
-        # Remove leading slashes to ensure it's relative
-        while path.startswith(os.sep):
-            path = path[1:]
-        return path.strip()
-
+        return sanitize_path(path)
 
-    def _write_file(self, directory, filename, content, language):
-        if not os.path.exists(directory):
-            os.makedirs(directory)
 
+    def _block_filename(self, filename, language):
         # Sanitize filename (STRICT for blocks, they are just numbered items)
         filename = self.sanitize_filename(os.path.basename(filename))
         
@@ -362,25 +729,128 @@ class CodeExtractor:
             normalized_lang = language.lower().strip()
             # Use the raw language tag as the extension
             filename = f"{filename}.{normalized_lang}"
+        return filename
+
+    def _write_file(self, directory, filename, content, language):
+        if self.archive is None and not os.path.exists(directory):
+            os.makedirs(directory)
 
-        output_path = os.path.join(directory, filename)
+        output_path = os.path.join(directory, self._block_filename(filename, language))
 
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content) # Write CLEAN content, no headers
-            print(f"Extracted: {output_path}")
+            if self.archive is not None:
+                self.archive.write(output_path, content)
+                log.debug(f"Extracted: {output_path}", event="block_written", path=output_path)
+                return output_path
+
+            atomic_write(output_path, content) # Write CLEAN content, no headers
+            log.debug(f"Extracted: {output_path}", event="block_written", path=output_path)
             return output_path
         except Exception as e:
-            print(f"Failed to write {output_path}: {e}")
+            log.error(f"Failed to write {output_path}: {e}")
             return output_path # Return best guess for manifest even on error?
 
 
+    def _store_object(self, base_extraction_dir, content):
+        """
+        Keeps a block's raw content once, under 'objects/' by its SHA-1 (identical blocks share
+        one object), so views that were not materialized can be written later. Returns the id.
+        """
+        oid = object_id(content)
+        path = object_path(base_extraction_dir, oid)
+        if oid in self._stored_objects:
+            return oid
+        self._stored_objects.add(oid)
+        try:
+            if self.archive is not None:
+                self.archive.write(path, content)
+            elif not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                atomic_write(path, content)
+        except Exception as e:
+            log.error(f"Failed to store block content {path}: {e}")
+        return oid
+
+    def materialize_views(self, manifest_path, views):
+        """
+        Writes views of an earlier extraction that were not materialized, from its manifest.json
+        and the stored block contents (code_blocks/ or objects/), without scanning the source
+        again. Entries are replayed in manifest order, so '_vN' versions come out as in a full
+        run. A view whose directory already exists is left alone. Returns the number of files written.
+        """
+        import json
+
+        if self.archive is not None:
+            log.error("Views cannot be added to an archive; extract again with --views instead")
+            return 0
+        if not os.path.exists(manifest_path):
+            log.error(f"Cannot materialize views: manifest not found at {manifest_path}")
+            return 0
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        base_extraction_dir = os.path.dirname(manifest_path)
+        pending = []
+        for view in views:
+            view_dir = os.path.join(base_extraction_dir, VIEW_DIRS[view])
+            if os.path.exists(view_dir):
+                log.warning(f"View '{view}' already exists: {view_dir}")
+            else:
+                pending.append(view)
+        if not pending:
+            return 0
+
+        written = 0
+        file_versions = {}
+        reconstructed_versions = {}
+        for entry in manifest:
+            try:
+                with open(block_content_path(base_extraction_dir, entry), 'r', encoding='utf-8', newline='') as f:
+                    raw = f.read()
+            except OSError as e:
+                log.warning(f"No stored content for {entry.get('file')}, skipping: {e}")
+                continue
+
+            if "blocks" in pending:
+                self._write_file(os.path.join(base_extraction_dir, VIEW_DIRS["blocks"]), entry["file"], raw, None)
+                written += 1
+            content = file_content(raw)
+            if "files" in pending and "saved_as" in entry:
+                self._save_content_safely(os.path.join(base_extraction_dir, VIEW_DIRS["files"], entry["saved_as"]), content, file_versions)
+                written += 1
+            if "reconstructed" in pending and "reconstructed_path" in entry:
+                self._save_content_safely(os.path.join(base_extraction_dir, VIEW_DIRS["reconstructed"], entry["reconstructed_path"]), content, reconstructed_versions)
+                written += 1
+
+        log.info(f"Materialized {', '.join(pending)} for {len(manifest)} manifest entries ({written} files) in {base_extraction_dir}", event="views_materialized", views=pending, files=written)
+        return written
+
     def _save_content_safely(self, dest_path, content, version_dict):
         """
         Helper to write content to dest_path, handling headers, version rotation,
         and parent directory creation.
         """
+        if self.history_store is not None:
+            self._save_with_history(dest_path, content)
+            return
+
         try:
+            if self.archive is not None:
+                existing_content = self.archive.read(dest_path)
+                if existing_content is not None:
+                    if existing_content == content:
+                        log.debug(f"Skipping identical file: {dest_path}", event="file_unchanged", path=dest_path)
+                        return
+                    current_v = version_dict.get(dest_path, 1)
+                    self.rotate_file(dest_path, current_v)
+                    version_dict[dest_path] = current_v + 1
+                if content:
+                    self.archive.stage(dest_path, content)
+                    log.debug(f"Populated file: {dest_path}", event="file_written", path=dest_path)
+                else:
+                    log.debug(f"Skipping empty content for {dest_path}")
+                return
+
             # Check if file exists
             if os.path.exists(dest_path):
                 # Check for Identical Content to prevent spam
@@ -388,7 +858,7 @@ class CodeExtractor:
                     with open(dest_path, 'r', encoding='utf-8') as current_f:
                         existing_content = current_f.read()
                     if existing_content == content:
-                        print(f"Skipping identical file: {dest_path}")
+                        log.debug(f"Skipping identical file: {dest_path}", event="file_unchanged", path=dest_path)
                         return
                 except Exception:
                     # If read fails, proceed to rotate just in case
@@ -409,14 +879,54 @@ class CodeExtractor:
                 if not os.path.exists(parent_dir):
                     os.makedirs(parent_dir)
 
-                with open(dest_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f"Populated file: {dest_path}")
+                atomic_write(dest_path, content)
+                log.debug(f"Populated file: {dest_path}", event="file_written", path=dest_path)
             else:
-                print(f"Skipping empty content for {dest_path}")
+                log.debug(f"Skipping empty content for {dest_path}")
 
         except Exception as e:
-            print(f"Failed to populate {dest_path}: {e}")
+            log.error(f"Failed to populate {dest_path}: {e}")
+
+
+    def _save_with_history(self, dest_path, content):
+        """
+        --history variant of _save_content_safely: the live file is overwritten in place and
+        every version is recorded in the HistoryStore (latest in full, older ones as deltas).
+        """
+        try:
+            if not content:
+                log.debug(f"Skipping empty content for {dest_path}")
+                return
+
+            existing_content = None
+            if self.archive is not None:
+                existing_content = self.archive.read(dest_path)
+            elif os.path.exists(dest_path):
+                try:
+                    with open(dest_path, 'r', encoding='utf-8') as current_f:
+                        existing_content = current_f.read()
+                except Exception:
+                    pass
+
+            version = self.history_store.record(dest_path, content, existing=existing_content)
+            if existing_content == content:
+                log.debug(f"Skipping identical file: {dest_path}", event="file_unchanged", path=dest_path)
+                return
+            if version is None:
+                # Already the latest recorded version; only the live file is out of date
+                version = self.history_store.versions(dest_path)
+
+            if self.archive is not None:
+                self.archive.stage(dest_path, content)
+            else:
+                parent_dir = os.path.dirname(dest_path)
+                if not os.path.exists(parent_dir):
+                    os.makedirs(parent_dir)
+                atomic_write(dest_path, content)
+            log.debug(f"Populated file: {dest_path} (history v{version})", event="file_written", path=dest_path, version=version)
+
+        except Exception as e:
+            log.error(f"Failed to populate {dest_path}: {e}")
 
 
     def merge_reconstruction(self, manifest_path, merge_target, clean_target=False):
@@ -425,24 +935,45 @@ class CodeExtractor:
         Last-write-wins strategy based on manifest order.
         
         :param clean_target: If True, deletes the merge_target directory before merging.
+
+        A merge target on disk is locked for the duration, so concurrent runs sharing it
+        (e.g. the same --merge-to) apply their merges one at a time.
         """
+        if self.archive is not None and self.archive.contains(merge_target):
+            return self._merge_reconstruction(manifest_path, merge_target, clean_target)
+        with DirectoryLock(merge_target):
+            return self._merge_reconstruction(manifest_path, merge_target, clean_target)
+
+    def _merge_reconstruction(self, manifest_path, merge_target, clean_target=False):
         import json
         import shutil
 
-        if not os.path.exists(manifest_path):
-            print(f"Merge skipped: Manifest not found at {manifest_path}")
-            return
+        in_archive = self.archive is not None
+        if in_archive:
+            manifest_text = self.archive.read(manifest_path)
+            if manifest_text is None:
+                log.warning(f"Merge skipped: Manifest not found at {manifest_path}")
+                return
+            manifest = json.loads(manifest_text)
+        else:
+            if not os.path.exists(manifest_path):
+                log.warning(f"Merge skipped: Manifest not found at {manifest_path}")
+                return
 
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
 
-        if clean_target and os.path.exists(merge_target):
-            print(f"Cleaning merge target: {merge_target}")
-            shutil.rmtree(merge_target)
+        # A merge target inside the archive root is written into the archive; anything else goes to disk
+        merge_into_archive = in_archive and self.archive.contains(merge_target)
 
-        if not os.path.exists(merge_target):
-            os.makedirs(merge_target)
-            print(f"Created merge target directory: {merge_target}")
+        if not merge_into_archive:
+            if clean_target and os.path.exists(merge_target):
+                log.info(f"Cleaning merge target: {merge_target}")
+                shutil.rmtree(merge_target)
+
+            if not os.path.exists(merge_target):
+                os.makedirs(merge_target)
+                log.debug(f"Created merge target directory: {merge_target}")
 
         count = 0
         
@@ -450,15 +981,16 @@ class CodeExtractor:
         base_extraction_dir = os.path.dirname(manifest_path)
         reconstructed_dir = os.path.join(base_extraction_dir, "reconstructed")
 
-        print(f"Merging reconstruction into: {merge_target}")
+        log.info(f"Merging reconstruction into: {merge_target}")
 
         for entry in manifest:
             if "reconstructed_path" in entry:
                 # 1. Get the source path (from reconstructed directory)
                 rel_path = entry["reconstructed_path"]
                 src_path = os.path.join(reconstructed_dir, rel_path)
+                src_content = self.archive.read(src_path) if in_archive else None
 
-                if os.path.exists(src_path):
+                if src_content is not None or (not in_archive and os.path.exists(src_path)):
                     # 2. Determine destination path
                     # User Request: Merged folder should house "sorted-by-type" folders.
                     # We prioritize 'sorted_path' from manifest.
@@ -478,12 +1010,24 @@ class CodeExtractor:
                     dest_path = os.path.join(merge_target, dest_rel_path)
                     
                     # 3. Copy (Overwrite)
+                    if merge_into_archive:
+                        self.archive.stage(dest_path, src_content)
+                        count += 1
+                        continue
+                    if in_archive:
+                        dest_dir = os.path.dirname(dest_path)
+                        if not os.path.exists(dest_dir):
+                            os.makedirs(dest_dir)
+                        atomic_write(dest_path, src_content)
+                        count += 1
+                        continue
+
                     dest_dir = os.path.dirname(dest_path)
                     if not os.path.exists(dest_dir):
                         os.makedirs(dest_dir)
                         
-                    shutil.copy2(src_path, dest_path)
+                    atomic_copy(src_path, dest_path)
                     count += 1
  
 
-        print(f"  -> Merged {count} files to {merge_target}")
+        log.info(f"  -> Merged {count} files to {merge_target}", event="merged", target=merge_target, files=count)
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import zlib
+import argparse
+from difflib import SequenceMatcher
+from safe_io import atomic_write
+from run_log import get_logger
+
+log = get_logger("history_store")
+
+# A full copy of an older version is kept every N versions so that retrieving
+# any version applies at most N deltas.
+SNAPSHOT_EVERY = 32
+
+HISTORY_SUFFIX = ".hist"
+
+
+def make_delta(new_text, old_text):
+    """
+    Builds a reverse line delta that turns new_text back into old_text.
+    Ops are either [i1, i2] (copy lines i1:i2 of the newer version) or a list of literal lines.
+    """
+    new_lines = new_text.splitlines(keepends=True)
+    old_lines = old_text.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, new_lines, old_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(old_lines[j1:j2])
+    return ops
+
+
+def apply_delta(new_text, ops):
+    """Reverses make_delta: rebuilds the older version from the newer one."""
+    new_lines = new_text.splitlines(keepends=True)
+    out = []
+    for op in ops:
+        if op and isinstance(op[0], int):
+            out.extend(new_lines[op[0]:op[1]])
+        else:
+            out.extend(op)
+    return "".join(out)
+
+
+class HistoryStore:
+    """
+    Version history for extracted files, replacing full '_vN' rotated copies.
+
+    Each tracked path (relative to the extraction directory, e.g. 'files/main.py') has one
+    zlib-compressed record under '<root_dir>/<path>.hist' holding the latest version in full,
+    earlier versions as reverse deltas, and a full snapshot every SNAPSHOT_EVERY versions.
+    Records are cached while a run is in progress and written by flush().
+    """
+
+    def __init__(self, root_dir, base_dir=None, archive=None):
+        self.root_dir = root_dir
+        # Paths are keyed relative to this directory (defaults to the history root's parent)
+        self.base_dir = base_dir or os.path.dirname(root_dir)
+        self.archive = archive
+        self._records = {}
+        self._dirty = set()
+        # Dirty keys whose record did not exist before (see flush(new_only=True))
+        self._new = set()
+
+    def key_for(self, path):
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.base_dir)
+        return path.replace(os.sep, '/')
+
+    def _record_path(self, key):
+        return os.path.join(self.root_dir, *key.split('/')) + HISTORY_SUFFIX
+
+    def _load(self, key):
+        if key in self._records:
+            return self._records[key]
+
+        record_path = self._record_path(key)
+        blob = None
+        if self.archive is not None:
+            blob = self.archive.read(record_path)
+        elif os.path.exists(record_path):
+            with open(record_path, 'rb') as f:
+                blob = f.read()
+
+        record = json.loads(zlib.decompress(blob).decode('utf-8')) if blob else None
+        self._records[key] = record
+        return record
+
+    def record(self, path, content, existing=None):
+        """
+        Adds 'content' as the newest version of 'path'.
+        'existing' is the current live content, adopted as version 1 if the path has no history yet.
+        Returns the new version number, or None if content equals the latest version.
+        """
+        key = self.key_for(path)
+        record = self._load(key)
+
+        if record is None:
+            record = {"path": key, "count": 0, "latest": None, "deltas": [], "snapshots": {}}
+            if existing is not None and existing != content:
+                record["count"] = 1
+                record["latest"] = existing
+            self._new.add(key)
+
+        if record["latest"] == content:
+            return None
+
+        previous = record["latest"]
+        if previous is not None:
+            # deltas[v - 1] turns version v + 1 back into version v
+            record["deltas"].append(make_delta(content, previous))
+            if record["count"] % SNAPSHOT_EVERY == 0:
+                record["snapshots"][str(record["count"])] = previous
+
+        record["count"] += 1
+        record["latest"] = content
+        self._records[key] = record
+        self._dirty.add(key)
+        return record["count"]
+
+    def versions(self, path):
+        """Number of stored versions for 'path' (0 if untracked)."""
+        record = self._load(self.key_for(path))
+        return record["count"] if record else 0
+
+    def get(self, path, version=None):
+        """
+        Returns version 'version' (1-based, default latest) of 'path', or None if unknown.
+        """
+        record = self._load(self.key_for(path))
+        if not record:
+            return None
+
+        count = record["count"]
+        if version is None or version == count:
+            return record["latest"]
+        if version < 1 or version > count:
+            return None
+
+        # Start from the nearest full copy at or above the requested version
+        start = count
+        text = record["latest"]
+        for snap_version in sorted(int(v) for v in record["snapshots"]):
+            if version <= snap_version < start:
+                start = snap_version
+                text = record["snapshots"][str(snap_version)]
+                break
+
+        for v in range(start - 1, version - 1, -1):
+            text = apply_delta(text, record["deltas"][v - 1])
+        return text
+
+    def list_paths(self):
+        """All tracked paths (keys) found on disk."""
+        paths = set(k for k, r in self._records.items() if r)
+        if os.path.isdir(self.root_dir):
+            for root, _, files in os.walk(self.root_dir):
+                for f in files:
+                    if f.endswith(HISTORY_SUFFIX):
+                        rel = os.path.relpath(os.path.join(root, f), self.root_dir)
+                        paths.add(rel[:-len(HISTORY_SUFFIX)].replace(os.sep, '/'))
+        return sorted(paths)
+
+    def flush(self, verbose=True, new_only=False):
+        """
+        Writes the records changed since the last flush. Rewriting a record costs its whole
+        history, so with 'new_only' just the records created since then (one or two versions
+        each) are written and the others stay pending.
+        """
+        keys = self._dirty & self._new if new_only else self._dirty
+        for key in sorted(keys):
+            blob = zlib.compress(json.dumps(self._records[key], separators=(',', ':')).encode('utf-8'), 6)
+            record_path = self._record_path(key)
+            if self.archive is not None:
+                self.archive.stage(record_path, blob)
+                continue
+            parent_dir = os.path.dirname(record_path)
+            if not os.path.exists(parent_dir):
+                os.makedirs(parent_dir)
+            atomic_write(record_path, blob)
+        if keys and verbose:
+            log.info(f"Saved history for {len(keys)} files in: {self.root_dir}")
+        self._dirty -= keys
+        self._new -= keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect version history recorded with --history.")
+    parser.add_argument("extraction_dir", help="A '<source>_files' extraction directory.")
+    parser.add_argument("command", choices=['list', 'log', 'show'], help="list: tracked paths, log: version count of a path, show: print a version.")
+    parser.add_argument("path", nargs='?', help="Tracked path relative to the extraction dir (e.g. 'files/main.py').")
+    parser.add_argument("--version", "-v", type=int, help="Version to show (1 = oldest, default latest).")
+    args = parser.parse_args()
+
+    store = HistoryStore(os.path.join(args.extraction_dir, "history"), base_dir=args.extraction_dir)
+
+    if args.command == 'list':
+        for key in store.list_paths():
+            print(f"{key}  ({store.versions(key)} versions)")
+        return
+
+    if not args.path:
+        print("A path is required for 'log' and 'show'.")
+        sys.exit(1)
+
+    if args.command == 'log':
+        print(f"{args.path}: {store.versions(args.path)} versions")
+        return
+
+    text = store.get(args.path, args.version)
+    if text is None:
+        print(f"No such version: {args.path} v{args.version}")
+        sys.exit(1)
+    sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
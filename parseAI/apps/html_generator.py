@@ -2,10 +2,50 @@ import os
 import html
 import markdown
 import re
+from safe_io import atomic_append, atomic_write
+from run_log import get_logger
+
+log = get_logger("html_generator")
 
 # Pre-compiled markdown converter
 md = markdown.Markdown(extensions=['fenced_code', 'tables', 'nl2br'])
 
+# Last line of every generate_html document; append_html inserts new turns before it
+HTML_FOOTER = "</div></body></html>"
+
+def render_chunk_html(chunk):
+    """Renders one conversation chunk (turn or thought) as its HTML block."""
+    role = chunk.get('role', 'unknown').title()
+    text = chunk.get('text', '')
+    is_thought = chunk.get('isThought', False)
+    
+    # Use markdown library to convert text to HTML
+    # We don't need to manually escape HTML or handle newlines if we use 'nl2br' extension
+    safe_text = md.convert(text)
+
+    
+    role_class = f"role-{role.lower()}"
+    
+    if is_thought:
+        block = f"""
+        <details class="thought-box" open>
+            <summary>Thought Process ({role})</summary>
+            <div class="thought-content">
+                {safe_text}
+            </div>
+        </details>
+        """
+    else:
+        block = f"""
+        <div class="chat-block">
+            <h2 class="{role_class}">{role}</h2>
+            <div class="message-content">
+                {safe_text}
+            </div>
+        </div>
+        """
+    return block
+
 def generate_html(conversation_data, output_path):
     """
     Generates a rich HTML file from the conversation data.
@@ -14,6 +54,19 @@ def generate_html(conversation_data, output_path):
         conversation_data (dict): The parsed conversation data structure.
         output_path (str): The full path to save the HTML file.
     """
+    try:
+        full_html = render_html(conversation_data)
+        atomic_write(output_path, full_html)
+        log.debug(f"Generated HTML: {output_path}", event="output_written", path=output_path)
+        return True
+    except Exception as e:
+        log.error(f"Error generating HTML: {e}")
+        return False
+
+def render_html(conversation_data):
+    """
+    Renders the conversation data to a standalone HTML document and returns it as a string.
+    """
     
     css = """
     <style>
@@ -164,48 +217,34 @@ def generate_html(conversation_data, output_path):
     # Chunks
     if 'chunkedPrompt' in conversation_data and 'chunks' in conversation_data['chunkedPrompt']:
         for chunk in conversation_data['chunkedPrompt']['chunks']:
-            role = chunk.get('role', 'unknown').title()
-            text = chunk.get('text', '')
-            is_thought = chunk.get('isThought', False)
-            
-            # Use markdown library to convert text to HTML
-            # We don't need to manually escape HTML or handle newlines if we use 'nl2br' extension
-            safe_text = md.convert(text)
-
-            
-            role_class = f"role-{role.lower()}"
-            
-            if is_thought:
-                block = f"""
-                <details class="thought-box" open>
-                    <summary>Thought Process ({role})</summary>
-                    <div class="thought-content">
-                        {safe_text}
-                    </div>
-                </details>
-                """
-            else:
-                block = f"""
-                <div class="chat-block">
-                    <h2 class="{role_class}">{role}</h2>
-                    <div class="message-content">
-                        {safe_text}
-                    </div>
-                </div>
-                """
-            content.append(block)
+            content.append(render_chunk_html(chunk))
 
-    content.append("</div></body></html>")
-    
-    full_html = "\n".join(content)
+    content.append(HTML_FOOTER)
     
+    return "\n".join(content)
+
+def append_html(chunks, output_path):
+    """
+    Adds the blocks of 'chunks' to the end of a conversation written by generate_html,
+    without rendering the earlier turns again: the file up to its closing tags is copied,
+    followed by the new blocks and the closing tags, and the copy replaces it atomically.
+    Returns False (and changes nothing) if the file does not end as generate_html leaves it.
+    """
+    footer = HTML_FOOTER.encode('utf-8')
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(full_html)
-        print(f"Generated HTML: {output_path}")
+        with open(output_path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size < len(footer):
+                return False
+            f.seek(size - len(footer))
+            if f.read() != footer:
+                return False
+        atomic_append(output_path, "".join(render_chunk_html(chunk) + "\n" for chunk in chunks).encode('utf-8') + footer,
+                      keep=size - len(footer))
+        log.debug(f"Appended {len(chunks)} turns to HTML: {output_path}", event="output_written", path=output_path, turns=len(chunks))
         return True
-    except Exception as e:
-        print(f"Error generating HTML: {e}")
+    except OSError as e:
+        log.error(f"Error appending to HTML: {e}")
         return False
 
 def generate_html_from_markdown(markdown_content, output_path, title="Document", subtitle=None):
@@ -218,6 +257,21 @@ def generate_html_from_markdown(markdown_content, output_path, title="Document",
         title (str): Document title.
         subtitle (str): Optional subtitle (e.g., file path).
     """
+    full_html = render_html_from_markdown(markdown_content, title=title, subtitle=subtitle)
+    
+    try:
+        atomic_write(output_path, full_html)
+        log.debug(f"Generated HTML (from MD): {output_path}", event="output_written", path=output_path)
+        return True
+    except Exception as e:
+        log.error(f"Error generating HTML from MD: {e}")
+        return False
+
+def render_html_from_markdown(markdown_content, title="Document", subtitle=None):
+    """
+    Renders a plain Markdown string to a standalone HTML document and returns it as a string.
+    Used directly when the output goes into an archive instead of a file.
+    """
     
     # Re-using the CSS from generate_html (conceptually, we could refactor CSS to a constant)
     css = """
@@ -329,12 +383,4 @@ def generate_html_from_markdown(markdown_content, output_path, title="Document",
     </body>
     </html>
     """
-    
-    try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(full_html)
-        print(f"Generated HTML (from MD): {output_path}")
-        return True
-    except Exception as e:
-        print(f"Error generating HTML from MD: {e}")
-        return False
+    return full_html
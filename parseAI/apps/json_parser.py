@@ -3,19 +3,33 @@ import os
 import sys
 import re
 import argparse
-from html_generator import generate_html
+from functools import partial
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from html_generator import generate_html, append_html
 from pdf_generator import generate_pdf
+from catalog import Catalog, fingerprint_bytes, fingerprint_file
+from source_map import ROLE_MAP
+from safe_io import DirectoryLock, atomic_append, atomic_write
+from export_watchdog import ExportWatchdog
+from cost_scheduler import CostScheduler, run_measured
+from staged_pipeline import StagedPipeline
+from render_state import (appended_chunks, chunk_chain, header_hash, load_render_state,
+                          outputs_untouched, save_render_state, state_path_for)
+from chunk_selection import ChunkSelection, SELECTION_KEY
+from chunk_selection import add_arguments as add_selection_arguments
+from run_log import Progress, add_arguments, configure, configure_from_args, get_logger, settings
+
+log = get_logger("json_parser")
 
 # Configuration
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 DEFAULT_INGEST_DIR = os.path.join(PROJECT_ROOT, "ingest")
 DEFAULT_OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output")
 
-ROLE_MAP = {
-    "model": "🤖 AI",
-    "user": "👤 User",
-    "system": "⚙️ System"
-}
+# Archive containers accepted as inputs (streamed, never unpacked to disk)
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
 
 def extract_metadata(data):
     """Extracts run settings and other metadata."""
@@ -35,17 +49,51 @@ def format_role(role_key):
     """Maps raw role keys to display names."""
     return ROLE_MAP.get(role_key, role_key.title())
 
-def parse_file(file_path):
+# Written after every chunk
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+def format_chunk(chunk):
+    """Formats one chunk (turn or thought) as Markdown, followed by the chunk separator."""
+    role_key = chunk.get('role', 'unknown')
+    text = chunk.get('text', '')
+    is_thought = chunk.get('isThought', False)
+    
+    display_role = format_role(role_key)
+    
+    if is_thought:
+        # 2. Thought Handling - Markdown blockquote
+        # Indent all lines with > to make it a proper blockquote
+        quoted_text = text.replace('\n', '\n> ')
+        formatted_chunk = f"> **THOUGHT** ({display_role}):\n> {quoted_text}\n"
+    else:
+        # 3. Standard Turn - Markdown Header
+        formatted_chunk = f"## {display_role}\n\n{text}\n"
+    
+    return formatted_chunk + CHUNK_SEPARATOR
+
+def parse_file(file_path, selection=None):
     """
     Parses a single JSON file and extracts conversation text with enhanced formatting.
+    Only the chunks chosen by 'selection' (ChunkSelection) are formatted.
+    """
+    try:
+        return parse_data(load_export(file_path, selection), file_path)
+
+    except json.JSONDecodeError:
+        log.error(f"Error decoding JSON from {file_path}")
+    except Exception as e:
+        log.error(f"Unexpected error processing {file_path}: {e}")
+    return None
+
+def parse_data(data, label):
+    """
+    Formats already-loaded conversation data as Markdown.
+    'label' is only used for diagnostics (file path or archive member).
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
         # Check for expected structure
         if 'chunkedPrompt' not in data or 'chunks' not in data['chunkedPrompt']:
-            print(f"Skipping {file_path}: 'chunkedPrompt.chunks' not found.")
+            log.warning(f"Skipping {label}: 'chunkedPrompt.chunks' not found.")
             return
 
         output_content = []
@@ -54,43 +102,409 @@ def parse_file(file_path):
         output_content.append(extract_metadata(data))
 
         chunks = data['chunkedPrompt']['chunks']
-        separator = "\n\n---\n\n"
 
         for chunk in chunks:
-            role_key = chunk.get('role', 'unknown')
-            text = chunk.get('text', '')
-            is_thought = chunk.get('isThought', False)
-            
-            display_role = format_role(role_key)
-            
-            if is_thought:
-                # 2. Thought Handling - Markdown blockquote
-                # Indent all lines with > to make it a proper blockquote
-                quoted_text = text.replace('\n', '\n> ')
-                formatted_chunk = f"> **THOUGHT** ({display_role}):\n> {quoted_text}\n"
-            else:
-                # 3. Standard Turn - Markdown Header
-                formatted_chunk = f"## {display_role}\n\n{text}\n"
-            
-            output_content.append(formatted_chunk)
-            output_content.append(separator)
+            output_content.append(format_chunk(chunk))
 
         return "".join(output_content)
 
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON from {file_path}")
     except Exception as e:
-        print(f"Unexpected error processing {file_path}: {e}")
+        log.error(f"Unexpected error processing {label}: {e}")
     return None
 
+def safe_session_name(filename):
+    """
+    Derives the output session name from an input filename or archive member path.
+    """
+    base_name = os.path.splitext(os.path.basename(filename))[0]
+    # Remove invalid chars
+    safe_name = re.sub(r'[<>:"/\\|?*]', '', base_name)
+    # Collapse whitespace
+    safe_name = re.sub(r'\s+', '_', safe_name).strip()
+    return safe_name
+
+def is_archive(path):
+    """Returns True if the path looks like a zip/tar bundle of exports."""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def _is_export_member(member_name):
+    """
+    Filters archive members down to candidate exports (same rules as the ingest folder).
+    """
+    base = os.path.basename(member_name)
+    if not base or base.startswith('.') or '__MACOSX' in member_name:
+        return False
+    return base.endswith('.json') or '.' not in base
+
+def iter_archive_members(archive_path):
+    """
+    Streams (member_name, raw_bytes) for every export inside a zip or tar archive.
+    Tar archives are read sequentially ('r|*'), so compressed bundles are never seeked or unpacked.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not _is_export_member(info.filename):
+                    continue
+                with zf.open(info) as fh:
+                    yield info.filename, fh.read()
+    else:
+        with tarfile.open(archive_path, 'r|*') as tf:
+            for member in tf:
+                if not member.isfile() or not _is_export_member(member.name):
+                    continue
+                fh = tf.extractfile(member)
+                if fh is None:
+                    continue
+                yield member.name, fh.read()
+
+def load_export(payload, selection=None):
+    """
+    Loads export JSON from a file path or from raw bytes (archive member).
+    With a 'selection' (ChunkSelection), the chunks it excludes are dropped right away,
+    so nothing downstream formats, renders or scans them.
+    """
+    if isinstance(payload, bytes):
+        data = json.loads(payload.decode('utf-8'))
+    else:
+        with open(payload, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    if selection is not None:
+        selection.apply(data)
+    return data
+
+def _no_stage(stage):
+    pass
+
+def update_rendering(data, header, chain, outputs, state_path, page_size="Letter", on_stage=_no_stage):
+    """
+    Brings the outputs of an earlier --incremental run of the same session up to date
+    without rendering it again. If the export's chunk chain extends the recorded one and the
+    outputs are as that run left them, only the new chunks are appended to the Markdown and
+    the HTML (the PDF is regenerated from the HTML).
+    Returns True if the outputs are now current, False if a full render is needed.
+    The session directory is locked from the check until the new state is recorded, and each
+    output is replaced atomically, so a concurrent run of the same session never appends to
+    (or records the size of) a half-updated file.
+    """
+    with DirectoryLock(os.path.dirname(state_path)):
+        state = load_render_state(state_path)
+        done = appended_chunks(state, header, chain)
+        if done is None or not outputs_untouched(state, outputs) or "html" not in state["sizes"]:
+            return False
+
+        new_chunks = data['chunkedPrompt']['chunks'][done:]
+        if not new_chunks:
+            log.info(f"Unchanged since the last run: {outputs['markdown']}", event="render_unchanged", path=outputs['markdown'])
+            return True
+
+        on_stage("markdown")
+        atomic_append(outputs['markdown'], "".join(format_chunk(chunk) for chunk in new_chunks))
+        log.info(f"Appended {len(new_chunks)} turns to: {outputs['markdown']}", event="render_appended", path=outputs['markdown'], turns=len(new_chunks))
+
+        on_stage("html")
+        if not append_html(new_chunks, outputs['html']):
+            return False
+        on_stage("pdf")
+        generate_pdf(outputs['html'], outputs['pdf'], page_size=page_size)
+
+        save_render_state(state_path, header, chain, outputs)
+        return True
+
+def process_export(filename, payload, output_dir, page_size="Letter", catalog_path=None, incremental=False, on_stage=_no_stage, selection=None):
+    """
+    Runs the full render pipeline (Markdown, system prompt, HTML, PDF) for one export.
+    'payload' is either a path on disk or the raw bytes of an archive member.
+    When 'catalog_path' is set, the session and its turns are recorded in that catalog.
+    With 'incremental', a re-export that only appends chunks to the session rendered by
+    the last --incremental run is brought up to date by update_rendering.
+    'on_stage' is called with the name of each stage as it starts (see export_watchdog.py).
+    'selection' (ChunkSelection) limits every output to the selected chunks.
+    """
+    log.info(f"Processing: {filename}", event="export_start", source=filename)
+    on_stage("load")
+
+    # Load data first
+    try:
+        data = load_export(payload, selection)
+    except Exception as e:
+        log.error(f"Failed to load {filename}: {e}")
+        return False
+
+    # Sanitize and format output filename
+    safe_name = safe_session_name(filename)
+    
+    output_filename = f"{safe_name}.md"
+    html_filename = f"{safe_name}.html"
+    pdf_filename = f"{safe_name}.pdf"
+    
+    # Create a dedicated directory for this run
+    run_output_dir = os.path.join(output_dir, safe_name)
+
+    output_path = os.path.join(run_output_dir, output_filename)
+    html_path = os.path.join(run_output_dir, html_filename)
+    pdf_path = os.path.join(run_output_dir, pdf_filename)
+    outputs = {"markdown": output_path, "html": html_path, "pdf": pdf_path}
+
+    header = chain = state_path = None
+    if incremental and 'chunks' in data.get('chunkedPrompt', {}):
+        header = header_hash(data)
+        chain = chunk_chain(data['chunkedPrompt']['chunks'], header)
+        state_path = state_path_for(run_output_dir, safe_name)
+        if update_rendering(data, header, chain, outputs, state_path, page_size, on_stage):
+            on_stage("catalog")
+            _catalog_export(catalog_path, filename, payload, safe_name, data, run_output_dir)
+            return True
+
+    on_stage("markdown")
+    extracted_text = parse_data(data, filename)
+    
+    if not extracted_text:
+        return False
+
+    if not os.path.exists(run_output_dir):
+        os.makedirs(run_output_dir, exist_ok=True)
+    
+    atomic_write(output_path, extracted_text)
+    
+    log.debug(f"Saved output to: {output_path}", event="output_written", path=output_path)
+
+    # 4. Extract and Save "System Instructions" (Sidecar)
+    system_instruction = data.get("systemInstruction", {}).get("text")
+    if system_instruction:
+        sys_filename = f"{safe_name}_system_prompt.txt"
+        sys_path = os.path.join(run_output_dir, sys_filename)
+        atomic_write(sys_path, system_instruction)
+        log.debug(f"Saved System Instructions to: {sys_path}", event="output_written", path=sys_path)
+
+    # 5. Generate HTML
+    on_stage("html")
+    if generate_html(data, html_path):
+        # 6. Generate PDF (dependent on HTML usually, or raw data)
+        # Our pdf_generator takes html path
+        on_stage("pdf")
+        generate_pdf(html_path, pdf_path, page_size=page_size)
+
+    # Chunk chain and output sizes for the next --incremental run
+    if chain is not None:
+        save_render_state(state_path, header, chain, outputs)
+
+    on_stage("catalog")
+    _catalog_export(catalog_path, filename, payload, safe_name, data, run_output_dir)
+    return True
+
+def _catalog_export(catalog_path, filename, payload, safe_name, data, run_output_dir):
+    """Records the session in the catalog (skipped when the export is unchanged since it was last indexed)."""
+    if catalog_path:
+        try:
+            fingerprint = fingerprint_bytes(payload) if isinstance(payload, bytes) else fingerprint_file(payload)
+            # A different selection of the same export indexes different turns
+            spec = data.get('chunkedPrompt', {}).get(SELECTION_KEY)
+            if spec:
+                fingerprint = f"{fingerprint}:{spec}"
+            with Catalog(catalog_path) as catalog:
+                catalog.record_session(safe_name, data, source=filename, output_dir=run_output_dir, fingerprint=fingerprint)
+        except Exception as e:
+            log.error(f"Catalog update failed for {filename}: {e}")
+
+def _process_export_job(filename, payload, output_dir, page_size, catalog_path=None, incremental=False, selection=None, on_stage=_no_stage):
+    """Worker entry point: never lets one export take down the pool."""
+    try:
+        return process_export(filename, payload, output_dir, page_size, catalog_path, incremental, on_stage, selection=selection)
+    except Exception as e:
+        log.error(f"Unexpected error processing {filename}: {e}")
+        return False
+
+def member_display_name(archive_path, member_name):
+    """
+    Name of an archive member as a source: the archive's stem and the member's path joined
+    by '__' ('bundle.zip' member 'a/chat.json' -> 'bundle__a__chat.json'), so members with
+    the same basename, or a member and a loose export, get different sessions.
+    """
+    archive_name = os.path.basename(archive_path)
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if archive_name.lower().endswith(ext):
+            archive_name = archive_name[:-len(ext)]
+            break
+    parts = [p for p in member_name.replace('\\', '/').split('/') if p and p != '.']
+    return "__".join([archive_name] + parts)
+
+def _unique_source_name(display_name, taken):
+    """
+    'display_name', or a variant with a numeric suffix ('chat_2.json') if its session name
+    is already in 'taken' (which is updated). Two sources never render into one session.
+    """
+    name = safe_session_name(display_name)
+    if name in taken:
+        ext = os.path.splitext(display_name)[1]
+        i = 2
+        while f"{name}_{i}" in taken:
+            i += 1
+        log.warning(f"Session name '{name}' is already used by another source, writing {display_name} to '{name}_{i}'")
+        name = f"{name}_{i}"
+        display_name = name + ext
+    taken.add(name)
+    return display_name
+
+def iter_sources(input_dir, json_files, archives):
+    """
+    Yields (display_name, payload) for plain exports and for every archive member.
+    Archive members are named by member_display_name, and every display name maps to its own
+    session (see _unique_source_name).
+    """
+    taken = set()
+    for filename in json_files:
+        yield _unique_source_name(filename, taken), os.path.join(input_dir, filename)
+    for archive_path in archives:
+        log.info(f"Reading archive: {archive_path}")
+        try:
+            for member_name, raw in iter_archive_members(archive_path):
+                yield _unique_source_name(member_display_name(archive_path, member_name), taken), raw
+        except (tarfile.TarError, zipfile.BadZipFile, OSError) as e:
+            log.error(f"Failed to read archive {archive_path}: {e}")
+
+def run_sources(sources, output_dir, page_size="Letter", workers=1, catalog_path=None, incremental=False, watchdog=None, pipeline=False, selection=None, scheduler=None):
+    """
+    Processes sources serially, or spreads them across a process pool when workers > 1.
+    At most 2 * workers payloads are in flight so large archives are not buffered whole.
+    With a 'watchdog' (ExportWatchdog), every export runs in its own guarded worker instead;
+    with 'pipeline', exports stream through the stages of a StagedPipeline.
+    'selection' (ChunkSelection) is applied as each export is loaded.
+    With a 'scheduler' (CostScheduler), exports run longest first, the pool only takes as many
+    as it has workers (and the memory ceiling allows), and their costs are measured.
+    """
+    if scheduler is not None:
+        planned = scheduler.plan(sources)
+        if watchdog is not None or pipeline:
+            # Only the order applies: these run and time the exports themselves
+            sources = ((filename, payload) for filename, payload, _ in planned)
+        else:
+            _run_scheduled(planned, scheduler, output_dir, page_size, workers, catalog_path, incremental, selection)
+            scheduler.save_report(output_dir)
+            return
+
+    if watchdog is not None:
+        watchdog.run(sources, process_export, output_dir=output_dir, page_size=page_size, catalog_path=catalog_path, incremental=incremental,
+                     selection=selection)
+        if scheduler is not None:
+            scheduler.save_report(output_dir)
+        return
+
+    if pipeline:
+        record_catalog = partial(_catalog_export, catalog_path) if catalog_path else None
+        StagedPipeline(output_dir, partial(load_export, selection=selection), parse_data, safe_session_name, page_size=page_size, workers=workers,
+                       record_catalog=record_catalog).run(sources)
+        if scheduler is not None:
+            scheduler.save_report(output_dir)
+        return
+
+    progress = Progress(log, "Rendering exports", unit="exports")
+    if workers <= 1:
+        for filename, payload in sources:
+            _process_export_job(filename, payload, output_dir, page_size, catalog_path, incremental, selection)
+            progress.advance(progress.position + _payload_size(payload))
+        progress.finish()
+        return
+
+    # Workers log with the same settings (needed where they are spawned, not forked)
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure, initargs=settings()) as pool:
+        pending = {}
+        for filename, payload in sources:
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress.advance(progress.position + pending.pop(future))
+            pending[pool.submit(_process_export_job, filename, payload, output_dir, page_size, catalog_path, incremental, selection)] = _payload_size(payload)
+        wait(pending)
+        for size in pending.values():
+            progress.advance(progress.position + size)
+    progress.finish()
+
+def _measured_pool(workers):
+    """
+    Process pool for measured exports, and whether each of its workers exits after one export
+    (Python 3.11+), so the peak memory a worker reports belongs to that export alone.
+    """
+    try:
+        return ProcessPoolExecutor(max_workers=workers, initializer=configure, initargs=settings(), max_tasks_per_child=1), True
+    except TypeError:
+        return ProcessPoolExecutor(max_workers=workers, initializer=configure, initargs=settings()), False
+
+def _run_scheduled(planned, scheduler, output_dir, page_size, workers, catalog_path, incremental, selection):
+    """
+    run_sources with a CostScheduler: 'planned' yields (filename, payload, estimate). Every
+    export, also with a single worker, renders in a fresh worker process where it is timed and
+    its peak memory measured (run_measured) for the schedule report.
+    """
+    workers = max(1, workers)
+    pool, fresh_process = _measured_pool(workers)
+    job = partial(run_measured, _process_export_job, fresh_process=fresh_process, output_dir=output_dir, page_size=page_size,
+                  catalog_path=catalog_path, incremental=incremental, selection=selection)
+    progress = Progress(log, "Rendering exports", unit="exports")
+
+    def collect(done):
+        for future in done:
+            estimate = pending.pop(future)
+            try:
+                _, seconds, memory_mb = future.result()
+            except Exception as e:
+                log.error(f"Unexpected error processing {estimate.source}: {e}")
+                seconds = memory_mb = None
+            scheduler.finish(estimate, seconds, memory_mb)
+            progress.advance(progress.position + estimate.size)
+
+    with pool:
+        pending = {}
+        for filename, payload, estimate in planned:
+            # No queue behind the workers: the next export starts only when one finishes and its memory fits
+            while pending and (len(pending) >= workers or not scheduler.admits(estimate)):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            scheduler.start(estimate)
+            pending[pool.submit(job, filename, payload)] = estimate
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    progress.finish()
+
+def _payload_size(payload):
+    """Size in bytes of an export (archive member bytes or a path on disk), for throughput."""
+    if isinstance(payload, bytes):
+        return len(payload)
+    try:
+        return os.path.getsize(payload)
+    except OSError:
+        return 0
+
 def main():
     parser = argparse.ArgumentParser(description="Parse JSON conversation logs to Markdown.")
-    parser.add_argument("--input", "-i", default=DEFAULT_INGEST_DIR, help="Directory containing JSON files")
+    parser.add_argument("--input", "-i", default=DEFAULT_INGEST_DIR, help="Directory containing JSON files (or zip/tar archives of them), or a single archive")
     parser.add_argument("--output", "-o", default=DEFAULT_OUTPUT_DIR, help="Directory to save output Markdown files")
     parser.add_argument("--page-size", default="Letter", help="Page size for PDF output (e.g., Letter, A4)")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Number of worker processes used to render exports in parallel (default: 1)")
+    parser.add_argument("--catalog", help="SQLite catalog to update with sessions and turns (e.g. output/catalog.sqlite)")
+    parser.add_argument("--incremental", action='store_true', help="Only render the turns appended since the last --incremental run of a session (re-exports of a growing conversation)")
+    parser.add_argument("--export-timeout", type=float, default=0, help="Wall-clock budget in seconds per export; a worker over it is killed and the export quarantined (default: 0 = off)")
+    parser.add_argument("--stage-timeout", type=float, default=0, help="Wall-clock budget in seconds per render stage (markdown, html, pdf, ...) of an export (default: 0 = off)")
+    parser.add_argument("--memory-limit", type=float, default=0, help="Resident memory limit in MB per export worker (default: 0 = off)")
+    parser.add_argument("--retry-quarantined", action='store_true', help="Process exports listed in <output>/quarantine.json even if they are unchanged")
+    parser.add_argument("--pipeline", action='store_true', help="Stream exports through overlapping read / render / write stages (asyncio, bounded queues) instead of one export at a time")
+    parser.add_argument("--schedule", action='store_true', help="Render the exports with the longest estimated render time first and record estimated vs. actual costs in <output>/schedule_report.json")
+    parser.add_argument("--memory-ceiling", type=float, default=0, help="Only start another export while the estimated memory of the running ones stays under this many MB (implies --schedule; default: 0 = off)")
     
+    add_selection_arguments(parser)
+    add_arguments(parser)
     # We use parse_known_args because run_parser.sh passes "$@" which might contain other args (though currently it doesn't)
     args, unknown = parser.parse_known_args()
+    configure_from_args(args)
+
+    try:
+        selection = ChunkSelection.from_args(args)
+    except ValueError as e:
+        log.error(f"Error: {e}")
+        sys.exit(1)
+    if selection.is_all():
+        selection = None
 
     input_dir = os.path.abspath(args.input)
     output_dir = os.path.abspath(args.output)
@@ -98,9 +512,33 @@ def main():
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    # Any limit runs every export in its own guarded worker (run report + quarantine in output_dir)
+    watchdog = None
+    if args.export_timeout or args.stage_timeout or args.memory_limit:
+        watchdog = ExportWatchdog(output_dir, timeout=args.export_timeout, stage_timeout=args.stage_timeout,
+                                  memory_limit=args.memory_limit, workers=args.workers, retry_quarantined=args.retry_quarantined)
+    if args.pipeline and (watchdog is not None or args.incremental):
+        log.warning("--pipeline does not combine with --incremental or the watchdog limits, rendering one export at a time")
+        args.pipeline = False
+
+    scheduler = None
+    if args.schedule or args.memory_ceiling:
+        scheduler = CostScheduler(memory_ceiling=args.memory_ceiling)
+        if args.memory_ceiling and (watchdog is not None or args.pipeline):
+            log.warning("--memory-ceiling applies to the worker pool; with --pipeline or the watchdog limits only the order is scheduled")
+
     # List files in ingest directory
     if not os.path.exists(input_dir):
-        print(f"Input directory not found: {input_dir}")
+        log.error(f"Input directory not found: {input_dir}")
+        return
+
+    # A single archive may be passed directly as --input
+    if os.path.isfile(input_dir):
+        if not is_archive(input_dir):
+            log.error(f"Input is not a directory or a supported archive: {input_dir}")
+            return
+        log.info(f"Streaming exports from archive: {input_dir}. Outputting to: {output_dir}")
+        run_sources(iter_sources(os.path.dirname(input_dir), [], [input_dir]), output_dir, args.page_size, args.workers, args.catalog, args.incremental, watchdog, args.pipeline, selection, scheduler)
         return
 
     all_files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f)) and not f.startswith('.')]
@@ -113,17 +551,20 @@ def main():
             new_path = os.path.join(input_dir, new_name)
             try:
                 os.rename(path, new_path)
-                print(f"Auto-renamed '{f}' to '{new_name}'")
+                log.info(f"Auto-renamed '{f}' to '{new_name}'")
                 all_files[i] = new_name # Update list for processing
             except Exception as e:
-                print(f"Failed to auto-rename '{f}': {e}")
+                log.warning(f"Failed to auto-rename '{f}': {e}")
                 
     json_files = []
+    archives = []
 
     for f in all_files:
         path = os.path.join(input_dir, f)
         if f.endswith('.json'):
             json_files.append(f)
+        elif is_archive(f):
+            archives.append(path)
         elif '.' not in f:
             # Check if "un-affixed" file is valid JSON
             try:
@@ -142,67 +583,13 @@ def main():
                 # Not a JSON file, silently skip
                 continue
     
-    if not json_files:
-        print(f"No JSON files found in {input_dir}")
+    if not json_files and not archives:
+        log.warning(f"No JSON files found in {input_dir}")
         return
 
-    print(f"Found {len(json_files)} valid JSON files in {input_dir}. Outputting to: {output_dir}")
+    log.info(f"Found {len(json_files)} valid JSON files and {len(archives)} archives in {input_dir}. Outputting to: {output_dir}")
 
-    for filename in json_files:
-        file_path = os.path.join(input_dir, filename)
-        print(f"Processing: {filename}")
-        
-        # Load data first
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"Failed to load {filename}: {e}")
-            continue
-
-        extracted_text = parse_file(file_path)
-        
-        if extracted_text:
-            # Sanitize and format output filename
-            base_name = os.path.splitext(filename)[0]
-            # Remove invalid chars
-            safe_name = re.sub(r'[<>:"/\\|?*]', '', base_name)
-            # Collapse whitespace
-            safe_name = re.sub(r'\s+', '_', safe_name).strip()
-            
-            output_filename = f"{safe_name}.md"
-            html_filename = f"{safe_name}.html"
-            pdf_filename = f"{safe_name}.pdf"
-            
-            # Create a dedicated directory for this run
-            run_output_dir = os.path.join(output_dir, safe_name)
-            if not os.path.exists(run_output_dir):
-                os.makedirs(run_output_dir)
-
-            output_path = os.path.join(run_output_dir, output_filename)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(extracted_text)
-            
-            print(f"Saved output to: {output_path}")
-
-            # 4. Extract and Save "System Instructions" (Sidecar)
-            system_instruction = data.get("systemInstruction", {}).get("text")
-            if system_instruction:
-                sys_filename = f"{safe_name}_system_prompt.txt"
-                sys_path = os.path.join(run_output_dir, sys_filename)
-                with open(sys_path, 'w', encoding='utf-8') as f:
-                    f.write(system_instruction)
-                print(f"Saved System Instructions to: {sys_path}")
-
-            # 5. Generate HTML
-            html_path = os.path.join(run_output_dir, html_filename)
-            
-            if generate_html(data, html_path):
-                # 6. Generate PDF (dependent on HTML usually, or raw data)
-                # Our pdf_generator takes html path
-                pdf_path = os.path.join(run_output_dir, pdf_filename)
-                generate_pdf(html_path, pdf_path, page_size=args.page_size)
+    run_sources(iter_sources(input_dir, json_files, archives), output_dir, args.page_size, args.workers, args.catalog, args.incremental, watchdog, args.pipeline, selection, scheduler)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+
+JOURNAL_FILENAME = "manifest.jsonl"
+
+# Characters/bytes hashed per step, so a large (mmapped) input is never copied whole
+_HASH_STEP = 1 << 20
+
+
+def source_fingerprint(text, source_filename, length=None):
+    """
+    Identity of an extraction input: name, scan mode, length and a SHA-1 of its whole
+    content (one streaming pass). Offsets from a str scan and a bytes (mmap) scan differ,
+    so the mode is part of it.
+    With 'length', the identity of just the first 'length' characters (or bytes) of 'text'.
+    """
+    if length is None:
+        length = len(text)
+    mode = "str" if isinstance(text, str) else "bytes"
+    h = hashlib.sha1()
+    for start in range(0, length, _HASH_STEP):
+        piece = text[start:min(start + _HASH_STEP, length)]
+        h.update(piece.encode('utf-8') if isinstance(piece, str) else piece)
+    return {"source": os.path.basename(source_filename), "mode": mode, "length": length, "hash": h.hexdigest()}
+
+
+def _extends(recorded, source_info, text):
+    """True if 'text' (identified by 'source_info') is the 'recorded' input with content appended."""
+    if not recorded or recorded.get("source") != source_info["source"] or recorded.get("mode") != source_info["mode"]:
+        return False
+    if not 0 < recorded.get("length", 0) < source_info["length"]:
+        return False
+    return source_fingerprint(text, source_info["source"], recorded["length"]) == recorded
+
+
+class ManifestJournal:
+    """
+    Append-only JSONL log of manifest entries, written as each block is committed.
+
+    Line types:
+      {"type": "start", "source": {...}, "pad_width"}         identity of the input
+      {"type": "entry", "offset", "count", "file_count", "versions", "entry"}
+      {"type": "end"}                                          extraction completed
+      {"type": "extend", "source": {...}, "pad_width"}        input grew, extraction continues
+
+    'offset' is the end of the committed block's content (its closing fence follows); a
+    resumed run skips every event before it. manifest.json is still written at the end.
+    """
+
+    def __init__(self, base_dir):
+        self.path = os.path.join(base_dir, JOURNAL_FILENAME)
+        self._fh = None
+
+    def load(self, source_info, text=None):
+        """
+        Returns the checkpoint state recorded for 'source_info', or None if there is no
+        usable journal (missing, different input, or unreadable).
+
+        With 'text' (the current input), a completed journal of a shorter input that 'text'
+        starts with is accepted as well (a re-export with turns appended); that state has
+        "extended" set.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        state = {"entries": [], "offset": 0, "count": 0, "file_count": 0, "versions": {},
+                 "complete": False, "extended": False, "pad_width": None}
+        recorded = None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+
+        for i, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from a killed run is expected; anything else is not
+                if i == len(lines) - 1:
+                    break
+                return None
+
+            kind = record.get("type")
+            if i == 0:
+                if kind != "start":
+                    return None
+                recorded = record.get("source")
+                state["pad_width"] = record.get("pad_width")
+                continue
+            if kind == "extend":
+                recorded = record.get("source")
+                state["pad_width"] = record.get("pad_width")
+                state["complete"] = False
+            elif kind == "entry":
+                state["entries"].append(record["entry"])
+                state["offset"] = record["offset"]
+                state["count"] = record["count"]
+                state["file_count"] = record["file_count"]
+                state["versions"].update(record.get("versions", {}))
+            elif kind == "end":
+                state["complete"] = True
+
+        if recorded == source_info:
+            return state
+        if text is not None and state["complete"] and _extends(recorded, source_info, text):
+            state["extended"] = True
+            return state
+        return None
+
+    def start(self, source_info, resume=False, extend=False, pad_width=None):
+        """
+        Opens the journal; a fresh run truncates it and records the input identity.
+        With 'extend' (continuing the journal of a shorter input, see load) the new identity
+        is recorded before further entries.
+        """
+        parent_dir = os.path.dirname(self.path)
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+
+        if resume and os.path.exists(self.path):
+            # Drop a torn trailing line before appending
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                keep = data.rfind(b'\n') + 1
+                if keep < len(data):
+                    f.truncate(keep)
+            self._fh = open(self.path, 'a', encoding='utf-8')
+            if extend:
+                self._write({"type": "extend", "source": source_info, "pad_width": pad_width})
+        else:
+            self._fh = open(self.path, 'w', encoding='utf-8')
+            self._write({"type": "start", "source": source_info, "pad_width": pad_width})
+
+    def _write(self, record):
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def commit(self, entry, offset, count, file_count, versions=None):
+        self._write({"type": "entry", "offset": offset, "count": count, "file_count": file_count,
+                     "versions": versions or {}, "entry": entry})
+
+    def finish(self):
+        if self._fh is not None:
+            self._write({"type": "end"})
+            self.close()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
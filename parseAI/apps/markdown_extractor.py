@@ -2,9 +2,26 @@ import os
 import sys
 import argparse
 import json
+import mmap
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from extractor import CodeExtractor
-from html_generator import generate_html_from_markdown
-from pdf_generator import generate_pdf
+from extraction_profile import profile_for
+from html_generator import generate_html_from_markdown, render_html_from_markdown
+from pdf_generator import generate_pdf, render_pdf
+from archive_output import ArchiveWriter, ARCHIVE_FORMATS, archive_path_for
+from catalog import catalog_extraction_results
+from project_index import index_extraction_results
+from pattern_guard import DEFAULT_PATTERN_TIMEOUT
+from json_parser import DEFAULT_OUTPUT_DIR, load_export, safe_session_name
+from validator import validate_manifest
+from safe_io import DirectoryLock, atomic_write
+from extraction_views import VIEWS, parse_views
+from chunk_selection import ChunkSelection, turn_indexes
+from chunk_selection import add_arguments as add_selection_arguments
+from plugin_host import DEFAULT_PLUGIN_DIR, REPORT_FILENAME, PluginHost, discover_plugins, merge_stats, write_report
+from run_log import add_arguments, configure, configure_from_args, get_logger, settings
+
+log = get_logger("markdown_extractor")
 
 def main():
     parser = argparse.ArgumentParser(description="Extract code blocks from a Markdown file.")
@@ -63,163 +80,401 @@ def parse_custom_header(text, border_char="-"):
         
     return None, text
 
-def process_markdown_file(input_path, args, processed_set=None):
+def render_nested_docs(md_path, rel_name, border_char="-", archive=None, md_content=None):
     """
-    Recursively extracts code from a markdown file and processes nested markdown files.
+    Generates the HTML/PDF documentation for an extracted markdown file.
+    Runs as its own task so rendering never blocks the descent into nested files.
     """
-    if processed_set is None:
-        processed_set = set()
-    
-    # Avoid infinite recursion
-    abs_path = os.path.abspath(input_path)
-    if abs_path in processed_set:
-        print(f"Skipping already processed file: {input_path}")
-        return
-    processed_set.add(abs_path)
-    
-    if not os.path.exists(input_path):
-        print(f"Error: Input file not found: {input_path}")
-        return
+    file_base = os.path.splitext(md_path)[0]
+    html_path = f"{file_base}.html"
+    pdf_path = f"{file_base}.pdf"
+
+    try:
+        if md_content is None:
+            with open(md_path, 'r', encoding='utf-8') as mf:
+                md_content = mf.read()
+        
+        # Generate Friendly Title
+        pretty_title = prettify_title(rel_name)
+        
+        # Parse Custom Header from Content
+        custom_header, body_content = parse_custom_header(md_content, border_char=border_char)
+        
+        # Logic: If custom header found, use IT as the subtitle/block content relative to the pretty title.
+        # OR replace the subtitle logic entirely.
+        # User wanted "investigate subsequent header lines... appear as a code block".
+        # If custom header exists, we pass it as 'header_block' content?
+        # We need to update HTML generator signature one more time or abuse 'subtitle'.
+        # I will pass it as 'subtitle' but wrap it uniquely so HTML generator knows not to just text-node it?
+        # Actually, HTML gen takes 'subtitle' and puts it in .file-path (div).
+        # If I pass the raw header lines with newlines, I should wrap them in <pre>.
+        
+        final_subtitle = rel_name
+        if custom_header:
+            # Format the header lines for the block
+            # Escape HTML
+            import html
+            safe_header = html.escape(custom_header)
+            final_subtitle = f"{rel_name}<hr style='border:0; border-top:1px solid #555; margin:5px 0;'><pre style='background:none; border:none; padding:0; margin:0; color:#ddd;'>{safe_header}</pre>"
+        
+        # Generate HTML
+        if archive is not None:
+            doc_html = render_html_from_markdown(body_content, title=pretty_title, subtitle=final_subtitle)
+            archive.write(html_path, doc_html)
+            log.debug(f"Generated HTML (from MD): {html_path}", event="output_written", path=html_path)
+            pdf_bytes = render_pdf(doc_html, page_size="Letter")
+            if pdf_bytes is not None:
+                archive.write(pdf_path, pdf_bytes)
+                log.debug(f"Generated PDF: {pdf_path} (Size: Letter)", event="output_written", path=pdf_path)
+        elif generate_html_from_markdown(body_content, html_path, title=pretty_title, subtitle=final_subtitle):
+            # Generate PDF
+            # We don't have page_size in args for this script... assume Letter?
+            # Or add it to args.
+            generate_pdf(html_path, pdf_path, page_size="Letter")
+    except Exception as e:
+        log.error(f"  [Recursive] Failed to generate docs for {rel_name}: {e}")
+
+def extract_markdown_job(input_path, args, archive=None, text=None, chunks=None, turns=None):
+    """
+    Extracts code from ONE markdown file (no recursion).
+    With 'chunks' (from a JSON export), 'input_path' is the session Markdown path the
+    output is laid out for, and the code is extracted from the chunks directly ('turns' are
+    their indexes in the export when a selection was applied).
+
+    Returns a dict with the extracted 'count', the 'manifest_path' and the nested
+    markdown 'children' as (path, relative name) pairs, taken from the in-memory manifest.
+    """
+    result = {'path': input_path, 'count': 0, 'manifest_path': None, 'manifest': [], 'children': []}
+
+    if text is None and chunks is None and not os.path.exists(input_path):
+        log.error(f"Error: Input file not found: {input_path}")
+        return result
 
     # Determine output directory (same as input file's directory)
     output_dir = os.path.dirname(input_path)
     filename = os.path.basename(input_path)
 
-    print(f"Extracting code from: {filename}")
+    log.info(f"Extracting code from: {filename}", event="extract_start", source=input_path)
+
+    # Helper to get the extraction directory (output_dir/[filename]_files)
+    source_name = os.path.splitext(filename)[0]
+    base_extraction_dir = os.path.join(output_dir, f"{source_name}_files")
+
+    source_file = None
+    mapped = None
+    # Held for the whole job, so concurrent runs on the same session do not interleave
+    lock = DirectoryLock(base_extraction_dir)
     
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        lock.acquire()
+
+        if text is None and chunks is None:
+            # Large inputs are scanned straight from the page cache instead of being decoded into a str
+            size = os.path.getsize(input_path)
+            mmap_threshold = getattr(args, 'mmap_threshold', None)
+            if mmap_threshold is not None and size > 0 and size >= mmap_threshold * 1024 * 1024:
+                source_file = open(input_path, 'rb')
+                mapped = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+                text = mapped
+                log.info(f"  Scanning memory-mapped input ({size / (1024 * 1024):.1f} MB)")
+            else:
+                with open(input_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
 
-        extractor = CodeExtractor(output_dir)
+        views = getattr(args, 'views', None) or VIEWS
+        # Plugins are imported by the first job that runs in each (worker) process
+        plugin_files = getattr(args, 'plugin_files', None)
+        plugins = PluginHost(plugin_files) if plugin_files else None
+        # Built once in main and shipped to the workers with 'args'
+        profile = getattr(args, 'profile', None) or profile_for(args.parse, args.strip)
+        extractor = CodeExtractor(output_dir, archive=archive, history=getattr(args, 'history', False), views=views, plugins=plugins, profile=profile)
 
-        num_files = extractor.extract_from_text(
-            text, 
-            filename, 
-            custom_patterns=args.parse,
+        options = dict(
             add_numbering=args.add_numbering,
-            strip_patterns=args.strip,
-            reconstruct=args.reconstruct or args.clean_project
+            reconstruct=args.reconstruct or args.clean_project or getattr(args, 'views', None) is not None and "reconstructed" in args.views,
+            pattern_timeout=getattr(args, 'parse_timeout', DEFAULT_PATTERN_TIMEOUT),
+            resume=getattr(args, 'resume', False),
+            incremental=getattr(args, 'incremental', False),
+            scan_workers=getattr(args, 'workers', 1) or 1
         )
+        if chunks is not None:
+            num_files = extractor.extract_from_chunks(chunks, filename, turn_indexes=turns, **options)
+        else:
+            num_files = extractor.extract_from_text(text, filename, **options)
+        result['count'] = num_files
+        result['pattern_report'] = extractor.pattern_report
+        if plugins is not None:
+            result['plugin_stats'] = plugins.stats
         
         if num_files > 0:
-            print(f"  -> Extracted {num_files} files from {filename}.")
-            
-            # Helper to get the extraction directory (output_dir/[filename]_files)
-            source_name = os.path.splitext(filename)[0]
-            base_extraction_dir = os.path.join(output_dir, f"{source_name}_files")
+            log.info(f"  -> Extracted {num_files} files from {filename}.", event="extract_done", source=input_path, blocks=num_files)
             
-            # Process Manifest for Recursive Extraction
             manifest_path = os.path.join(base_extraction_dir, "manifest.json")
+            result['manifest_path'] = manifest_path
+            result['manifest'] = extractor.manifest
+
+            # Optional syntax check of the extracted blocks, stored per entry in manifest.json
+            if getattr(args, 'validate', False):
+                if archive is not None:
+                    log.warning("  Validation is not available with archive output, skipping")
+                else:
+                    summary = validate_manifest(base_extraction_dir, extractor.manifest, workers=getattr(args, 'workers', 1) or 1)
+                    atomic_write(manifest_path, json.dumps(extractor.manifest, indent=2))
+                    log.info(f"  -> Validated blocks: {summary['ok']} ok, {summary['error']} errors, {summary['skipped']} skipped ({summary['cached']} from cache)", event="validated", **summary)
             
-            # --- MERGE LOGIC REMOVED FOR SIMPLICITY RECURSION, or keep it? ---
-            # Keeping merge logic for the top-level or sub-levels if requested.
-            # Determine Merge Target
-            merge_target = args.merge_to
+            # Per-file merge target. A shared --merge-to target is merged by the
+            # driver in a deterministic order once all jobs are done.
             if args.clean_project:
-                merge_target = os.path.join(base_extraction_dir, "merged_project")
-
-            if merge_target:
                 extractor.merge_reconstruction(
                     manifest_path, 
-                    merge_target, 
-                    clean_target=args.clean_project
+                    os.path.join(base_extraction_dir, "merged_project"), 
+                    clean_target=True
                 )
             
-            # --- RECURSIVE STEP ---
-            if os.path.exists(manifest_path):
-                with open(manifest_path, 'r', encoding='utf-8') as f:
-                    manifest = json.load(f)
-                
-                for entry in manifest:
-                    # Determine where the file is on disk
-                    # It could be in 'saved_as' (files/) or 'reconstructed_path' (reconstructed/)
-                    # We usually want to process the one in 'files/' as the "master" reference? 
-                    # OR if reconstructed exists, use that?
-                    # Let's prioritize 'saved_as' as it is the flat/standard output.
-                    
-                    target_rel_path = entry.get('saved_as')
-                    if not target_rel_path and 'reconstructed_path' in entry:
-                         # Fallback to reconstructed path if 'files' logic failed?
-                         # Usually both exist if Reconstruct is ON. 
-                         # Extractor always writes to 'files/', 'reconstructed/' is optional.
-                         pass
-                    
-                    if target_rel_path:
-                        # Full path to extracted file
+            # --- NESTED MARKDOWN (from the in-memory manifest) ---
+            for entry in extractor.manifest:
+                # Prioritize 'saved_as' as it is the flat/standard output, then whichever view was written.
+                target_rel_path = entry.get('saved_as')
+                if target_rel_path and target_rel_path.lower().endswith('.md'):
+                    if "files" in views:
                         extracted_file_path = os.path.join(base_extraction_dir, "files", target_rel_path)
-                        
-                        # Check extension
-                        if extracted_file_path.lower().endswith('.md'):
-                            print(f"  [Recursive] Found Markdown file: {target_rel_path}")
-                            
-                            # 1. Generate HTML/PDF for this sub-file
-                            file_base = os.path.splitext(extracted_file_path)[0]
-                            html_path = f"{file_base}.html"
-                            pdf_path = f"{file_base}.pdf"
-                            
-                            try:
-                                with open(extracted_file_path, 'r', encoding='utf-8') as mf:
-                                    md_content = mf.read()
-                                
-                                # Generate Friendly Title
-                                pretty_title = prettify_title(target_rel_path)
-                                
-                                # Parse Custom Header from Content
-                                custom_header, body_content = parse_custom_header(md_content, border_char=args.header_border_char)
-                                
-                                # Logic: If custom header found, use IT as the subtitle/block content relative to the pretty title.
-                                # OR replace the subtitle logic entirely.
-                                # User wanted "investigate subsequent header lines... appear as a code block".
-                                # If custom header exists, we pass it as 'header_block' content?
-                                # We need to update HTML generator signature one more time or abuse 'subtitle'.
-                                # I will pass it as 'subtitle' but wrap it uniquely so HTML generator knows not to just text-node it?
-                                # Actually, HTML gen takes 'subtitle' and puts it in .file-path (div).
-                                # If I pass the raw header lines with newlines, I should wrap them in <pre>.
-                                
-                                final_subtitle = target_rel_path
-                                if custom_header:
-                                    # Format the header lines for the block
-                                    # Escape HTML
-                                    import html
-                                    safe_header = html.escape(custom_header)
-                                    final_subtitle = f"{target_rel_path}<hr style='border:0; border-top:1px solid #555; margin:5px 0;'><pre style='background:none; border:none; padding:0; margin:0; color:#ddd;'>{safe_header}</pre>"
-                                
-                                # Generate HTML
-                                if generate_html_from_markdown(body_content, html_path, title=pretty_title, subtitle=final_subtitle):
-                                    # Generate PDF
-                                    # We don't have page_size in args for this script... assume Letter?
-                                    # Or add it to args.
-                                    generate_pdf(html_path, pdf_path, page_size="Letter")
-                            except Exception as e:
-                                print(f"  [Recursive] Failed to generate docs for {target_rel_path}: {e}")
-
-                            # 2. Recurse!
-                            # Pass 'args' down.
-                            process_markdown_file(extracted_file_path, args, processed_set)
+                    elif "reconstructed" in views and entry.get('reconstructed_path'):
+                        extracted_file_path = os.path.join(base_extraction_dir, "reconstructed", entry['reconstructed_path'])
+                    else:
+                        extracted_file_path = os.path.join(base_extraction_dir, "code_blocks", entry['file'])
+                    result['children'].append((extracted_file_path, target_rel_path))
 
         else:
-            print(f"  -> No files found to extract in {filename}.")
+            log.info(f"  -> No files found to extract in {filename}.")
 
     except Exception as e:
-        print(f"An error occurred processing {filename}: {e}")
+        log.error(f"An error occurred processing {filename}: {e}")
+    finally:
+        if mapped is not None:
+            mapped.close()
+            source_file.close()
+        lock.release()
+
+    return result
+
+class _InlineExecutor:
+    """
+    Executor stand-in that runs tasks immediately in the calling process.
+    Used for --workers 1 and for archive output (a single sequential stream).
+    """
+
+    def submit(self, fn, *a, **kw):
+        future = Future()
+        try:
+            future.set_result(fn(*a, **kw))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+def process_markdown_file(input_path, args, processed_set=None, archive=None, chunks=None, turns=None):
+    """
+    Extracts code from a markdown file and every markdown file nested inside it.
+
+    Nested files are processed from a work queue (breadth-first) on a pool of
+    --workers processes instead of by recursion. 'processed_set' guards against
+    cycles and --max-depth bounds how deep "docs inside docs" are followed.
+    When 'archive' (ArchiveWriter) is given, everything runs in this process and
+    nested markdown is read back from the archive.
+    'chunks' (from a JSON export, with their turn indexes in 'turns') replaces the contents of the top-level file.
+
+    Returns the extraction results of every processed file, in queue order.
+    """
+    if processed_set is None:
+        processed_set = set()
+
+    workers = getattr(args, 'workers', 1) or 1
+    max_depth = getattr(args, 'max_depth', None)
+
+    if archive is not None or workers <= 1:
+        executor = _InlineExecutor()
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=configure, initargs=settings())
+
+    futures = {}
+    completed = []  # extraction results in submission order (for the shared merge)
+
+    def schedule(path, depth, text=None, chunks=None, turns=None):
+        # Avoid infinite recursion
+        abs_path = os.path.abspath(path)
+        if abs_path in processed_set:
+            log.debug(f"Skipping already processed file: {path}")
+            return
+        if max_depth is not None and depth > max_depth:
+            log.warning(f"  [Recursive] Depth limit ({max_depth}) reached, not descending into: {path}")
+            return
+        processed_set.add(abs_path)
+
+        seq = len(completed)
+        completed.append(None)
+        future = executor.submit(extract_markdown_job, path, args, archive, text, chunks, turns)
+        futures[future] = ('extract', seq, depth)
+
+    with executor:
+        schedule(input_path, 0, chunks=chunks, turns=turns)
+
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, seq, depth = futures.pop(future)
+                if kind != 'extract':
+                    continue
+
+                result = future.result()
+                completed[seq] = result
+
+                for child_path, rel_name in result['children']:
+                    log.info(f"  [Recursive] Found Markdown file: {rel_name}")
+                    md_content = archive.read(child_path) if archive is not None else None
+                    if archive is not None and md_content is None:
+                        log.warning(f"  [Recursive] {rel_name} is not in the archive, skipping")
+                        continue
+
+                    # 1. Generate HTML/PDF for this sub-file (in parallel with its extraction)
+                    docs_future = executor.submit(render_nested_docs, child_path, rel_name, args.header_border_char, archive, md_content)
+                    futures[docs_future] = ('docs', None, depth)
+
+                    # 2. Queue the nested file itself
+                    schedule(child_path, depth + 1, md_content)
+
+    # Shared merge target: Last-Write-Wins in the order the files were queued
+    if args.merge_to and not args.clean_project:
+        for result in completed:
+            if result and result['manifest_path']:
+                merger = CodeExtractor(os.path.dirname(result['path']), archive=archive)
+                merger.merge_reconstruction(result['manifest_path'], args.merge_to)
+
+    return completed
 
 def main():
     parser = argparse.ArgumentParser(description="Extract code blocks from a Markdown file.")
-    parser.add_argument("input_file", help="Path to the input Markdown file.")
+    parser.add_argument("input_file", help="Path to the input Markdown file, or a JSON export to extract from directly.")
+    parser.add_argument("--output", "-o", default=DEFAULT_OUTPUT_DIR, help="Output root for JSON export inputs (same layout as json_parser.py).")
     parser.add_argument("--parse", action='append', help="Custom regex pattern for filename detection. Capture group 1 must be the filename.", default=[])
+    parser.add_argument("--parse-timeout", type=float, default=DEFAULT_PATTERN_TIMEOUT, help=f"Wall-clock budget in seconds for each --parse pattern per file; 0 disables the guard (default: {DEFAULT_PATTERN_TIMEOUT:g}).")
     parser.add_argument("--add-numbering", "-n", action='store_true', help="Prepend sequential numbers to extracted filenames (e.g. 001_file.py).")
     parser.add_argument("--strip", "-s", action='append', help="Regex pattern to strip from start of filenames (e.g. '^py_').", default=[])
     parser.add_argument("--reconstruct", "-r", action='store_true', help="Reconstruct directory structure from flat filenames (e.g. src_main.py -> src/main.py).")
     parser.add_argument("--merge-to", "-m", help="Merge reconstructed files into a single unified directory (e.g. ./my_project). Overwrites older versions.")
     parser.add_argument("--clean-project", "-cp", action='store_true', help="Automatically reconstructs and merges files into a 'merged_project' folder inside the session directory. (Shortcut for -r and -m)")
     parser.add_argument("--header-border-char", default="-", help="Character that defines the end of the header block (repeated). Default is '-'.")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Number of worker processes for nested markdown extraction and rendering, and for scanning very large inputs (default: 1).")
+    parser.add_argument("--max-depth", type=int, default=10, help="Maximum nesting depth followed into extracted markdown files (default: 10, top-level file is depth 0).")
+    parser.add_argument("--mmap-threshold", type=float, default=64, help="Inputs of at least this many MB are memory-mapped and scanned as bytes (default: 64).")
+    parser.add_argument("--history", action='store_true', help="Keep earlier versions of rewritten files as compact deltas in '<name>_files/history/' instead of '_vN' copies.")
+    parser.add_argument("--validate", action='store_true', help="Syntax-check extracted Python/JSON/YAML/TOML blocks and record the result per entry in manifest.json.")
+    parser.add_argument("--resume", action='store_true', help="Continue an interrupted extraction from the last checkpoint in '<name>_files/manifest.jsonl'.")
+    parser.add_argument("--views", help=f"Comma-separated layouts to write: {', '.join(VIEWS)} or all (default: all; 'reconstructed' implies --reconstruct). The others can be written later with --materialize-views.")
+    parser.add_argument("--materialize-views", action='store_true', help="Do not extract: write the --views missing from an earlier extraction of the input, from its manifest.json and stored block contents.")
+    parser.add_argument("--incremental", action='store_true', help="If the input only grew since its last extraction (e.g. a re-exported session), extract just the new content after the last extracted block.")
+    parser.add_argument("--catalog", help="SQLite catalog to update with the extracted manifest entries (e.g. output/catalog.sqlite).")
+    parser.add_argument("--project-index", help="SQLite project index to record the session's reconstructed paths in, for project_index.py assemble (implies --reconstruct).")
+    parser.add_argument("--archive-output", choices=ARCHIVE_FORMATS, help="Write the whole extraction tree into a single <name>_files.zip/.tar archive instead of a directory.")
+    parser.add_argument("--compress", action='store_true', help="Compress the --archive-output archive (zip: deflate, tar: gzip).")
+    parser.add_argument("--plugins", help=f"Directory of ParserPlugin files (*.py) to run on every extracted document (default: {DEFAULT_PLUGIN_DIR}, if it exists).")
+    parser.add_argument("--no-plugins", action='store_true', help="Do not load any plugin, not even from the default plugin directory.")
+    add_selection_arguments(parser)
+    add_arguments(parser)
     args, unknown = parser.parse_known_args()
+    configure_from_args(args)
 
     input_path = os.path.abspath(args.input_file)
-    
-    # Start recursive processing
-    process_markdown_file(input_path, args)
+
+    if args.project_index:
+        if args.archive_output:
+            log.warning("--project-index reads the extraction directory, not available with --archive-output")
+            args.project_index = None
+        else:
+            args.reconstruct = True
+
+    # Patterns validated and compiled once, before any file is scanned, for every file of the run
+    args.profile = profile_for(args.parse, args.strip)
+
+    # Plugin files are listed once here; each job (and worker process) imports them itself
+    args.plugin_files = []
+    if not args.no_plugins:
+        if args.plugins and not os.path.isdir(args.plugins):
+            log.error(f"Error: --plugins: not a directory: {args.plugins}")
+            sys.exit(1)
+        args.plugin_files = discover_plugins(args.plugins or DEFAULT_PLUGIN_DIR)
+        if args.plugin_files:
+            log.info(f"Using {len(args.plugin_files)} plugin file(s): {', '.join(os.path.basename(p) for p in args.plugin_files)}")
+
+    if args.views is not None:
+        try:
+            args.views = parse_views(args.views)
+        except ValueError as e:
+            log.error(f"Error: --views: {e}")
+            sys.exit(1)
+        if (args.merge_to or args.clean_project) and "reconstructed" not in args.views:
+            log.info("Merging reads reconstructed/, adding it to --views")
+            args.views = args.views + ("reconstructed",)
+
+    try:
+        selection = ChunkSelection.from_args(args)
+    except ValueError as e:
+        log.error(f"Error: {e}")
+        sys.exit(1)
+
+    # JSON export: extract from its chunks, laid out as if the session Markdown had been rendered
+    chunks = turns = None
+    if input_path.lower().endswith('.json'):
+        try:
+            data = load_export(input_path, None if selection.is_all() else selection)
+            chunks = data['chunkedPrompt']['chunks']
+            turns = list(turn_indexes(data['chunkedPrompt']))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.error(f"Error: {args.input_file} is not a usable JSON export: {e}")
+            sys.exit(1)
+        safe_name = safe_session_name(input_path)
+        input_path = os.path.join(os.path.abspath(args.output), safe_name, f"{safe_name}.md")
+        log.info(f"Extracting code directly from {len(chunks)} export chunks into: {os.path.dirname(input_path)}")
+    elif not selection.is_all():
+        log.info("--roles / --turns / --thoughts apply to JSON exports; this Markdown already holds the turns it was rendered with")
+
+    if args.materialize_views:
+        if not args.views:
+            log.error("Error: --materialize-views needs --views")
+            sys.exit(1)
+        source_name = os.path.splitext(os.path.basename(input_path))[0]
+        manifest_path = os.path.join(os.path.dirname(input_path), f"{source_name}_files", "manifest.json")
+        with DirectoryLock(os.path.dirname(manifest_path)):
+            CodeExtractor(os.path.dirname(input_path)).materialize_views(manifest_path, args.views)
+        return
+
+    if args.archive_output:
+        source_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_extraction_dir = os.path.join(os.path.dirname(input_path), f"{source_name}_files")
+        archive_path = archive_path_for(base_extraction_dir, args.archive_output, args.compress)
+        with ArchiveWriter(archive_path, base_extraction_dir, fmt=args.archive_output, compress=args.compress) as archive:
+            results = process_markdown_file(input_path, args, archive=archive, chunks=chunks, turns=turns)
+    else:
+        # Start recursive processing
+        results = process_markdown_file(input_path, args, chunks=chunks, turns=turns)
+
+    if args.plugin_files:
+        report_path = None
+        if not args.archive_output:
+            source_name = os.path.splitext(os.path.basename(input_path))[0]
+            base_extraction_dir = os.path.join(os.path.dirname(input_path), f"{source_name}_files")
+            if os.path.isdir(base_extraction_dir):
+                report_path = os.path.join(base_extraction_dir, REPORT_FILENAME)
+        write_report(merge_stats(r.get('plugin_stats') for r in results), report_path)
+
+    if args.catalog:
+        catalog_extraction_results(args.catalog, input_path, results)
+    if args.project_index:
+        index_extraction_results(args.project_index, input_path, results)
 
 if __name__ == "__main__":
     main()
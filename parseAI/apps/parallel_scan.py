@@ -0,0 +1,170 @@
+import re
+import multiprocessing
+
+# Inputs smaller than this (characters, or bytes for mmap input) are always scanned serially
+PARALLEL_SCAN_MIN_SIZE = 16 * 1024 * 1024
+
+# Pieces per worker, so one slow piece does not leave the other workers idle
+_PIECES_PER_WORKER = 4
+
+# How far around a split point a straddling header match is looked for (headers are short)
+_HEADER_WINDOW = 1 << 16
+
+# Source being scanned; set before the pool forks so workers share it without pickling
+_shared_text = None
+
+
+def _compile(pattern, flags, as_bytes):
+    if as_bytes:
+        return re.compile(pattern.encode('utf-8'), flags)
+    return re.compile(pattern, flags)
+
+
+def _context():
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def split_points(text, pieces):
+    """
+    Start offsets of roughly equal pieces of 'text' (the first is always 0).
+    Each cut is moved forward to the next turn separator, or failing that the next line start.
+    """
+    as_bytes = not isinstance(text, str)
+    separator = b"\n\n---\n\n" if as_bytes else "\n\n---\n\n"
+    newline = b"\n" if as_bytes else "\n"
+    size = len(text)
+    step = size // pieces
+    points = [0]
+    for i in range(1, pieces):
+        target = max(i * step, points[-1] + 1)
+        window_end = min(size, target + step // 2)
+        cut = text.find(separator, target, window_end)
+        if cut != -1:
+            cut += len(separator)
+        else:
+            cut = text.find(newline, target, window_end)
+            if cut == -1:
+                continue
+            cut += 1
+        if points[-1] < cut < size:
+            points.append(cut)
+    return points
+
+
+def _scan_range(text, start, end, header_regexes, block_regex):
+    """
+    Scans [start, end) as if it were the whole source. Besides the matches, returns where
+    each pattern's scan would resume (end of its last match, or 'start').
+    """
+    headers = []
+    resume = []
+    for p in header_regexes:
+        found = []
+        last_end = start
+        for m in p.finditer(text, start, end):
+            found.append((m.start(), m.start(1), m.end(1)))
+            last_end = m.end()
+        headers.append(found)
+        resume.append(last_end)
+
+    blocks = []
+    last_end = start
+    for m in block_regex.finditer(text, start, end):
+        blocks.append((m.start(), m.start(2), m.end(2)))
+        last_end = m.end()
+    resume.append(last_end)
+    return {"start": start, "end": end, "headers": headers, "blocks": blocks, "resume": resume}
+
+
+def _scan_job(job):
+    ranges, header_patterns, block_pattern, as_bytes = job
+    header_regexes = [_compile(p, f, as_bytes) for p, f in header_patterns]
+    block_regex = _compile(block_pattern[0], block_pattern[1], as_bytes)
+    return [_scan_range(_shared_text, start, end, header_regexes, block_regex) for start, end in ranges]
+
+
+def _boundary_ok(text, piece, header_regexes, fence):
+    """
+    True if no match of the serial scan can straddle the end of 'piece'. The serial scan
+    resumes each pattern after its last match in the piece, so a match starting between
+    that point and the split would have been cut off by it.
+    """
+    boundary = piece["end"]
+    # A block match always starts with a fence
+    if text.find(fence, piece["resume"][-1], boundary) != -1:
+        return False
+    window_start = max(0, boundary - _HEADER_WINDOW)
+    window_end = min(len(text), boundary + _HEADER_WINDOW)
+    for regex, resume_at in zip(header_regexes, piece["resume"]):
+        m = regex.search(text, max(resume_at, window_start), window_end)
+        if m and m.start() < boundary:
+            return False
+    return True
+
+
+def _repair_boundaries(text, pieces, header_patterns, block_pattern, as_bytes):
+    """Merges neighbouring pieces whose split point a match could straddle and rescans them serially."""
+    header_regexes = [_compile(p, f, as_bytes) for p, f in header_patterns]
+    block_regex = _compile(block_pattern[0], block_pattern[1], as_bytes)
+    fence = b"```" if as_bytes else "```"
+
+    i = 0
+    while i < len(pieces) - 1:
+        if _boundary_ok(text, pieces[i], header_regexes, fence):
+            i += 1
+            continue
+        pieces[i:i + 2] = [_scan_range(text, pieces[i]["start"], pieces[i + 1]["end"], header_regexes, block_regex)]
+    return pieces
+
+
+def scan_parallel(text, header_patterns, block_pattern, workers, segments=None):
+    """
+    Finds header and block matches with several processes, with the same result as one
+    serial finditer per pattern.
+
+    'header_patterns' is a list of (pattern, flags) with the filename in group 1 and
+    'block_pattern' a (pattern, flags) with the content in group 2. Without 'segments' the
+    text is cut at turn separators / line starts; a cut that a match could straddle (an
+    open fence, a header running over the line end) is detected and that stretch is
+    rescanned serially. With 'segments' (independently scanned ranges) whole segments are
+    handed out and no check is needed.
+
+    Returns (headers_by_pattern, blocks) with [(match_start, group_start, group_end)] lists,
+    or None when a parallel scan is not possible (no 'fork' start method).
+    """
+    global _shared_text
+
+    ctx = _context()
+    if ctx is None:
+        return None
+
+    as_bytes = not isinstance(text, str)
+    pieces = max(2, workers * _PIECES_PER_WORKER)
+
+    if segments is not None:
+        per_job = max(1, -(-len(segments) // pieces))
+        jobs = [segments[i:i + per_job] for i in range(0, len(segments), per_job)]
+    else:
+        points = split_points(text, pieces) + [len(text)]
+        jobs = [[(points[i], points[i + 1])] for i in range(len(points) - 1)]
+
+    _shared_text = text
+    try:
+        with ctx.Pool(min(workers, len(jobs))) as pool:
+            scanned = [piece for job_pieces in pool.map(_scan_job, [(ranges, header_patterns, block_pattern, as_bytes) for ranges in jobs]) for piece in job_pieces]
+    finally:
+        _shared_text = None
+
+    if segments is None:
+        scanned = _repair_boundaries(text, scanned, header_patterns, block_pattern, as_bytes)
+
+    headers = [[] for _ in header_patterns]
+    blocks = []
+    for piece in scanned:
+        for collected, found in zip(headers, piece["headers"]):
+            collected.extend(found)
+        blocks.extend(piece["blocks"])
+    return headers, blocks
@@ -0,0 +1,164 @@
+import re
+import time
+import multiprocessing
+from run_log import get_logger
+
+log = get_logger("pattern_guard")
+
+# Flags used for every --parse pattern (same as the in-process scanner)
+CUSTOM_PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Default wall-clock budget per custom pattern, in seconds
+DEFAULT_PATTERN_TIMEOUT = 10.0
+
+# A group that contains a quantifier and is itself quantified, e.g. (a+)+ or (\w+\s?)*
+_NESTED_QUANTIFIER = re.compile(r'\((?:[^()\\]|\\.)*[+*}](?:[^()\\]|\\.)*\)[+*{]')
+
+
+def _compile(pattern, as_bytes):
+    if as_bytes:
+        return re.compile(pattern.encode('utf-8'), CUSTOM_PATTERN_FLAGS)
+    return re.compile(pattern, CUSTOM_PATTERN_FLAGS)
+
+
+def precheck_patterns(patterns):
+    """
+    Validates --parse patterns once at load time.
+    Drops patterns that do not compile or lack the filename capture group, and warns
+    about nested quantifiers (the usual cause of catastrophic backtracking).
+    Returns the list of usable patterns.
+    """
+    usable = []
+    for pattern_str in patterns or []:
+        try:
+            compiled = re.compile(pattern_str, CUSTOM_PATTERN_FLAGS)
+        except re.error as e:
+            log.error(f"Rejected custom pattern '{pattern_str}': {e}")
+            continue
+        if compiled.groups < 1:
+            log.error(f"Rejected custom pattern '{pattern_str}': capture group 1 (the filename) is missing")
+            continue
+        if _NESTED_QUANTIFIER.search(pattern_str):
+            log.warning(f"Custom pattern '{pattern_str}' has nested quantifiers and may backtrack catastrophically; it will run under a time budget")
+        usable.append(pattern_str)
+    return usable
+
+
+def _scan(pattern, text, as_bytes, segments=None, scan_from=0):
+    """
+    Returns [(match_start, name_start, name_end), ...] for one pattern (source or compiled),
+    found from 'scan_from' on, and separately in each (start, end) segment when 'segments' is set.
+    """
+    if isinstance(pattern, str):
+        pattern = _compile(pattern, as_bytes)
+    if segments is None:
+        ranges = [(scan_from, len(text))]
+    else:
+        ranges = [(max(seg_start, scan_from), seg_end) for seg_start, seg_end in segments if seg_end > scan_from]
+    spans = []
+    for range_start, range_end in ranges:
+        for m in pattern.finditer(text, range_start, range_end):
+            if m.start(1) >= 0:
+                spans.append((m.start(), m.start(1), m.end(1)))
+    return spans
+
+
+def _pattern_worker(conn, patterns, text, as_bytes, first, segments, scan_from):
+    for idx in range(first, len(patterns)):
+        start = time.perf_counter()
+        try:
+            spans = _scan(patterns[idx], text, as_bytes, segments, scan_from)
+            conn.send((idx, spans, time.perf_counter() - start, None))
+        except Exception as e:
+            conn.send((idx, [], time.perf_counter() - start, str(e)))
+    conn.close()
+
+
+def _context():
+    # 'fork' lets the worker share the document (including mmap input) without pickling it
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return multiprocessing.get_context()
+
+
+def run_patterns_guarded(patterns, text, timeout=DEFAULT_PATTERN_TIMEOUT, as_bytes=False, regexes=None, segments=None, scan_from=0):
+    """
+    Runs custom patterns over 'text' in an isolated worker process, each under its own
+    wall-clock budget. A pattern that exceeds the budget gets its worker killed; the
+    remaining patterns continue in a fresh worker. Like the built-in scan, matches are only
+    looked for from 'scan_from' on, and within each (start, end) of 'segments' if given.
+
+    Without 'fork' (Windows) the worker gets 'text' pickled, which an mmap input cannot
+    be; such inputs are scanned inline ('regexes' as for run_patterns_inline) without
+    the budget.
+
+    Returns (spans_by_pattern, report):
+      spans_by_pattern: list aligned with 'patterns' of [(match_start, name_start, name_end)]
+      report: list of {"pattern", "status" (ok|timeout|error), "seconds", "matches", "error"}
+    """
+    ctx = _context()
+    if ctx.get_start_method() != 'fork' and not isinstance(text, (str, bytes)):
+        log.warning(f"The --parse time budget cannot be enforced for memory-mapped input on this platform; running {len(patterns)} pattern(s) without it",
+                    event="pattern_budget_off")
+        return run_patterns_inline(patterns, text, as_bytes=as_bytes, regexes=regexes, segments=segments, scan_from=scan_from)
+    spans_by_pattern = [[] for _ in patterns]
+    report = [None] * len(patterns)
+
+    idx = 0
+    while idx < len(patterns):
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_pattern_worker, args=(child_conn, patterns, text, as_bytes, idx, segments, scan_from), daemon=True)
+        proc.start()
+        child_conn.close()
+
+        while idx < len(patterns):
+            started = time.perf_counter()
+            if not parent_conn.poll(timeout):
+                proc.terminate()
+                proc.join()
+                report[idx] = {"pattern": patterns[idx], "status": "timeout", "seconds": round(time.perf_counter() - started, 3), "matches": 0, "error": f"exceeded {timeout}s budget"}
+                idx += 1
+                break
+            try:
+                done_idx, spans, seconds, error = parent_conn.recv()
+            except EOFError:
+                report[idx] = {"pattern": patterns[idx], "status": "error", "seconds": round(time.perf_counter() - started, 3), "matches": 0, "error": "pattern worker exited"}
+                idx += 1
+                break
+            spans_by_pattern[done_idx] = spans
+            report[done_idx] = {"pattern": patterns[done_idx], "status": "error" if error else "ok", "seconds": round(seconds, 3), "matches": len(spans), "error": error}
+            idx = done_idx + 1
+
+        parent_conn.close()
+        proc.join()
+
+    return spans_by_pattern, report
+
+
+def run_patterns_inline(patterns, text, as_bytes=False, regexes=None, segments=None, scan_from=0):
+    """
+    Unguarded variant of run_patterns_guarded (used when the budget is disabled).
+    'regexes' are the patterns already compiled for this input type, if the caller has them.
+    """
+    spans_by_pattern = []
+    report = []
+    for idx, pattern_str in enumerate(patterns):
+        start = time.perf_counter()
+        try:
+            spans = _scan(regexes[idx] if regexes is not None else pattern_str, text, as_bytes, segments, scan_from)
+            error = None
+        except Exception as e:
+            spans, error = [], str(e)
+        spans_by_pattern.append(spans)
+        report.append({"pattern": pattern_str, "status": "error" if error else "ok", "seconds": round(time.perf_counter() - start, 3), "matches": len(spans), "error": error})
+    return spans_by_pattern, report
+
+
+def print_pattern_report(report, timeout=None):
+    for item in report:
+        if item["status"] == "ok":
+            slow = " (slow)" if timeout and item["seconds"] > timeout / 4 else ""
+            log.info(f"Custom pattern '{item['pattern']}': {item['matches']} matches in {item['seconds'] * 1000:.1f} ms{slow}", event="pattern", pattern=item['pattern'], matches=item['matches'], seconds=item['seconds'])
+        else:
+            log.warning(f"Custom pattern '{item['pattern']}' {item['status'].upper()} after {item['seconds']:.2f} s, skipped: {item['error']}", event="pattern", pattern=item['pattern'], status=item['status'], seconds=item['seconds'])
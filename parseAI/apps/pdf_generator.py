@@ -1,5 +1,10 @@
+import io
 import os
 from xhtml2pdf import pisa
+from safe_io import atomic_write
+from run_log import get_logger
+
+log = get_logger("pdf_generator")
 
 def generate_pdf(source_html_path, output_path, page_size="Letter"):
     """
@@ -11,13 +16,36 @@ def generate_pdf(source_html_path, output_path, page_size="Letter"):
         page_size (str): Page size (formatted for CSS @page). e.g., "Letter", "A4".
     """
     
-    # We need to inject the page size into the HTML style before converting
-    # or rely on the HTML having it. xhtml2pdf supports @page.
-    
     try:
         with open(source_html_path, "r", encoding="utf-8") as f:
             source_html = f.read()
+
+        pdf_bytes = render_pdf(source_html, page_size=page_size)
+        if pdf_bytes is None:
+            return False
+
+        atomic_write(output_path, pdf_bytes)
             
+        log.debug(f"Generated PDF: {output_path} (Size: {page_size})", event="output_written", path=output_path)
+        return True
+        
+    except Exception as e:
+        log.error(f"Exception generating PDF: {e}")
+        return False
+
+def render_pdf(source_html, page_size="Letter"):
+    """
+    Renders an HTML string to PDF and returns the PDF bytes (None on failure).
+    
+    Args:
+        source_html (str): The HTML document.
+        page_size (str): Page size (formatted for CSS @page). e.g., "Letter", "A4".
+    """
+    
+    # We need to inject the page size into the HTML style before converting
+    # or rely on the HTML having it. xhtml2pdf supports @page.
+    
+    try:
         # Inject @page size if needed, or ensure CSS handles it.
         # xhtml2pdf specific CSS for page size:
         page_css = f"""
@@ -63,19 +91,18 @@ def generate_pdf(source_html_path, output_path, page_size="Letter"):
         else:
             final_html = f"{page_css}{source_html}"
 
-        with open(output_path, "wb") as dest_file:
-            pisa_status = pisa.CreatePDF(
-                src=final_html,
-                dest=dest_file
-            )
+        dest_buffer = io.BytesIO()
+        pisa_status = pisa.CreatePDF(
+            src=final_html,
+            dest=dest_buffer
+        )
 
         if pisa_status.err:
-            print(f"Error generating PDF: {pisa_status.err}")
-            return False
+            log.error(f"Error generating PDF: {pisa_status.err}")
+            return None
             
-        print(f"Generated PDF: {output_path} (Size: {page_size})")
-        return True
+        return dest_buffer.getvalue()
         
     except Exception as e:
-        print(f"Exception generating PDF: {e}")
-        return False
+        log.error(f"Exception generating PDF: {e}")
+        return None
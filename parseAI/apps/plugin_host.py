@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import importlib.util
+from safe_io import atomic_write
+from run_log import get_logger
+
+log = get_logger("plugin_host")
+
+# Plugin files (*.py) found here are used unless --plugins / --no-plugins says otherwise
+DEFAULT_PLUGIN_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plugins"))
+
+# Blocks handed to on_blocks_extracted per call
+PLUGIN_BATCH_SIZE = 64
+
+# Written into '<source>_files/' after an extraction that used plugins
+REPORT_FILENAME = "plugin_report.json"
+
+
+class ParserPlugin:
+    """
+    Base class of extraction plugins. Subclass it in a .py file in the plugins directory
+    ('from plugin_host import ParserPlugin'); every subclass defined there is instantiated
+    once per process, the first time a document is extracted with plugins.
+
+    Hooks (override only those you need; the others are never called):
+
+    - on_text_scan(text): called once per document with the text being scanned (a str, or
+      bytes / an mmap for memory-mapped inputs). Returns filename candidates as
+      (match_start, name_start, name_end) offsets into 'text', like --parse matches: the
+      name at text[name_start:name_end] applies to the next code block after match_start.
+    - on_blocks_extracted(blocks): called with batches of up to PLUGIN_BATCH_SIZE
+      PluginBlock records before they are written. Set 'content' and/or 'filename' on a
+      block to change what is written and where.
+    - on_block_extracted(content, lang): per-block shortcut, called by the default
+      on_blocks_extracted. Return None to leave the block alone, new content, or a
+      (content, filename) pair.
+
+    Hooks run inside the worker process that extracts the document and only see their
+    arguments, so they are safe with --workers as long as they do not share state across
+    processes themselves.
+    """
+
+    name = None
+
+    def on_text_scan(self, text):
+        return []
+
+    def on_blocks_extracted(self, blocks):
+        for block in blocks:
+            result = self.on_block_extracted(block.content, block.language)
+            if result is None:
+                continue
+            if isinstance(result, tuple):
+                block.content, block.filename = result
+            else:
+                block.content = result
+
+    def on_block_extracted(self, content, lang):
+        return None
+
+
+class PluginBlock:
+    """
+    A code block as seen by on_blocks_extracted: its block number, language, the filename it
+    is associated with (None if none), its raw content and the line of its opening fence.
+    'modified_by' lists the plugins that changed 'content' or 'filename'.
+    """
+    __slots__ = ('index', 'language', 'filename', 'content', 'line', 'modified_by')
+
+    def __init__(self, index, language, filename, content, line):
+        self.index = index
+        self.language = language
+        self.filename = filename
+        self.content = content
+        self.line = line
+        self.modified_by = []
+
+
+def discover_plugins(directory):
+    """Plugin files in 'directory' (sorted, nothing imported yet)."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, f) for f in sorted(os.listdir(directory))
+            if f.endswith('.py') and not f.startswith('_')]
+
+
+# Plugins loaded in this process, by file: loaded once however many documents a worker extracts
+_loaded = {}
+
+
+def _load_file(path):
+    if path in _loaded:
+        return _loaded[path]
+    plugins = []
+    try:
+        module_name = "parseai_plugin_" + os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, ParserPlugin) and value is not ParserPlugin and value.__module__ == module_name:
+                plugins.append(value())
+    except Exception as e:
+        log.error(f"Failed to load plugin {path}: {type(e).__name__}: {e}")
+    _loaded[path] = plugins
+    return plugins
+
+
+def _overrides(plugin, hook):
+    return getattr(type(plugin), hook) is not getattr(ParserPlugin, hook)
+
+
+class PluginHost:
+    """
+    Runs the plugins of 'paths' (from discover_plugins) for one extraction. Nothing is
+    imported until the first hook call. A plugin whose hook raises is reported and not
+    called again for this document. 'stats' counts, per plugin and hook, the calls, the
+    items passed (blocks, or bytes scanned), the time spent and the errors.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self._plugins = None
+        self.stats = {}
+
+    def _active(self):
+        if self._plugins is None:
+            self._plugins = []
+            for path in self.paths:
+                for plugin in _load_file(path):
+                    name = plugin.name or type(plugin).__name__
+                    scans = _overrides(plugin, 'on_text_scan')
+                    blocks = _overrides(plugin, 'on_blocks_extracted') or _overrides(plugin, 'on_block_extracted')
+                    self._plugins.append({"name": name, "plugin": plugin, "scan": scans, "blocks": blocks, "failed": False})
+        return self._plugins
+
+    def wants_blocks(self):
+        return any(p["blocks"] for p in self._active())
+
+    def _call(self, entry, hook, items, *args):
+        stat = self.stats.setdefault(entry["name"], {}).setdefault(hook, {"calls": 0, "items": 0, "seconds": 0.0, "errors": 0})
+        started = time.perf_counter()
+        try:
+            return getattr(entry["plugin"], hook)(*args)
+        except Exception as e:
+            stat["errors"] += 1
+            entry["failed"] = True
+            log.error(f"Plugin {entry['name']} failed in {hook}, disabled for this document: {type(e).__name__}: {e}",
+                      event="plugin_error", plugin=entry["name"], hook=hook)
+            return None
+        finally:
+            stat["calls"] += 1
+            stat["items"] += items
+            stat["seconds"] += time.perf_counter() - started
+
+    def scan(self, text):
+        """Filename candidates from every on_text_scan hook, as (plugin name, spans) pairs."""
+        found = []
+        for entry in self._active():
+            if entry["scan"] and not entry["failed"]:
+                spans = self._call(entry, "on_text_scan", len(text), text)
+                if spans:
+                    found.append((entry["name"], [tuple(s) for s in spans]))
+        return found
+
+    def process_blocks(self, blocks):
+        """Runs one batch of PluginBlocks through every on_blocks_extracted hook, in plugin order."""
+        for entry in self._active():
+            if entry["blocks"] and not entry["failed"]:
+                before = [(b.content, b.filename) for b in blocks]
+                self._call(entry, "on_blocks_extracted", len(blocks), blocks)
+                for block, (content, filename) in zip(blocks, before):
+                    if block.content is not content or block.filename != filename:
+                        if not isinstance(block.content, str):
+                            log.error(f"Plugin {entry['name']} set non-text content on block {block.index}, change ignored")
+                            block.content, block.filename = content, filename
+                        else:
+                            block.modified_by.append(entry["name"])
+
+
+def merge_stats(all_stats):
+    """Adds up PluginHost.stats of several extractions (e.g. a document and its nested files)."""
+    total = {}
+    for stats in all_stats:
+        for name, hooks in (stats or {}).items():
+            for hook, stat in hooks.items():
+                into = total.setdefault(name, {}).setdefault(hook, {"calls": 0, "items": 0, "seconds": 0.0, "errors": 0})
+                for key in into:
+                    into[key] += stat[key]
+    for hooks in total.values():
+        for stat in hooks.values():
+            stat["seconds"] = round(stat["seconds"], 6)
+    return total
+
+
+def write_report(stats, path=None):
+    """Logs the cost of every plugin hook and, with 'path', writes the merged stats there as JSON."""
+    for name, hooks in sorted(stats.items()):
+        for hook, stat in sorted(hooks.items()):
+            per_item = stat["seconds"] / stat["items"] * 1e6 if stat["items"] else 0.0
+            log.info(f"Plugin {name}.{hook}: {stat['calls']} calls, {stat['items']} items, {stat['seconds']:.3f}s "
+                     f"({per_item:.1f} us/item), {stat['errors']} errors", event="plugin_cost", plugin=name, hook=hook, **stat)
+    if path:
+        atomic_write(path, json.dumps({"plugins": stats}, indent=2))
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from catalog import fingerprint_file
+from extraction_views import block_content_path, file_content, object_id
+from safe_io import DirectoryLock, atomic_write
+from run_log import add_arguments, configure_from_args, get_logger
+
+log = get_logger("project_index")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    extraction_dir TEXT,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS versions (
+    session_id INTEGER NOT NULL,
+    entry_index INTEGER NOT NULL,
+    sorted_path TEXT NOT NULL,
+    block_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_session ON versions(session_id);
+CREATE INDEX IF NOT EXISTS versions_path ON versions(sorted_path);
+CREATE TABLE IF NOT EXISTS winners (
+    sorted_path TEXT PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    entry_index INTEGER NOT NULL,
+    block_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assembled (
+    target TEXT NOT NULL,
+    sorted_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (target, sorted_path)
+);
+"""
+
+
+def _read_content(block_path):
+    """The merged content of an entry: its raw block, stripped like files in reconstructed/."""
+    with open(block_path, 'r', encoding='utf-8', newline='') as f:
+        return file_content(f.read())
+
+
+class ProjectIndex:
+    """
+    Persistent index of every reconstructed path ('sorted_path', as used by --merge-to)
+    across sessions, and of the version of it that wins: the last entry in the most
+    recently added session that writes it. Sessions rank in the order they were first
+    indexed (re-indexing keeps the rank) and entries of a session in manifest (turn) order.
+
+    record_session() replaces one session's entries and re-decides only the paths they
+    touch; assemble() writes the winners into a project directory, skipping files whose
+    winner is the one written by the last assembly of that directory.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        parent_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record_session(self, name, manifest_path):
+        """
+        Indexes the entries of a session's manifest.json. Skipped when the manifest is
+        unchanged since it was last indexed. Returns the number of paths whose winner changed.
+        """
+        fingerprint = fingerprint_file(manifest_path)
+        row = self.conn.execute("SELECT id, fingerprint FROM sessions WHERE name = ?", (name,)).fetchone()
+        if row and row[1] == fingerprint:
+            return 0
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        base_extraction_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+        versions = []
+        for i, entry in enumerate(manifest):
+            if not entry.get("sorted_path"):
+                continue
+            block_path = block_content_path(base_extraction_dir, entry)
+            try:
+                content_hash = object_id(_read_content(block_path))
+            except OSError as e:
+                log.warning(f"No stored content for {entry.get('file')}, not indexed: {e}")
+                continue
+            versions.append((i, entry["sorted_path"].replace(os.sep, '/'), block_path, content_hash))
+
+        with self.conn:
+            if row:
+                session_id = row[0]
+                touched = {p for (p,) in self.conn.execute("SELECT DISTINCT sorted_path FROM versions WHERE session_id = ?", (session_id,))}
+                self.conn.execute("DELETE FROM versions WHERE session_id = ?", (session_id,))
+                self.conn.execute("UPDATE sessions SET extraction_dir = ?, fingerprint = ? WHERE id = ?",
+                                  (base_extraction_dir, fingerprint, session_id))
+            else:
+                touched = set()
+                session_id = self.conn.execute("INSERT INTO sessions (name, extraction_dir, fingerprint) VALUES (?, ?, ?)",
+                                               (name, base_extraction_dir, fingerprint)).lastrowid
+            self.conn.executemany(
+                "INSERT INTO versions (session_id, entry_index, sorted_path, block_path, content_hash) VALUES (?, ?, ?, ?, ?)",
+                [(session_id, *v) for v in versions]
+            )
+            touched.update(v[1] for v in versions)
+            changed = self._decide(touched)
+
+        log.info(f"Project index: {name} has {len(versions)} versions of {len({v[1] for v in versions})} paths, "
+                 f"{changed} winners changed", event="project_index_session", session=name, versions=len(versions), changed=changed)
+        return changed
+
+    def _decide(self, paths):
+        """Recomputes the winner of each of 'paths'; returns how many changed."""
+        changed = 0
+        for path in paths:
+            best = self.conn.execute(
+                "SELECT session_id, entry_index, block_path, content_hash FROM versions WHERE sorted_path = ? "
+                "ORDER BY session_id DESC, entry_index DESC LIMIT 1", (path,)
+            ).fetchone()
+            current = self.conn.execute("SELECT session_id, entry_index, block_path, content_hash FROM winners WHERE sorted_path = ?",
+                                        (path,)).fetchone()
+            if best == current:
+                continue
+            # Only the content's location moved (e.g. re-extracted with other --views): same winner
+            if best is None or current is None or (best[0], best[1], best[3]) != (current[0], current[1], current[3]):
+                changed += 1
+            if best is None:
+                self.conn.execute("DELETE FROM winners WHERE sorted_path = ?", (path,))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO winners (sorted_path, session_id, entry_index, block_path, content_hash) "
+                                  "VALUES (?, ?, ?, ?, ?)", (path, *best))
+        return changed
+
+    def winners(self):
+        """(sorted_path, session name, content_hash) of every path, sorted by path."""
+        return self.conn.execute(
+            "SELECT w.sorted_path, s.name, w.content_hash FROM winners w JOIN sessions s ON s.id = w.session_id ORDER BY w.sorted_path"
+        ).fetchall()
+
+    def assemble(self, target):
+        """
+        Materializes the indexed project in 'target': writes each path whose winner differs
+        from what the last assembly into 'target' wrote (or whose file is missing) and removes
+        paths no session writes any more. Returns (written, removed, unchanged).
+        """
+        target = os.path.abspath(target)
+        written = removed = unchanged = 0
+        with DirectoryLock(target):
+            if not os.path.exists(target):
+                os.makedirs(target)
+            previous = dict(self.conn.execute("SELECT sorted_path, content_hash FROM assembled WHERE target = ?", (target,)))
+            rows = self.conn.execute("SELECT sorted_path, block_path, content_hash FROM winners").fetchall()
+
+            with self.conn:
+                for sorted_path, block_path, content_hash in rows:
+                    dest_path = os.path.join(target, *sorted_path.split('/'))
+                    if previous.pop(sorted_path, None) == content_hash and os.path.exists(dest_path):
+                        unchanged += 1
+                        continue
+                    try:
+                        content = _read_content(block_path)
+                    except OSError as e:
+                        log.error(f"Cannot assemble {sorted_path}: {e}")
+                        continue
+                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                    atomic_write(dest_path, content)
+                    self.conn.execute("INSERT OR REPLACE INTO assembled (target, sorted_path, content_hash) VALUES (?, ?, ?)",
+                                      (target, sorted_path, content_hash))
+                    log.debug(f"Assembled: {dest_path}", event="file_written", path=dest_path)
+                    written += 1
+
+                # Written by an earlier assembly, but no longer in any session
+                for sorted_path in previous:
+                    dest_path = os.path.join(target, *sorted_path.split('/'))
+                    if os.path.exists(dest_path):
+                        os.remove(dest_path)
+                        log.debug(f"Removed: {dest_path}", event="file_removed", path=dest_path)
+                    self.conn.execute("DELETE FROM assembled WHERE target = ? AND sorted_path = ?", (target, sorted_path))
+                    removed += 1
+
+        log.info(f"Assembled {target}: {written} written, {removed} removed, {unchanged} unchanged",
+                 event="assembled", target=target, written=written, removed=removed, unchanged=unchanged)
+        return written, removed, unchanged
+
+
+def index_extraction_results(db_path, input_path, results):
+    """
+    Records the top-level manifest of a markdown_extractor run in the project index, under
+    the session name of the input file (nested documents are not part of the project).
+    """
+    result = results[0] if results else None
+    if not result or not result.get('manifest_path') or not os.path.exists(result['manifest_path']):
+        return
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    try:
+        with ProjectIndex(db_path) as index:
+            index.record_session(name, result['manifest_path'])
+    except sqlite3.Error as e:
+        log.error(f"Project index update failed ({db_path}): {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assemble one project from the reconstructed files of many sessions.")
+    parser.add_argument("index", help="Path to the project index (e.g. output/project_index.sqlite).")
+    parser.add_argument("command", choices=['add', 'list', 'assemble'],
+                        help="add: index session manifests, list: show the winning version of every path, assemble: write the project.")
+    parser.add_argument("paths", nargs='*', help="add: '<Session>_files/manifest.json' files, in session order; assemble: the target directory.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    if args.command != 'add' and not os.path.exists(args.index):
+        log.error(f"Project index not found: {args.index}")
+        sys.exit(1)
+
+    with ProjectIndex(args.index) as index:
+        if args.command == 'add':
+            for manifest_path in args.paths:
+                name = os.path.basename(os.path.dirname(os.path.abspath(manifest_path)))
+                if name.endswith("_files"):
+                    name = name[:-len("_files")]
+                index.record_session(name, manifest_path)
+        elif args.command == 'list':
+            for sorted_path, session, content_hash in index.winners():
+                print(f"{sorted_path}  <- {session}  ({content_hash[:10]})")
+        else:
+            if len(args.paths) != 1:
+                log.error("assemble needs exactly one target directory")
+                sys.exit(1)
+            index.assemble(args.paths[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+from safe_io import atomic_write
+from chunk_selection import SELECTION_KEY
+from run_log import get_logger
+
+log = get_logger("render_state")
+
+# Sidecar kept next to a session's rendered outputs (output/<Session>/<Session>_render_state.json)
+STATE_SUFFIX = "_render_state.json"
+
+
+def header_hash(data):
+    """
+    Hash of what is rendered outside the chunks: run settings and system instructions, and
+    the chunk selection the export was loaded with (if any).
+    """
+    h = hashlib.sha1()
+    for part in (data.get("runSettings", {}), data.get("systemInstruction", {})):
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        h.update(b"\0")
+    selection = data.get("chunkedPrompt", {}).get(SELECTION_KEY)
+    if selection:
+        h.update(selection.encode('utf-8'))
+    return h.hexdigest()
+
+
+def chunk_chain(chunks, seed):
+    """
+    Chained per-chunk hashes: entry i hashes entry i - 1 (or 'seed') with chunk i, so it
+    identifies chunks[0..i] as a whole. Two exports share their first k chunks exactly when
+    their chains agree at k - 1.
+    """
+    chain = []
+    previous = seed
+    for chunk in chunks:
+        h = hashlib.sha1(previous.encode('ascii'))
+        h.update(json.dumps([chunk.get('role', 'unknown'), bool(chunk.get('isThought', False)), chunk.get('text', '')],
+                            ensure_ascii=False).encode('utf-8'))
+        previous = h.hexdigest()
+        chain.append(previous)
+    return chain
+
+
+def state_path_for(run_output_dir, safe_name):
+    return os.path.join(run_output_dir, f"{safe_name}{STATE_SUFFIX}")
+
+
+def load_render_state(path):
+    """The recorded state of a session's outputs, or None if there is none (or it is unreadable)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        log.warning(f"Ignoring unreadable render state: {path}")
+        return None
+    if not isinstance(state, dict) or not isinstance(state.get("chain"), list):
+        return None
+    return state
+
+
+def save_render_state(path, header, chain, outputs):
+    """
+    Records the chunk chain the outputs were rendered from and the size of each output file
+    ('outputs': {kind: path}), so a later run can tell whether they are still untouched.
+    """
+    sizes = {kind: os.path.getsize(p) for kind, p in outputs.items() if p and os.path.exists(p)}
+    atomic_write(path, json.dumps({"header": header, "chain": chain, "sizes": sizes}))
+
+
+def appended_chunks(state, header, chain):
+    """
+    Number of leading chunks already rendered when 'chain' extends the recorded one, else None
+    (different header, an earlier chunk changed, or chunks were removed).
+    """
+    if state is None or state.get("header") != header:
+        return None
+    recorded = state["chain"]
+    k = len(recorded)
+    if k > len(chain) or (k and chain[k - 1] != recorded[-1]):
+        return None
+    return k
+
+
+def outputs_untouched(state, outputs):
+    """True if every output recorded in 'state' still has the size it was left with."""
+    sizes = state.get("sizes", {})
+    for kind, p in outputs.items():
+        if kind in sizes and (not os.path.exists(p) or os.path.getsize(p) != sizes[kind]):
+            return False
+    return "markdown" in sizes
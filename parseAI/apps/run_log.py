@@ -0,0 +1,174 @@
+import sys
+import json
+import time
+import logging
+
+# Every ParseAI logger lives under this one; modules get theirs from get_logger()
+LOGGER_NAME = "parseAI"
+
+LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+# Minimum seconds between two progress lines
+PROGRESS_INTERVAL = 2.0
+
+_root = logging.getLogger(LOGGER_NAME)
+_root.propagate = False
+_settings = {"level": "info", "json_path": None}
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time (like print), one plain line per record."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname.lower(),
+            "module": record.name.rpartition('.')[2],
+            "pid": record.process,
+            "event": getattr(record, "event", None) or "message",
+            "message": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", None) or {})
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+def configure(level="info", json_path=None):
+    """
+    Sets up the console output ('debug', 'info', 'warning' or 'error' and above) and, with
+    'json_path', an event log that receives every record (debug included) as one JSON object
+    per line. The event log is appended to, so several runs and worker processes can share it.
+    Also used as the initializer of worker pools (see settings()).
+    """
+    for handler in list(_root.handlers):
+        _root.removeHandler(handler)
+        handler.close()
+
+    console = _StdoutHandler()
+    console.setLevel(LEVELS[level])
+    _root.addHandler(console)
+    _root.setLevel(LEVELS[level])
+
+    if json_path:
+        events = logging.FileHandler(json_path, mode='a', encoding='utf-8')
+        events.setFormatter(_JsonFormatter())
+        events.setLevel(logging.DEBUG)
+        _root.addHandler(events)
+        _root.setLevel(logging.DEBUG)
+
+    _settings["level"] = level
+    _settings["json_path"] = json_path
+
+
+def settings():
+    """The current configure() arguments, to repeat them in worker processes."""
+    return _settings["level"], _settings["json_path"]
+
+
+def add_arguments(parser):
+    """The logging options shared by the command line tools."""
+    parser.add_argument("--quiet", "-q", action='store_true', help="Only print warnings and errors.")
+    parser.add_argument("--verbose", "-v", action='store_true', help="Also print every detected header, extracted block and written file.")
+    parser.add_argument("--log-json", help="Append every log event (debug level included) as JSON lines to this file.")
+
+
+def configure_from_args(args):
+    level = "warning" if args.quiet else "debug" if args.verbose else "info"
+    configure(level, args.log_json)
+
+
+class EventLogger:
+    """
+    Leveled logging for one module. 'event' names the record in the JSON event log and the
+    keyword fields are added to it; the console only shows the message.
+    """
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+    def enabled(self, level):
+        return self._logger.isEnabledFor(LEVELS[level])
+
+    def _log(self, level, message, event, fields):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, message, extra={"event": event, "fields": fields})
+
+    def debug(self, message, event=None, **fields):
+        self._log(logging.DEBUG, message, event, fields)
+
+    def info(self, message, event=None, **fields):
+        self._log(logging.INFO, message, event, fields)
+
+    def warning(self, message, event=None, **fields):
+        self._log(logging.WARNING, message, event, fields)
+
+    def error(self, message, event=None, **fields):
+        self._log(logging.ERROR, message, event, fields)
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+class Progress:
+    """
+    Aggregated progress of a long loop, in place of a line per item. advance() is called per
+    item with the position reached in the input (bytes or characters); a line with the
+    throughput (items/s, MB/s) is logged at most every PROGRESS_INTERVAL seconds. finish()
+    logs the totals, at info level only if the loop ran long enough to report progress.
+    """
+
+    def __init__(self, logger, label, unit="blocks", total=None, start=0):
+        self.logger = logger
+        self.label = label
+        self.unit = unit
+        self.total = total
+        self.start = start
+        self.position = start
+        self.items = 0
+        self.started = time.monotonic()
+        self._last = self.started
+        self._reported = False
+
+    def advance(self, position=None, items=1):
+        self.items += items
+        if position is not None:
+            self.position = position
+        now = time.monotonic()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self._reported = True
+            self._emit(self.logger.info, "progress", now)
+
+    def finish(self):
+        emit = self.logger.info if self._reported else self.logger.debug
+        self._emit(emit, "progress_done", time.monotonic())
+
+    def _emit(self, emit, event, now):
+        elapsed = max(now - self.started, 1e-6)
+        done_mb = (self.position - self.start) / (1024 * 1024)
+        parts = [f"{self.items} {self.unit}"]
+        if self.total:
+            parts.append(f"{self.position / (1024 * 1024):.1f} of {self.total / (1024 * 1024):.1f} MB ({100 * self.position / self.total:.0f}%)")
+        parts.append(f"{self.items / elapsed:.0f} {self.unit}/s")
+        if done_mb:
+            parts.append(f"{done_mb / elapsed:.1f} MB/s")
+        emit(f"{self.label}: {', '.join(parts)} in {elapsed:.1f}s", event=event, label=self.label, items=self.items,
+             position=self.position, total=self.total, seconds=round(elapsed, 3))
+
+
+# Until a tool calls configure(), behave like the print calls this replaced
+configure()
@@ -0,0 +1,211 @@
+import os
+import time
+import shutil
+import tempfile
+from run_log import get_logger
+
+log = get_logger("safe_io")
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Process umask, read on the first finished write (see _umask)
+_UMASK = None
+
+
+def _temp_path_for(path):
+    parent_dir = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=parent_dir)
+    return fd, tmp_path
+
+
+def _umask():
+    """
+    The process umask, read once when first needed: from /proc where it is listed there,
+    otherwise by setting and immediately restoring it (the only portable way to read it).
+    """
+    global _UMASK
+    if _UMASK is None:
+        try:
+            with open("/proc/self/status", 'r') as f:
+                _UMASK = next(int(line.split()[1], 8) for line in f if line.startswith("Umask:"))
+        except (OSError, ValueError, IndexError, StopIteration):
+            _UMASK = os.umask(0)
+            os.umask(_UMASK)
+    return _UMASK
+
+
+def _finish(tmp_path, path):
+    # Temp files are created 0600; finished files get the usual umask-based mode instead
+    os.chmod(tmp_path, 0o666 & ~_umask())
+    os.replace(tmp_path, path)
+
+
+def atomic_write(path, content):
+    """
+    Writes 'content' (str as UTF-8 text, or bytes) to a temp file next to 'path' and renames
+    it into place, so readers and concurrent runs only ever see a complete file.
+    """
+    fd, tmp_path = _temp_path_for(path)
+    try:
+        if isinstance(content, str):
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+        _finish(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_append(path, content, keep=None):
+    """
+    Like atomic_write with the current content of 'path' followed by 'content': the file is
+    copied to a temp file next to it, 'content' added, and the copy renamed into place, so
+    readers never see a partly appended file. With 'keep', only the first 'keep' bytes of
+    the file are copied (what follows them is replaced by 'content').
+    """
+    fd, tmp_path = _temp_path_for(path)
+    try:
+        text = isinstance(content, str)
+        with os.fdopen(fd, 'w' if text else 'wb', encoding='utf-8' if text else None) as f:
+            out = f.buffer if text else f
+            with open(path, 'rb') as src:
+                remaining = keep
+                while remaining is None or remaining > 0:
+                    buf = src.read(1 << 20 if remaining is None else min(remaining, 1 << 20))
+                    if not buf:
+                        break
+                    out.write(buf)
+                    if remaining is not None:
+                        remaining -= len(buf)
+            f.write(content)
+        _finish(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_copy(src_path, dest_path):
+    """shutil.copy2 through a temp file and rename."""
+    fd, tmp_path = _temp_path_for(dest_path)
+    os.close(fd)
+    try:
+        shutil.copy2(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def lock_path_for(path):
+    """Lock file guarding 'path' while it is held: a hidden sibling, e.g. 'out/S/.S_files.lock'."""
+    path = os.path.abspath(path)
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.lock")
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class DirectoryLock:
+    """
+    Advisory, cross-process lock on an output directory (a session's '<name>_files/' or a
+    merge target), held through a sibling lock file. Runs that touch different directories
+    never wait for each other. A no-op where neither fcntl nor msvcrt is available.
+
+    The lock file only exists while the lock is held or waited for: the holder removes it
+    on release, and a run that locked a file which was removed meanwhile locks the new one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = lock_path_for(path)
+        self._fh = None
+
+    def acquire(self):
+        parent_dir = os.path.dirname(self.lock_path)
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir, exist_ok=True)
+
+        if fcntl is not None:
+            waiting = False
+            while True:
+                self._fh = open(self.lock_path, 'a+b')
+                try:
+                    fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if not waiting:
+                        log.info(f"Waiting for another run to release {self.path}")
+                        waiting = True
+                    fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+                # The previous holder may have removed the file while we waited on it
+                try:
+                    current = os.stat(self.lock_path)
+                except FileNotFoundError:
+                    current = None
+                held = os.fstat(self._fh.fileno())
+                if current is not None and (current.st_dev, current.st_ino) == (held.st_dev, held.st_ino):
+                    break
+                self._fh.close()
+            return self
+
+        self._fh = open(self.lock_path, 'a+b')
+        if msvcrt is not None:
+            waiting = False
+            while True:
+                try:
+                    self._fh.seek(0)
+                    msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if not waiting:
+                        log.info(f"Waiting for another run to release {self.path}")
+                        waiting = True
+                    time.sleep(0.2)
+        return self
+
+    def release(self):
+        if self._fh is None:
+            return
+        try:
+            if fcntl is not None:
+                # Removed while still locked, so nobody can lock this file afterwards
+                _remove(self.lock_path)
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._fh.close()
+            self._fh = None
+        if fcntl is None:
+            # Windows cannot remove a file another run still has open; that run removes it later
+            _remove(self.lock_path)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
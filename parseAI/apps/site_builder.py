@@ -0,0 +1,448 @@
+import os
+import re
+import sys
+import json
+import html
+import time
+import shutil
+import argparse
+from collections import Counter
+from urllib.parse import quote
+import markdown
+from json_parser import CHUNK_SEPARATOR, DEFAULT_OUTPUT_DIR
+from safe_io import DirectoryLock, atomic_write
+from run_log import Progress, add_arguments, configure_from_args, get_logger
+
+log = get_logger("site_builder")
+
+# Written into the output directory unless --site-dir says otherwise
+SITE_DIRNAME = "site"
+STATE_FILENAME = "site_state.json"
+
+# Bump when the page or index layout changes: every session is then rebuilt
+SITE_FORMAT = 1
+
+# Terms are spread over this many search/<shard>.json files by their FNV-1a hash
+SEARCH_SHARDS = 256
+
+# Indexed terms: runs of word characters of this length, lowercased, not all digits
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 32
+
+_WORD = re.compile(r'\w+')
+
+md = markdown.Markdown(extensions=['fenced_code', 'tables', 'nl2br'])
+
+SITE_CSS = """body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #f4f4f9; color: #333; line-height: 1.6; margin: 0; padding: 20px; }
+.container { max-width: 900px; margin: 0 auto; background: #fff; padding: 40px; box-shadow: 0 4px 10px rgba(0,0,0,0.05); border-radius: 8px; }
+nav { margin-bottom: 20px; font-size: 0.9em; }
+nav a { margin-right: 12px; }
+h1 { color: #2c3e50; border-bottom: 2px solid #eee; padding-bottom: 15px; }
+h2 { color: #34495e; border-left: 5px solid #3498db; padding-left: 10px; margin-top: 30px; }
+section.turn { border-bottom: 1px solid #eee; padding-bottom: 10px; }
+section.turn:target { background: #fffbe6; }
+table { border-collapse: collapse; width: 100%; font-size: 0.9em; }
+th, td { text-align: left; padding: 4px 8px; border-bottom: 1px solid #eee; }
+pre { background: #2d2d2d; color: #f8f8f2; padding: 15px; border-radius: 5px; overflow-x: auto; font-family: 'Consolas', 'Monaco', monospace; }
+blockquote { background: #f1f1f1; border-left: 5px solid #ccc; margin: 1.5em 10px; padding: 0.5em 10px; }
+#search { width: 100%; padding: 8px; font-size: 1em; box-sizing: border-box; }
+#results li { margin: 4px 0; }
+"""
+
+# Client side of the search index: the same tokenizer and shard hash as index_terms / shard_of
+SEARCH_JS = """(function () {
+  var shardCache = {};
+  var meta = null;
+  var sessions = null;
+
+  function getJson(url) {
+    return fetch(url).then(function (r) { return r.ok ? r.json() : {}; });
+  }
+
+  function shardOf(term) {
+    var bytes = new TextEncoder().encode(term);
+    var h = 0x811c9dc5;
+    for (var i = 0; i < bytes.length; i++) {
+      h = Math.imul(h ^ bytes[i], 0x01000193) >>> 0;
+    }
+    return h % meta.shards;
+  }
+
+  function terms(query) {
+    var words = query.toLowerCase().match(/[\\p{L}\\p{N}_]+/gu) || [];
+    return words.filter(function (w) {
+      return w.length >= meta.min_length && w.length <= meta.max_length && !/^[0-9]+$/.test(w);
+    });
+  }
+
+  function shard(n) {
+    var name = ('00' + n.toString(16)).slice(-3);
+    if (!shardCache[name]) {
+      shardCache[name] = getJson('search/' + name + '.json');
+    }
+    return shardCache[name];
+  }
+
+  function search(query) {
+    var words = terms(query);
+    if (!words.length) {
+      return Promise.resolve([]);
+    }
+    return Promise.all(words.map(function (w) {
+      return shard(shardOf(w)).then(function (s) { return s[w] || []; });
+    })).then(function (lists) {
+      var scores = null;
+      lists.forEach(function (postings) {
+        var next = {};
+        for (var i = 0; i + 2 < postings.length; i += 3) {
+          var key = postings[i] + ':' + postings[i + 1];
+          if (scores === null || key in scores) {
+            next[key] = (scores === null ? 0 : scores[key]) + postings[i + 2];
+          }
+        }
+        scores = next;
+      });
+      return Object.keys(scores).sort(function (a, b) { return scores[b] - scores[a]; }).slice(0, 100);
+    });
+  }
+
+  function render(keys) {
+    var list = document.getElementById('results');
+    list.innerHTML = '';
+    keys.forEach(function (key) {
+      var parts = key.split(':');
+      var name = sessions[parts[0]];
+      if (name === undefined) {
+        return;
+      }
+      var item = document.createElement('li');
+      var link = document.createElement('a');
+      link.href = 'sessions/' + encodeURIComponent(name) + '/index.html#s-' + parts[1];
+      link.textContent = name + ' \\u2014 turn ' + parts[1];
+      item.appendChild(link);
+      list.appendChild(item);
+    });
+    document.getElementById('count').textContent = keys.length ? keys.length + ' results' : 'No results';
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var box = document.getElementById('search');
+    if (!box) {
+      return;
+    }
+    Promise.all([getJson('search/meta.json'), getJson('search/sessions.json')]).then(function (loaded) {
+      meta = loaded[0];
+      sessions = loaded[1];
+      var timer = null;
+      box.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () { search(box.value).then(render); }, 150);
+      });
+    });
+  });
+})();
+"""
+
+
+def shard_of(term, shards=SEARCH_SHARDS):
+    """Shard of a term: 32-bit FNV-1a of its UTF-8 bytes (search.js computes the same)."""
+    h = 0x811c9dc5
+    for b in term.encode('utf-8'):
+        h = ((h ^ b) * 0x01000193) & 0xffffffff
+    return h % shards
+
+
+def index_terms(text):
+    """Term frequencies of a text, tokenized like the search box."""
+    return Counter(w for w in _WORD.findall(text.lower())
+                   if MIN_TERM_LENGTH <= len(w) <= MAX_TERM_LENGTH and not w.isdigit())
+
+
+def split_sections(markdown_text):
+    """
+    The turns of a session Markdown (json_parser writes CHUNK_SEPARATOR after each chunk;
+    the metadata block stays with the first). A turn whose own text contains the separator
+    comes out as two sections, on its page and in the search index alike.
+    """
+    return [s for s in markdown_text.split(CHUNK_SEPARATOR) if s.strip()]
+
+
+def find_sessions(output_dir, site_dir):
+    """Session name -> directory for every 'output/<Session>/<Session>.md'."""
+    sessions = {}
+    for name in sorted(os.listdir(output_dir)):
+        session_dir = os.path.join(output_dir, name)
+        if os.path.abspath(session_dir) == site_dir or not os.path.isfile(os.path.join(session_dir, f"{name}.md")):
+            continue
+        sessions[name] = session_dir
+    return sessions
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def session_key(name, session_dir):
+    """What a session's page and index entries are built from: its Markdown and its manifest."""
+    return [SITE_FORMAT, _stat_key(os.path.join(session_dir, f"{name}.md")),
+            _stat_key(os.path.join(session_dir, f"{name}_files", "manifest.json"))]
+
+
+def _updated(session_dir, name):
+    """Modification time of a session's Markdown, as shown in the index."""
+    try:
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(os.path.getmtime(os.path.join(session_dir, f"{name}.md"))))
+    except OSError:
+        return None
+
+
+def _page(title, body, root, scripts=False):
+    script = f'<script src="{root}assets/search.js"></script>' if scripts else ""
+    return (f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="UTF-8">\n'
+            f'<meta name="viewport" content="width=device-width, initial-scale=1.0">\n<title>{html.escape(title)}</title>\n'
+            f'<link rel="stylesheet" href="{root}assets/site.css">\n{script}\n</head>\n<body>\n<div class="container">\n'
+            f'{body}\n</div>\n</body>\n</html>\n')
+
+
+class SiteBuilder:
+    """
+    Static site over an output directory: shared assets, an index of every session with a
+    search box, a page per session and a client-side search index split into
+    SEARCH_SHARDS JSON files by term hash, holding (session id, turn, frequency) postings.
+
+    build() only renders the pages of sessions that are new or whose Markdown or manifest
+    changed since the last build (site_state.json), and only rewrites the shards holding
+    terms of those sessions (before or after the change) or of removed ones.
+    """
+
+    def __init__(self, output_dir, site_dir=None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.site_dir = os.path.abspath(site_dir or os.path.join(self.output_dir, SITE_DIRNAME))
+        self.search_dir = os.path.join(self.site_dir, "search")
+        self.state_path = os.path.join(self.site_dir, STATE_FILENAME)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("format") != SITE_FORMAT or state.get("shards") != SEARCH_SHARDS:
+            return None
+        return state
+
+    def _save_state(self, state):
+        atomic_write(self.state_path, json.dumps(state, indent=1))
+
+    def _shard_path(self, shard):
+        return os.path.join(self.search_dir, f"{shard:03x}.json")
+
+    def build(self, full=False):
+        """Brings the site up to date. Returns (pages written, pages removed, shards written)."""
+        with DirectoryLock(self.site_dir):
+            os.makedirs(self.search_dir, exist_ok=True)
+            state = None if full else self._load_state()
+            if state is None:
+                # Nothing to build on: every shard is rewritten from the sessions
+                for f in os.listdir(self.search_dir):
+                    os.remove(os.path.join(self.search_dir, f))
+                state = {"format": SITE_FORMAT, "shards": SEARCH_SHARDS, "next_id": 0, "sessions": {}}
+            known = state["sessions"]
+
+            sessions = find_sessions(self.output_dir, self.site_dir)
+            keys = {name: session_key(name, path) for name, path in sessions.items()}
+            changed = [name for name in sessions if name not in known or known[name].get("key") != keys[name]
+                       or not os.path.exists(self._page_path(name))]
+            removed = [name for name in known if name not in sessions]
+
+            self._write_assets()
+            if not changed and not removed:
+                log.info(f"Site is up to date ({len(sessions)} sessions): {self.site_dir}")
+                return 0, 0, 0
+
+            # Postings of the changed sessions, by shard: {shard: {term: [sid, turn, tf, ...]}}
+            postings = {}
+            new_shards = {}
+            affected = set()
+            progress = Progress(log, "Building session pages", unit="sessions")
+            for name in changed:
+                if name not in known:
+                    known[name] = {"id": state["next_id"], "shards": []}
+                    state["next_id"] += 1
+                entry = known[name]
+                fields, new_shards[name] = self._build_session(name, sessions[name], entry["id"], postings)
+                entry.update(fields)
+                affected.update(entry["shards"], new_shards[name])
+                # Until its shards are rewritten, a session may have postings in its old and its new ones
+                entry["shards"] = sorted(set(entry["shards"]) | new_shards[name])
+                progress.advance()
+            progress.finish()
+            for name in removed:
+                affected.update(known[name]["shards"])
+            self._save_state(state)
+
+            stale_ids = {known[name]["id"] for name in changed + removed}
+            for shard in sorted(affected):
+                self._update_shard(shard, stale_ids, postings.get(shard, {}))
+
+            for name in removed:
+                shutil.rmtree(os.path.dirname(self._page_path(name)), ignore_errors=True)
+                del known[name]
+            for name in changed:
+                known[name]["shards"] = sorted(new_shards[name])
+                known[name]["key"] = keys[name]
+
+            self._write_index(known, sessions)
+            self._save_state(state)
+
+        log.info(f"Site updated: {len(changed)} session pages written, {len(removed)} removed, {len(affected)} of {SEARCH_SHARDS} "
+                 f"search shards rewritten ({len(sessions)} sessions): {self.site_dir}", event="site_built",
+                 written=len(changed), removed=len(removed), shards=len(affected), sessions=len(sessions))
+        return len(changed), len(removed), len(affected)
+
+    def _page_path(self, name):
+        return os.path.join(self.site_dir, "sessions", name, "index.html")
+
+    def _write_assets(self):
+        assets_dir = os.path.join(self.site_dir, "assets")
+        os.makedirs(assets_dir, exist_ok=True)
+        for filename, content in (("site.css", SITE_CSS), ("search.js", SEARCH_JS)):
+            path = os.path.join(assets_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if f.read() == content:
+                        continue
+            except OSError:
+                pass
+            atomic_write(path, content)
+
+    def _build_session(self, name, session_dir, session_id, postings):
+        """
+        Writes the page of one session and adds its postings to 'postings'. Returns its index
+        entry fields and the shards its terms fall in.
+        """
+        with open(os.path.join(session_dir, f"{name}.md"), 'r', encoding='utf-8') as f:
+            sections = split_sections(f.read())
+
+        page_path = self._page_path(name)
+        page_dir = os.path.dirname(page_path)
+        root = "../../"
+
+        def link(path):
+            return quote(os.path.relpath(path, page_dir).replace(os.sep, '/'))
+
+        body = [f'<nav><a href="{root}index.html">All sessions</a>']
+        for ext, label in ((".html", "HTML"), (".pdf", "PDF"), (".md", "Markdown")):
+            original = os.path.join(session_dir, f"{name}{ext}")
+            if os.path.exists(original):
+                body.append(f'<a href="{link(original)}">{label}</a>')
+        body.append(f'</nav>\n<h1>{html.escape(name)}</h1>')
+
+        files = self._file_rows(name, session_dir, link)
+        if files:
+            body.append(f'<h2>Extracted files ({len(files)})</h2>\n<table>\n<tr><th>File</th><th>Language</th><th>Turn</th></tr>')
+            body.extend(files)
+            body.append('</table>')
+
+        shards = set()
+        for i, section in enumerate(sections):
+            md.reset()
+            body.append(f'<section class="turn" id="s-{i}">\n{md.convert(section)}\n</section>')
+            for term, tf in index_terms(section).items():
+                shard = shard_of(term)
+                shards.add(shard)
+                postings.setdefault(shard, {}).setdefault(term, []).extend((session_id, i, tf))
+
+        os.makedirs(page_dir, exist_ok=True)
+        atomic_write(page_path, _page(name, "\n".join(body), root))
+        log.debug(f"Site page: {page_path}", event="output_written", path=page_path)
+        return {"turns": len(sections), "files": len(files), "updated": _updated(session_dir, name)}, shards
+
+    def _file_rows(self, name, session_dir, link):
+        manifest_path = os.path.join(session_dir, f"{name}_files", "manifest.json")
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return []
+        base_extraction_dir = os.path.dirname(manifest_path)
+        rows = []
+        for entry in manifest:
+            label = entry.get("associated_filename") or entry.get("file", "")
+            target = os.path.join(base_extraction_dir, "files", entry["saved_as"]) if entry.get("saved_as") else None
+            if target and target.lower().endswith('.md') and os.path.exists(os.path.splitext(target)[0] + ".html"):
+                # Nested Markdown rendered by markdown_extractor
+                target = os.path.splitext(target)[0] + ".html"
+            if not target or not os.path.exists(target):
+                target = os.path.join(base_extraction_dir, "code_blocks", entry.get("file", ""))
+            cell = html.escape(label)
+            if os.path.exists(target):
+                cell = f'<a href="{link(target)}">{cell}</a>'
+            turn = entry.get("source", {}).get("turn")
+            rows.append(f'<tr><td>{cell}</td><td>{html.escape(str(entry.get("language", "")))}</td><td>{"" if turn is None else turn}</td></tr>')
+        return rows
+
+    def _update_shard(self, shard, stale_ids, additions):
+        """Drops the postings of 'stale_ids' from a shard and adds 'additions' ({term: postings})."""
+        path = self._shard_path(shard)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                terms = json.load(f)
+        except (OSError, ValueError):
+            terms = {}
+        for term in list(terms):
+            plist = terms[term]
+            kept = [v for i in range(0, len(plist), 3) if plist[i] not in stale_ids for v in plist[i:i + 3]]
+            if kept:
+                terms[term] = kept
+            else:
+                del terms[term]
+        for term, plist in additions.items():
+            plist = terms.get(term, []) + plist
+            # Postings in (session id, turn) order, whatever order the sessions were built in
+            triples = sorted(zip(plist[0::3], plist[1::3], plist[2::3]))
+            terms[term] = [v for triple in triples for v in triple]
+        if terms:
+            atomic_write(path, json.dumps(terms, separators=(',', ':'), sort_keys=True))
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _write_index(self, known, sessions):
+        """The session list (index.html) and the id -> name table of the search index."""
+        rows = []
+        for name in sorted(known):
+            entry = known[name]
+            rows.append(f'<tr><td><a href="sessions/{quote(name)}/index.html">{html.escape(name)}</a></td>'
+                        f'<td>{entry.get("turns", 0)}</td><td>{entry.get("files", 0)}</td><td>{html.escape(entry.get("updated") or "")}</td></tr>')
+        body = (f'<h1>Sessions ({len(known)})</h1>\n<input id="search" type="search" placeholder="Search all sessions" autocomplete="off">\n'
+                f'<p id="count"></p>\n<ol id="results"></ol>\n<table>\n<tr><th>Session</th><th>Turns</th><th>Files</th><th>Updated</th></tr>\n'
+                + "\n".join(rows) + '\n</table>')
+        atomic_write(os.path.join(self.site_dir, "index.html"), _page("ParseAI sessions", body, "", scripts=True))
+        atomic_write(os.path.join(self.search_dir, "sessions.json"),
+                     json.dumps({str(entry["id"]): name for name, entry in known.items()}, separators=(',', ':'), sort_keys=True))
+        atomic_write(os.path.join(self.search_dir, "meta.json"),
+                     json.dumps({"format": SITE_FORMAT, "shards": SEARCH_SHARDS, "min_length": MIN_TERM_LENGTH, "max_length": MAX_TERM_LENGTH}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build (or update) a static site over all processed sessions.", allow_abbrev=False)
+    parser.add_argument("--output", "-o", default=DEFAULT_OUTPUT_DIR, help="Output directory holding the sessions (default: the ParseAI output directory).")
+    parser.add_argument("--site-dir", help="Where to write the site (default: <output>/site).")
+    parser.add_argument("--full", action='store_true', help="Rebuild every page and search shard instead of only what changed.")
+    add_arguments(parser)
+    # run_parser passes all of its arguments along (--site must not pass for --site-dir)
+    args, unknown = parser.parse_known_args()
+    configure_from_args(args)
+
+    if not os.path.isdir(args.output):
+        log.error(f"Output directory not found: {args.output}")
+        sys.exit(1)
+    SiteBuilder(args.output, args.site_dir).build(full=args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import re
+from bisect import bisect_right
+
+# Display names json_parser uses for turn headers (raw role key -> display name)
+ROLE_MAP = {
+    "model": "🤖 AI",
+    "user": "👤 User",
+    "system": "⚙️ System"
+}
+
+_DISPLAY_TO_ROLE = {display: key for key, display in ROLE_MAP.items()}
+
+# Turn markers written by json_parser.parse_data: each chunk starts either at the top of the
+# document, after the metadata block or after the '---' separator, with '## <Role>' for a
+# regular turn or '> **THOUGHT** (<Role>):' for a thought. Only the ROLE_MAP display names
+# count, so a '---' rule followed by an ordinary heading inside a reply is not a new turn.
+_DISPLAY_NAMES = '|'.join(re.escape(display) for display in ROLE_MAP.values())
+_TURN_MARKER = (r'(?:\A|^-{16}\n\n|\n\n---\n\n)'
+                r'(?:## (' + _DISPLAY_NAMES + r')\n\n|> \*\*THOUGHT\*\* \((' + _DISPLAY_NAMES + r')\):\n)')
+
+
+def role_key(display_role):
+    """Maps a display name back to its raw role key ('🤖 AI' -> 'model')."""
+    return _DISPLAY_TO_ROLE.get(display_role, display_role.lower())
+
+
+class SourceMap:
+    """
+    Maps positions in an extraction input back to lines and conversation turns.
+
+    The line-offset index and the turn index are built once, on first use, and every
+    lookup is a binary search. Works on str and on bytes-like inputs (mmap); positions
+    are in the same unit as the input (characters or bytes).
+
+    'turns' may give the turn boundaries directly as (start, turn_index, role, is_thought)
+    tuples in position order, e.g. when the text was assembled from export chunks. Spans and
+    lines are then reported relative to the turn's own text.
+    """
+
+    def __init__(self, text, turns=None):
+        self.text = text
+        self._line_starts = None
+        self._turn_starts = None
+        self._turns = None
+        self._relative = turns is not None
+        if turns is not None:
+            self._turn_starts = [t[0] for t in turns]
+            self._turns = [tuple(t[1:]) for t in turns]
+
+    def _build_lines(self):
+        newline = '\n' if isinstance(self.text, str) else b'\n'
+        starts = [0]
+        find = self.text.find
+        pos = find(newline)
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = find(newline, pos + 1)
+        self._line_starts = starts
+
+    def _build_turns(self):
+        pattern = _TURN_MARKER if isinstance(self.text, str) else _TURN_MARKER.encode('utf-8')
+        self._turn_starts = []
+        self._turns = []
+        for m in re.finditer(pattern, self.text, re.MULTILINE):
+            display_role = m.group(1) if m.group(1) is not None else m.group(2)
+            if not isinstance(display_role, str):
+                display_role = display_role.decode('utf-8', errors='replace')
+            self._turn_starts.append(m.end())
+            self._turns.append((len(self._turns), role_key(display_role.strip()), m.group(2) is not None))
+
+    def line_of(self, pos):
+        """1-based line number containing position 'pos'."""
+        if self._line_starts is None:
+            self._build_lines()
+        return bisect_right(self._line_starts, pos)
+
+    def line_count(self):
+        if self._line_starts is None:
+            self._build_lines()
+        return len(self._line_starts)
+
+    def _turn_slot(self, pos):
+        if self._turns is None:
+            self._build_turns()
+        return bisect_right(self._turn_starts, pos) - 1
+
+    def turn_at(self, pos):
+        """(turn_index, role, is_thought) of the chunk containing 'pos', or None outside any turn."""
+        i = self._turn_slot(pos)
+        return self._turns[i] if i >= 0 else None
+
+    def locate_line(self, pos):
+        """Line of 'pos' as reported by locate() (relative to its turn for chunk input)."""
+        if self._relative:
+            i = self._turn_slot(pos)
+            if i >= 0:
+                return self.line_of(pos) - self.line_of(self._turn_starts[i]) + 1
+        return self.line_of(pos)
+
+    def locate(self, start, end):
+        """
+        Source record for the span [start, end): turn, role, span and 1-based inclusive line range.
+        'turn', 'role' and 'thought' are omitted for inputs that are not conversation transcripts;
+        'unit' is 'bytes' when the span is in bytes (memory-mapped input).
+        """
+        record = {}
+        base_pos, line_offset = 0, 0
+        i = self._turn_slot(start)
+        if i >= 0:
+            record["turn"], record["role"], record["thought"] = self._turns[i]
+            if self._relative:
+                base_pos = self._turn_starts[i]
+                line_offset = self.line_of(base_pos) - 1
+        record["span"] = [start - base_pos, end - base_pos]
+        if not isinstance(self.text, str):
+            record["unit"] = "bytes"
+        record["lines"] = [self.line_of(start) - line_offset, self.line_of(max(start, end - 1)) - line_offset]
+        return record
@@ -0,0 +1,173 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html_generator import render_html
+from pdf_generator import render_pdf
+from safe_io import atomic_write
+from run_log import configure, get_logger, settings
+
+log = get_logger("staged_pipeline")
+
+# Concurrent tasks per I/O stage (reader, writer); CPU stages use one task per worker process
+IO_CONCURRENCY = 4
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class StagedPipeline:
+    """
+    Renders exports through asyncio stages connected by bounded queues:
+
+        reader -> markdown -> html -> pdf
+                     \\          \\       \\
+                      +----------+-------+--> writer
+
+    The reader loads exports on threads, HTML and PDF rendering run on a process pool of
+    'workers' processes, and every file is written by the writer stage on threads. Each
+    queue holds at most 'queue_size' items, so a fast stage waits for the next one
+    instead of piling up documents in memory, and the throughput approaches that of the
+    slowest stage. The PDF is rendered from the HTML in memory, not read back from disk.
+
+    'load_export', 'parse_data' and 'safe_session_name' are json_parser's functions;
+    'record_catalog(filename, payload, safe_name, data, run_output_dir)' records a session
+    (run on a single thread so SQLite writes never overlap).
+    """
+
+    def __init__(self, output_dir, load_export, parse_data, safe_session_name, page_size="Letter", workers=1,
+                 queue_size=None, record_catalog=None):
+        self.output_dir = output_dir
+        self.load_export = load_export
+        self.parse_data = parse_data
+        self.safe_session_name = safe_session_name
+        self.page_size = page_size
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or 2 * self.workers
+        self.record_catalog = record_catalog
+        self.processed = 0
+
+    def run(self, sources):
+        """Runs every (filename, payload) of 'sources' through the pipeline; returns the number rendered."""
+        return asyncio.run(self._run(sources))
+
+    async def _run(self, sources):
+        loop = asyncio.get_running_loop()
+        self._io = ThreadPoolExecutor(max_workers=IO_CONCURRENCY)
+        self._catalog = ThreadPoolExecutor(max_workers=1)
+        self._cpu = ProcessPoolExecutor(max_workers=self.workers, initializer=configure, initargs=settings())
+        self._loop = loop
+
+        markdown_q = asyncio.Queue(self.queue_size)
+        html_q = asyncio.Queue(self.queue_size)
+        pdf_q = asyncio.Queue(self.queue_size)
+        write_q = asyncio.Queue(self.queue_size)
+        self._write_q = write_q
+
+        stages = [
+            (self._read(sources, markdown_q), None, 0),
+            (self._stage(markdown_q, self._markdown, IO_CONCURRENCY, html_q), markdown_q, IO_CONCURRENCY),
+            (self._stage(html_q, self._html, self.workers, pdf_q), html_q, self.workers),
+            (self._stage(pdf_q, self._pdf, self.workers), pdf_q, self.workers),
+        ]
+        try:
+            writer = asyncio.ensure_future(self._stage(write_q, self._write, IO_CONCURRENCY))
+            tasks = [asyncio.ensure_future(coro) for coro, _, _ in stages]
+            # Shut the stages down in order: a stage's input ends once everything upstream is done
+            for i, task in enumerate(tasks):
+                await task
+                if i + 1 < len(stages):
+                    _, next_q, next_concurrency = stages[i + 1]
+                    for _ in range(next_concurrency):
+                        await next_q.put(_DONE)
+            for _ in range(IO_CONCURRENCY):
+                await write_q.put(_DONE)
+            await writer
+        finally:
+            self._cpu.shutdown()
+            self._catalog.shutdown()
+            self._io.shutdown()
+        return self.processed
+
+    async def _stage(self, inbox, handler, concurrency, outbox=None):
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                try:
+                    result = await handler(item)
+                except Exception as e:
+                    log.error(f"Unexpected error processing {item.get('filename')}: {e}")
+                    continue
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def _read(self, sources, outbox):
+        sources = iter(sources)
+        while True:
+            # Archive members are read from the stream on a thread too
+            source = await self._loop.run_in_executor(self._io, next, sources, None)
+            if source is None:
+                return
+            filename, payload = source
+            log.info(f"Processing: {filename}", event="export_start", source=filename)
+            try:
+                data = await self._loop.run_in_executor(self._io, self.load_export, payload)
+            except Exception as e:
+                log.error(f"Failed to load {filename}: {e}")
+                continue
+            await outbox.put({"filename": filename, "payload": payload, "data": data})
+
+    async def _markdown(self, item):
+        data = item["data"]
+        extracted_text = await self._loop.run_in_executor(self._io, self.parse_data, data, item["filename"])
+        if not extracted_text:
+            return None
+
+        safe_name = self.safe_session_name(item["filename"])
+        run_output_dir = os.path.join(self.output_dir, safe_name)
+        if not os.path.exists(run_output_dir):
+            os.makedirs(run_output_dir, exist_ok=True)
+        item["safe_name"] = safe_name
+        item["run_output_dir"] = run_output_dir
+
+        await self._write_q.put({"filename": item["filename"], "path": os.path.join(run_output_dir, f"{safe_name}.md"),
+                                 "content": extracted_text, "message": "Saved output to:"})
+        system_instruction = data.get("systemInstruction", {}).get("text")
+        if system_instruction:
+            await self._write_q.put({"filename": item["filename"], "path": os.path.join(run_output_dir, f"{safe_name}_system_prompt.txt"),
+                                     "content": system_instruction, "message": "Saved System Instructions to:"})
+        if self.record_catalog is not None:
+            await self._write_q.put({"filename": item["filename"], "catalog": (item["filename"], item["payload"], safe_name, data, run_output_dir)})
+        self.processed += 1
+        return item
+
+    async def _html(self, item):
+        try:
+            full_html = await self._loop.run_in_executor(self._cpu, render_html, item["data"])
+        except Exception as e:
+            log.error(f"Error generating HTML: {e}")
+            return None
+        html_path = os.path.join(item["run_output_dir"], f"{item['safe_name']}.html")
+        await self._write_q.put({"filename": item["filename"], "path": html_path, "content": full_html, "message": "Generated HTML:"})
+        # Only the HTML travels on; the export data is no longer needed
+        return {"filename": item["filename"], "html": full_html,
+                "pdf_path": os.path.join(item["run_output_dir"], f"{item['safe_name']}.pdf")}
+
+    async def _pdf(self, item):
+        pdf_bytes = await self._loop.run_in_executor(self._cpu, render_pdf, item["html"], self.page_size)
+        if pdf_bytes is None:
+            return None
+        await self._write_q.put({"filename": item["filename"], "path": item["pdf_path"], "content": pdf_bytes,
+                                 "message": "Generated PDF:", "suffix": f" (Size: {self.page_size})"})
+        return None
+
+    async def _write(self, job):
+        if "catalog" in job:
+            await self._loop.run_in_executor(self._catalog, self.record_catalog, *job["catalog"])
+            return None
+        await self._loop.run_in_executor(self._io, atomic_write, job["path"], job["content"])
+        log.debug(f"{job['message']} {job['path']}{job.get('suffix', '')}", event="output_written", path=job['path'])
+        return None
@@ -0,0 +1,199 @@
+import os
+import ast
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from safe_io import atomic_write
+from extraction_views import block_content_path
+from run_log import get_logger
+
+log = get_logger("validator")
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+CACHE_FILENAME = "validation_cache.json"
+
+# File extension / language tag -> validator kind
+KIND_BY_EXTENSION = {
+    ".py": "python",
+    ".json": "json",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".toml": "toml",
+}
+KIND_BY_LANGUAGE = {
+    "python": "python",
+    "py": "python",
+    "json": "json",
+    "yaml": "yaml",
+    "yml": "yaml",
+    "toml": "toml",
+}
+
+
+def kind_for_entry(entry):
+    """Validator kind of a manifest entry: from its filename if it has one, else its language tag."""
+    name = entry.get("associated_filename")
+    if name:
+        return KIND_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+    return KIND_BY_LANGUAGE.get((entry.get("language") or "").lower())
+
+
+def _check_python(content):
+    try:
+        ast.parse(content)
+    except SyntaxError as e:
+        return f"line {e.lineno}: {e.msg}"
+    return None
+
+
+def _check_json(content):
+    try:
+        json.loads(content)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def _check_yaml(content):
+    try:
+        for _ in yaml.safe_load_all(content):
+            pass
+    except yaml.YAMLError as e:
+        return " ".join(str(e).split())
+    return None
+
+
+def _check_toml(content):
+    try:
+        tomllib.loads(content)
+    except tomllib.TOMLDecodeError as e:
+        return str(e)
+    return None
+
+
+CHECKS = {
+    "python": _check_python,
+    "json": _check_json,
+    "yaml": _check_yaml if yaml is not None else None,
+    "toml": _check_toml if tomllib is not None else None,
+}
+
+
+def validate_content(kind, content):
+    """Returns {"status": "ok" | "error" | "skipped", "error": message or None}."""
+    check = CHECKS.get(kind)
+    if check is None:
+        return {"status": "skipped", "error": f"no {kind} parser installed"}
+    try:
+        error = check(content)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"status": "error" if error else "ok", "error": error}
+
+
+def _validate_job(item):
+    key, kind, content = item
+    return key, validate_content(kind, content)
+
+
+def content_key(kind, content):
+    return f"{kind}:{hashlib.sha1(content.encode('utf-8')).hexdigest()}"
+
+
+class ValidationCache:
+    """Validation results keyed by kind and content hash, kept in a JSON file between runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.results = json.load(f)
+            except (OSError, ValueError):
+                log.warning(f"Ignoring unreadable validation cache: {path}")
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def put(self, key, result):
+        self.results[key] = result
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        atomic_write(self.path, json.dumps(self.results))
+        self._dirty = False
+
+
+def validate_manifest(base_extraction_dir, manifest, workers=1):
+    """
+    Syntax-checks the Python / JSON / YAML / TOML blocks of a manifest and stores the
+    result in each entry as entry["validation"] = {"kind", "status", "error"}.
+
+    Block contents are read from 'code_blocks/' (or 'objects/' when that view was not written). Results are cached by content hash in
+    '<base_extraction_dir>/validation_cache.json'; uncached contents are checked on a
+    process pool of 'workers' processes. Returns a summary dict of counts.
+    """
+    cache = ValidationCache(os.path.join(base_extraction_dir, CACHE_FILENAME))
+    summary = {"ok": 0, "error": 0, "skipped": 0, "cached": 0}
+
+    pending = {}   # key -> (kind, content)
+    fresh = {}     # key -> result checked in this run
+    entry_keys = []
+    for entry in manifest:
+        kind = kind_for_entry(entry)
+        if kind is None:
+            continue
+        block_path = block_content_path(base_extraction_dir, entry)
+        try:
+            with open(block_path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+        except OSError as e:
+            log.warning(f"Cannot validate {entry['file']}: {e}")
+            continue
+        key = content_key(kind, content)
+        entry_keys.append((entry, kind, key))
+        if cache.get(key) is not None:
+            summary["cached"] += 1
+        elif key not in pending:
+            pending[key] = (kind, content)
+
+    if pending:
+        items = [(key, kind, content) for key, (kind, content) in pending.items()]
+        if workers > 1 and len(items) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_validate_job, items, chunksize=max(1, len(items) // (workers * 4))))
+        else:
+            results = [_validate_job(item) for item in items]
+        for key, result in results:
+            fresh[key] = result
+            # 'skipped' only means a parser is missing here; check again once it is installed
+            if result["status"] != "skipped":
+                cache.put(key, result)
+
+    for entry, kind, key in entry_keys:
+        result = fresh.get(key) or cache.get(key)
+        entry["validation"] = {"kind": kind, "status": result["status"], "error": result["error"]}
+        summary[result["status"]] += 1
+
+    try:
+        cache.save()
+    except OSError as e:
+        log.error(f"Could not save validation cache: {e}")
+
+    return summary
@@ -26,9 +26,37 @@ if ($ScriptArgs -contains "--help" -or $ScriptArgs -contains "-h") {
     Write-Host "  --help, -h          Show this help message and exit."
     Write-Host "  --add-numbering, -n Prepend sequential numbers to filenames."
     Write-Host "  --strip, -s         Regex pattern to strip from filenames."
+    Write-Host "  --parse-timeout SEC  Time budget per --parse pattern and file (default: 10, 0 = off)."
     Write-Host "  -r, --reconstruct    Enable Path-Aware Extraction (create directories from fence paths)"
     Write-Host "  -m, --merge-to DIR   Merges reconstructed files into a single unified directory (e.g. ./my_app)"
     Write-Host "  -cp, --clean-project Automatically merge into a 'merged_project' subfolder."
+    Write-Host "  -w, --workers N      Render exports and nested markdown in N parallel worker processes."
+    Write-Host "  --max-depth N        Maximum nesting depth for extracted markdown (default: 10)."
+    Write-Host "  --archive-output FMT Write each session's extraction tree into one zip/tar archive."
+    Write-Host "  --compress           Compress the archive (zip: deflate, tar: gzip)."
+    Write-Host "  --catalog PATH       Update a searchable SQLite catalog of sessions and extracted files."
+    Write-Host "  --project-index FILE Record reconstructed paths in a cross-session index (see project_index.py assemble)."
+    Write-Host "  --site               Update a static, searchable site of all sessions in output\site (see site_builder.py)."
+    Write-Host "  --plugins DIR        Run the ParserPlugin files in DIR on every extraction (default: parseAI/plugins)."
+    Write-Host "  --no-plugins         Do not load any plugin."
+    Write-Host "  --history            Keep earlier file versions as deltas instead of _vN copies."
+    Write-Host "  --resume             Continue interrupted extractions from their manifest.jsonl checkpoint."
+    Write-Host "  --views LIST         Layouts to write: blocks,files,reconstructed or all (default: all)."
+    Write-Host "  --incremental        Re-exported sessions: render and extract only the turns added since the last run."
+    Write-Host "  --export-timeout SEC Kill and quarantine an export that takes longer to render (default: 0 = off)."
+    Write-Host "  --stage-timeout SEC  Same, per render stage (markdown, html, pdf, ...)."
+    Write-Host "  --memory-limit MB    Kill and quarantine an export whose worker uses more memory."
+    Write-Host "  --retry-quarantined  Render quarantined exports again even if they are unchanged."
+    Write-Host "  --pipeline           Overlap reading, rendering and writing of exports (asyncio stages)."
+    Write-Host "  --schedule           Render the longest exports first; estimated vs. actual costs in schedule_report.json."
+    Write-Host "  --memory-ceiling MB  Start another export only while the estimated memory of the running ones fits."
+    Write-Host "  --roles LIST         Only process turns of these roles (e.g. user,model)."
+    Write-Host "  --turns RANGES       Only process these 0-based turns (e.g. 0-20,35,40-)."
+    Write-Host "  --no-thoughts        Skip thought chunks (--thoughts only: keep nothing else)."
+    Write-Host "  -q, --quiet          Only print warnings and errors."
+    Write-Host "  -v, --verbose        Also print every extracted block and written file."
+    Write-Host "  --log-json FILE      Append all log events as JSON lines to FILE."
+    Write-Host "  --validate           Syntax-check extracted Python/JSON/YAML/TOML files (results in manifest.json)."
     Write-Host ""
     Write-Host "Structure:"
     Write-Host "  Input:  $ProjectRoot\ingest\*.json"
@@ -50,6 +78,7 @@ else {
 # Default Output Directory
 $DefaultOutputDir = Join-Path $ProjectRoot "output"
 $OutputDir = $DefaultOutputDir
+$InputDir = Join-Path $ProjectRoot "ingest"
 
 # Pre-scan arguments to find --output or -o
 for ($i = 0; $i -lt $ScriptArgs.Count; $i++) {
@@ -70,6 +99,11 @@ for ($i = 0; $i -lt $ScriptArgs.Count; $i++) {
             }
         }
     }
+    if ($ScriptArgs[$i] -eq "--input" -or $ScriptArgs[$i] -eq "-i") {
+        if (($i + 1) -lt $ScriptArgs.Count) {
+            $InputDir = $ScriptArgs[$i + 1]
+        }
+    }
 }
 
 Write-Host "Starting ParseAI..."
@@ -97,13 +131,20 @@ if (Test-Path $OutputDir) {
     $MarkdownExtractorPath = Join-Path $AppsDir "markdown_extractor.py"
     
     foreach ($File in $MdFiles) {
-        Write-Host "Extracting code from: $($File.FullName)"
+        # A session rendered from an export on disk is extracted from the export's chunks
+        # directly instead of re-parsing its Markdown (archive members have no export on disk)
+        $ExtractInput = $File.FullName
+        $ExportPath = Join-Path $InputDir "$($File.BaseName).json"
+        if ($File.Directory.Name -eq $File.BaseName -and (Test-Path $ExportPath -PathType Leaf)) {
+            $ExtractInput = $ExportPath
+        }
+        Write-Host "Extracting code from: $ExtractInput"
         
         # Pass the file path first, then the rest of the original arguments
-        python $MarkdownExtractorPath $File.FullName @ScriptArgs
+        python $MarkdownExtractorPath $ExtractInput @ScriptArgs
                
         if ($LASTEXITCODE -ne 0) {
-            Write-Host "ParseAI: Markdown extractor failed for $($File.FullName)."
+            Write-Host "ParseAI: Markdown extractor failed for $ExtractInput."
             # Continue processing other files
         }
     }
@@ -112,4 +153,14 @@ else {
     Write-Host "ParseAI: Output directory not found: $OutputDir. Skipping markdown extraction."
 }
 
+# 3. Update the static site (only the sessions that changed)
+if ($ScriptArgs -contains "--site") {
+    Write-Host "Building Site..."
+    python (Join-Path $AppsDir "site_builder.py") @ScriptArgs
+
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "ParseAI: Site builder failed."
+    }
+}
+
 Write-Host "ParseAI completed successfully."
@@ -27,9 +27,37 @@ if [[ "$1" == "--help" || "$1" == "-h" ]]; then
     echo "  --help, -h          Show this help message and exit."
     echo "  --add-numbering, -n Prepend sequential numbers to filenames."
     echo "  --strip, -s         Regex pattern to strip from filenames."
+    echo "  --parse-timeout SEC  Time budget per --parse pattern and file (default: 10, 0 = off)."
     echo "  -r, --reconstruct    Enable Path-Aware Extraction (create directories from fence paths)"
     echo "  -m, --merge-to DIR   Merges reconstructed files into a single unified directory (e.g. ./my_app)"
     echo "  -cp, --clean-project Automatically merge into a 'merged_project' subfolder."
+    echo "  -w, --workers N      Render exports and nested markdown in N parallel worker processes."
+    echo "  --max-depth N        Maximum nesting depth for extracted markdown (default: 10)."
+    echo "  --archive-output FMT Write each session's extraction tree into one zip/tar archive."
+    echo "  --compress           Compress the archive (zip: deflate, tar: gzip)."
+    echo "  --catalog PATH       Update a searchable SQLite catalog of sessions and extracted files."
+    echo "  --project-index FILE Record reconstructed paths in a cross-session index (see project_index.py assemble)."
+    echo "  --site               Update a static, searchable site of all sessions in output/site (see site_builder.py)."
+    echo "  --plugins DIR        Run the ParserPlugin files in DIR on every extraction (default: parseAI/plugins)."
+    echo "  --no-plugins         Do not load any plugin."
+    echo "  --history            Keep earlier file versions as deltas instead of _vN copies."
+    echo "  --resume             Continue interrupted extractions from their manifest.jsonl checkpoint."
+    echo "  --views LIST         Layouts to write: blocks,files,reconstructed or all (default: all)."
+    echo "  --incremental        Re-exported sessions: render and extract only the turns added since the last run."
+    echo "  --export-timeout SEC Kill and quarantine an export that takes longer to render (default: 0 = off)."
+    echo "  --stage-timeout SEC  Same, per render stage (markdown, html, pdf, ...)."
+    echo "  --memory-limit MB    Kill and quarantine an export whose worker uses more memory."
+    echo "  --retry-quarantined  Render quarantined exports again even if they are unchanged."
+    echo "  --pipeline           Overlap reading, rendering and writing of exports (asyncio stages)."
+    echo "  --schedule           Render the longest exports first; estimated vs. actual costs in schedule_report.json."
+    echo "  --memory-ceiling MB  Start another export only while the estimated memory of the running ones fits."
+    echo "  --roles LIST         Only process turns of these roles (e.g. user,model)."
+    echo "  --turns RANGES       Only process these 0-based turns (e.g. 0-20,35,40-)."
+    echo "  --no-thoughts        Skip thought chunks (--thoughts only: keep nothing else)."
+    echo "  -q, --quiet          Only print warnings and errors."
+    echo "  -v, --verbose        Also print every extracted block and written file."
+    echo "  --log-json FILE      Append all log events as JSON lines to FILE."
+    echo "  --validate           Syntax-check extracted Python/JSON/YAML/TOML files (results in manifest.json)."
     echo ""
     echo "Structure:"
     echo "  Input:  /home/jamesr/Development/AiDev/ParseAi/ingest/*.json"
@@ -41,6 +69,7 @@ fi
 # Default Output Directory
 DEFAULT_OUTPUT_DIR="$PROJECT_ROOT/output"
 OUTPUT_DIR="$DEFAULT_OUTPUT_DIR"
+INPUT_DIR="$PROJECT_ROOT/ingest"
 
 # Pre-scan arguments to find --output or -o for the shell script's knowledge
 # We don't consume them because we pass "$@" to the python script
@@ -58,6 +87,11 @@ for ((i=0; i<${#args[@]}; i++)); do
             fi
         fi
     fi
+    if [[ "${args[i]}" == "--input" || "${args[i]}" == "-i" ]]; then
+        if [[ -n "${args[i+1]}" ]]; then
+            INPUT_DIR="${args[i+1]}"
+        fi
+    fi
 done
 
 echo "Starting ParseAI..."
@@ -85,7 +119,14 @@ if [ -d "$OUTPUT_DIR" ]; then
     # Use find to locate .md files recursively (handling spaces in filenames)
     while IFS= read -r md_file; do
         if [ -f "$md_file" ]; then
-            echo "Extracting code from: $md_file"
+            # A session rendered from an export on disk is extracted from the export's chunks
+            # directly instead of re-parsing its Markdown (archive members have no export on disk)
+            session_name="$(basename "$md_file" .md)"
+            extract_input="$md_file"
+            if [[ "$(basename "$(dirname "$md_file")")" == "$session_name" && -f "$INPUT_DIR/$session_name.json" ]]; then
+                extract_input="$INPUT_DIR/$session_name.json"
+            fi
+            echo "Extracting code from: $extract_input"
             # Pass custom args to extractor if needed? The extractor mainly needs input file.
             # BUT, we might have --parse "pattern", which markdown_extractor DOES accept now.
             # so we should pass "$@" to markdown_extractor?
@@ -102,9 +143,9 @@ if [ -d "$OUTPUT_DIR" ]; then
             
             # Better: Pass full "$@" to extractor, but update extractor to ignore -i/--input/--output.
             
-             "$PYTHON_CMD" "$APPS_DIR/markdown_extractor.py" "$md_file" "${args[@]}"
+             "$PYTHON_CMD" "$APPS_DIR/markdown_extractor.py" "$extract_input" "${args[@]}"
             if [ $? -ne 0 ]; then
-                echo "ParseAI: Markdown extractor failed for $md_file."
+                echo "ParseAI: Markdown extractor failed for $extract_input."
                 # Decide whether to exit or continue on error for markdown extractor
                 # For now, we'll just report and continue.
             fi
@@ -115,5 +156,17 @@ else
     echo "ParseAI: Output directory not found: $OUTPUT_DIR. Skipping markdown extraction."
 fi
 
+# 3. Update the static site (only the sessions that changed)
+for arg in "${args[@]}"; do
+    if [[ "$arg" == "--site" ]]; then
+        echo "Building Site..."
+        "$PYTHON_CMD" "$APPS_DIR/site_builder.py" "${args[@]}"
+        if [ $? -ne 0 ]; then
+            echo "ParseAI: Site builder failed."
+        fi
+        break
+    fi
+done
+
 echo "ParseAI completed successfully."
 exit 0